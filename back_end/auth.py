@@ -6,10 +6,12 @@ from sqlalchemy.orm import Session
 from starlette import status
 from database import SessionLocal
 from models import Users, Settings, User_Balance
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from email_service import send_email
+from ttl_cache import TTLCache
+from password_hashing import hash_password, verify_password
+import os
 
 router = APIRouter(
     prefix='/auth',
@@ -21,7 +23,11 @@ SECRET_KEY = "hello"  # Key for JWT encoding (replace later)
 ALGORITHM = "HS256"  # Algorithm for JWT encoding
 ACCESS_TOKEN_EXPIRE_MINUTES = 30  # Access token duration
 
-bcrypt = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Verified users resolved by get_current_user, keyed by user id
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 # Pydantic models
@@ -67,7 +73,7 @@ async def create_user(db: db_dependency, create_user_request: CreateUserRequest)
         email=create_user_request.email,
         username=create_user_request.username,
         phone_number=create_user_request.phone_number,
-        hashed_password=bcrypt.hash(create_user_request.password),
+        hashed_password=await hash_password(create_user_request.password),
         verification_token=verification_token
     )
     db.add(create_user_model)
@@ -102,18 +108,24 @@ async def create_user(db: db_dependency, create_user_request: CreateUserRequest)
 @router.post("/token", response_model=Token)
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: db_dependency):
     """Authenticates a user and returns an access token if credentials are valid."""
-    user = authenticate_user(form_data.username, form_data.password, db)
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password", headers={"WWW-Authenticate": "Bearer"})
 
     token = create_access_token(user.username, user.id, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     return {"access_token": token, "token_type": "bearer"}
 
-def authenticate_user(username: str, password: str, db):
+async def authenticate_user(username: str, password: str, db):
     """Verifies username and password against the database."""
     user = db.query(Users).filter(Users.username == username).first()
-    if not user or not bcrypt.verify(password, user.hashed_password):
+    if not user:
+        return False
+    valid, new_hash = await verify_password(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:  # BCRYPT_ROUNDS changed since this hash was made
+        user.hashed_password = new_hash
+        db.commit()
     return user
 
 def create_access_token(username: str, user_id: int, expires_delta: timedelta):
@@ -123,35 +135,46 @@ def create_access_token(username: str, user_id: int, expires_delta: timedelta):
 
 async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)], db: db_dependency):
     """Retrieves the currently authenticated user from the token."""
-   #this isnt working rn for some reason :( 
     try:
-        print("Token received:", token)  # Debug: Print the token
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        print("Decoded payload:", payload)  # Debug: Print the decoded payload
         username, user_id = payload.get('sub'), payload.get('id')
         if username is None or user_id is None:
-            print("Validation failed: Missing username or user_id")  # Debug
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail='Could not validate user',
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        user = db.query(Users).filter(Users.id == user_id).first()
-        if not user or not user.is_verified:
-            print("Validation failed: User not found or not verified")  # Debug
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Email not verified"
-            )
-        return {'first_name': user.first_name, 'last_name': user.last_name, 'username': user.username, 'id': user.id}
-    except JWTError as e:
-        print("JWT Error:", str(e))  # Debug: Print the JWT error
+
+        # Only verified users are cached, so verification takes effect immediately
+        principal = user_cache.get(user_id)
+        if principal is None:
+            user = db.query(
+                Users.id, Users.first_name, Users.last_name, Users.username, Users.is_verified
+            ).filter(Users.id == user_id).first()
+            if not user or not user.is_verified:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="Email not verified"
+                )
+            principal = {'first_name': user.first_name, 'last_name': user.last_name, 'username': user.username, 'id': user.id}
+            user_cache.set(user_id, principal)
+        return dict(principal)
+    except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Could not validate user',
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+def invalidate_user(user_id: int):
+    """Drop a user's cached principal after their row changes."""
+    user_cache.invalidate(user_id)
+
+@router.get("/cache_stats", status_code=status.HTTP_200_OK)
+async def get_user_cache_stats(user: Annotated[dict, Depends(get_current_user)]):
+    """Hit/miss counters for the verified-user cache."""
+    return user_cache.stats()
+
 #Lilly: Trying to make endpoint to call for updating user info via account settings
 class UpdateUserRequest(BaseModel):
     email: str
@@ -173,9 +196,10 @@ async def update_user(user: Annotated[dict, Depends(get_current_user)],
         if update_user_request.phone_number:
             user_model.phone_number = update_user_request.phone_number
         if update_user_request.password:
-            user_model.hashed_password = bcrypt.hash(update_user_request.password) 
+            user_model.hashed_password = await hash_password(update_user_request.password)
 
         db.commit()
+        invalidate_user(user_model.id)
         return{"message": "User updated successfully"}
 
 #Generates a verification token
@@ -208,8 +232,6 @@ async def verify_email(token: str, db: db_dependency):
     user.is_verified = True
     user.verification_token = None
     db.commit()
+    invalidate_user(user.id)
     
     return "Email verified successfully"
-
-def hashPassword(password: str):
-    return bcrypt.hash(password);
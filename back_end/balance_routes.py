@@ -6,6 +6,7 @@ from models import Users, User_Balance
 from auth import get_current_user
 from pydantic import BaseModel
 from datetime import datetime
+from response_cache import response_cache
 
 router = APIRouter(
     prefix="/balances",
@@ -56,6 +57,7 @@ async def update_balance(
 
     db.commit()
     db.refresh(balance)
+    response_cache.invalidate_user(user["id"])
 
     return {
         "message": "Balance updated successfully",
@@ -73,14 +75,16 @@ async def get_balances(
     """
     Get all balances for the current user.
     """
-    balances = db.query(User_Balance).filter(User_Balance.id == user["id"]).all()
-    
-    return [
-        {
-            "balance_name": balance.balance_name,
-            "balance_amount": balance.balance_amount,
-            "previous_balance": balance.previous_balance,
-            "balance_date": balance.balance_date
-        }
-        for balance in balances
-    ] 
\ No newline at end of file
+    def load():
+        balances = db.query(User_Balance).filter(User_Balance.id == user["id"]).all()
+        return [
+            {
+                "balance_name": balance.balance_name,
+                "balance_amount": balance.balance_amount,
+                "previous_balance": balance.previous_balance,
+                "balance_date": balance.balance_date
+            }
+            for balance in balances
+        ]
+
+    return response_cache.get_or_compute(user["id"], "balances", None, load) 
\ No newline at end of file
@@ -0,0 +1,241 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+# Local on-disk cache of Polygon aggregate bars, keyed by ticker/multiplier/timespan/adjusted.
+# `coverage` records the time ranges already fetched in full (including ranges with no bars,
+# e.g. weekends), so a request only goes upstream for the segments it is missing. Recent bars
+# may still change, so nothing newer than the settle cutoff is stored or marked covered.
+
+BAR_STORE_PATH = os.getenv("BAR_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bar_cache.sqlite3"))
+BAR_SETTLE_SECONDS = int(os.getenv("BAR_SETTLE_SECONDS", "900"))  # Polygon data can be revised for ~15 min
+UPSTREAM_PAGE_LIMIT = 50000  # Polygon's maximum base aggregates per page
+BAR_CHUNK_SIZE = int(os.getenv("BAR_CHUNK_SIZE", "1000"))  # bars per streamed chunk
+STORE_BATCH_SIZE = 5000
+
+TIMESPAN_SECONDS = {
+    "second": 1,
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+    "week": 7 * 86400,
+    "month": 31 * 86400,
+    "quarter": 92 * 86400,
+    "year": 366 * 86400,
+}
+
+BAR_COLUMNS = ("timestamp", "open", "high", "low", "close", "volume", "vwap", "transactions")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    ticker TEXT NOT NULL, multiplier INTEGER NOT NULL, timespan TEXT NOT NULL, adjusted INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL, open REAL, high REAL, low REAL, close REAL, volume REAL, vwap REAL, transactions INTEGER,
+    PRIMARY KEY (ticker, multiplier, timespan, adjusted, timestamp)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage (
+    ticker TEXT NOT NULL, multiplier INTEGER NOT NULL, timespan TEXT NOT NULL, adjusted INTEGER NOT NULL,
+    start_ms INTEGER NOT NULL, end_ms INTEGER NOT NULL,
+    PRIMARY KEY (ticker, multiplier, timespan, adjusted, start_ms)
+) WITHOUT ROWID;
+"""
+
+
+def to_ms(value, end: bool = False) -> int:
+    """Polygon-style range bound to epoch ms: a YYYY-MM-DD date (whole day when `end`) or a ms timestamp."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    value = str(value).strip()
+    if value.isdigit():
+        return int(value)
+    day = datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    ms = int(day.timestamp() * 1000)
+    return ms + 86400 * 1000 - 1 if end else ms
+
+
+def bar_to_row(bar) -> dict:
+    """Polygon Agg object or dict -> bar dict with BAR_COLUMNS."""
+    get = bar.get if isinstance(bar, dict) else lambda name: getattr(bar, name, None)
+    return {column: get(column) for column in BAR_COLUMNS}
+
+
+def find_gaps(intervals, start: int, end: int) -> list:
+    """Sub-ranges of [start, end] not covered by the sorted, non-overlapping (start, end) intervals."""
+    gaps = []
+    cursor = start
+    for lo, hi in intervals:
+        if hi < cursor:
+            continue
+        if lo > end:
+            break
+        if lo > cursor:
+            gaps.append((cursor, lo - 1))
+        cursor = max(cursor, hi + 1)
+        if cursor > end:
+            break
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class BarStore:
+    """SQLite bar cache with gap filling. `fetch` has polygon's list_aggs signature."""
+
+    def __init__(self, fetch, path: str = BAR_STORE_PATH, settle_seconds: int = BAR_SETTLE_SECONDS):
+        self.fetch = fetch
+        self.settle_seconds = settle_seconds
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "local_only": 0, "upstream_fetches": 0, "bars_fetched": 0}
+
+    def settle_cutoff(self, multiplier: int, timespan: str) -> int:
+        """Bars starting after this ms timestamp may still change and are never cached."""
+        bar_ms = multiplier * TIMESPAN_SECONDS[timespan] * 1000
+        # Aligned to the bar size so the cutoff only moves once per bar, not on every request
+        settled = int(time.time() * 1000) - self.settle_seconds * 1000
+        return settled // bar_ms * bar_ms - bar_ms
+
+    # ---------- Reads ----------
+    def get_bars(self, ticker: str, multiplier: int, timespan: str, start, end, adjusted: bool = True,
+                 sort: str = "asc") -> list:
+        """Bars in [start, end], fetching only uncovered segments upstream."""
+        return [bar for chunk in self.iter_bars(ticker, multiplier, timespan, start, end, adjusted, sort) for bar in chunk]
+
+    def iter_bars(self, ticker: str, multiplier: int, timespan: str, start, end, adjusted: bool = True,
+                  sort: str = "asc", chunk_size: int = BAR_CHUNK_SIZE, cancelled: threading.Event | None = None):
+        """
+        Yield bars in [start, end] as lists of at most `chunk_size`, in `sort` order.
+        Covered ranges are paged from SQLite and gaps are streamed from upstream page by page,
+        so memory stays bounded whatever the range. Stops early once `cancelled` is set.
+        """
+        if timespan not in TIMESPAN_SECONDS:
+            raise ValueError(f"timespan must be one of {', '.join(TIMESPAN_SECONDS)}")
+        key = (ticker.upper(), multiplier, timespan, int(adjusted))
+        start_ms, end_ms = to_ms(start), to_ms(end, end=True)
+        desc = sort == "desc"
+
+        segments = self._plan(key, start_ms, end_ms, self.settle_cutoff(multiplier, timespan))
+        self.stats["requests"] += 1
+        if all(kind == "local" for kind, _, _ in segments):
+            self.stats["local_only"] += 1
+
+        chunk = []
+        for kind, lo, hi in reversed(segments) if desc else segments:
+            if kind == "local":
+                bars = self._iter_local(key, lo, hi, desc, chunk_size)
+            else:
+                bars = self._iter_upstream(key, lo, hi, desc, store=(kind == "gap"), cancelled=cancelled)
+            for bar in bars:
+                chunk.append(bar)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+                if cancelled is not None and cancelled.is_set():
+                    return
+        if chunk:
+            yield chunk
+
+    def _plan(self, key, start_ms: int, end_ms: int, cutoff: int) -> list:
+        """
+        Ascending (kind, start, end) segments covering [start_ms, end_ms]: "local" ranges already
+        stored, "gap" ranges to fetch and store, and a "live" tail past the cutoff that is never stored.
+        """
+        segments = []
+        settled_end = min(end_ms, cutoff)
+        if start_ms <= settled_end:
+            covered = [(max(lo, start_ms), min(hi, settled_end)) for lo, hi in self._coverage(key, start_ms, settled_end)]
+            gaps = find_gaps(covered, start_ms, settled_end)
+            segments = sorted([("local", lo, hi) for lo, hi in covered] + [("gap", lo, hi) for lo, hi in gaps],
+                              key=lambda segment: segment[1])
+        if end_ms > cutoff:
+            segments.append(("live", max(start_ms, cutoff + 1), end_ms))
+        return segments
+
+    def _coverage(self, key, start_ms: int, end_ms: int) -> list:
+        with self.lock:
+            return [tuple(row) for row in self.conn.execute(
+                "SELECT start_ms, end_ms FROM coverage WHERE ticker=? AND multiplier=? AND timespan=? AND adjusted=?"
+                " AND end_ms >= ? AND start_ms <= ? ORDER BY start_ms",
+                (*key, start_ms, end_ms),
+            )]
+
+    def _iter_local(self, key, start_ms: int, end_ms: int, desc: bool, page_size: int):
+        """Stored bars in [start_ms, end_ms], read in keyset pages."""
+        columns = ", ".join(BAR_COLUMNS)
+        base = (f"SELECT {columns} FROM bars WHERE ticker=? AND multiplier=? AND timespan=? AND adjusted=?"
+                " AND timestamp BETWEEN ? AND ?")
+        while start_ms <= end_ms:
+            with self.lock:
+                rows = [dict(row) for row in self.conn.execute(
+                    base + f" ORDER BY timestamp {'DESC' if desc else 'ASC'} LIMIT ?",
+                    (*key, start_ms, end_ms, page_size),
+                )]
+            yield from rows
+            if len(rows) < page_size:
+                return
+            if desc:
+                end_ms = rows[-1]["timestamp"] - 1
+            else:
+                start_ms = rows[-1]["timestamp"] + 1
+
+    # ---------- Upstream ----------
+    def _iter_upstream(self, key, start_ms: int, end_ms: int, desc: bool, store: bool, cancelled=None):
+        """
+        Stream bars from `fetch`. With `store`, bars are saved in batches and the range is marked
+        covered only once it has been read to the end.
+        """
+        ticker, multiplier, timespan, adjusted = key
+        self.stats["upstream_fetches"] += 1
+        pending = []
+        for bar in self.fetch(ticker, multiplier, timespan, start_ms, end_ms, bool(adjusted),
+                              "desc" if desc else "asc", UPSTREAM_PAGE_LIMIT):
+            bar = bar_to_row(bar)
+            if bar["timestamp"] is None or not start_ms <= bar["timestamp"] <= end_ms:
+                continue
+            self.stats["bars_fetched"] += 1
+            if store:
+                pending.append(bar)
+                if len(pending) >= STORE_BATCH_SIZE:
+                    self._insert_bars(key, pending)
+                    pending = []
+            yield bar
+            if cancelled is not None and cancelled.is_set():
+                return
+        if store:
+            self._insert_bars(key, pending)
+            self._mark_covered(key, start_ms, end_ms)
+
+    # ---------- Writes ----------
+    def _insert_bars(self, key, bars: list):
+        if not bars:
+            return
+        with self.lock, self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO bars (ticker, multiplier, timespan, adjusted, {', '.join(BAR_COLUMNS)})"
+                f" VALUES (?, ?, ?, ?, {', '.join('?' * len(BAR_COLUMNS))})",
+                [(*key, *(bar[c] for c in BAR_COLUMNS)) for bar in bars],
+            )
+
+    def _mark_covered(self, key, start_ms: int, end_ms: int):
+        """Merge [start_ms, end_ms] into the coverage intervals."""
+        with self.lock, self.conn:
+            # Union with every interval that overlaps or touches [start_ms, end_ms]
+            where = ("ticker=? AND multiplier=? AND timespan=? AND adjusted=? AND end_ms >= ? AND start_ms <= ?")
+            params = (*key, start_ms - 1, end_ms + 1)
+            lo, hi = self.conn.execute(f"SELECT MIN(start_ms), MAX(end_ms) FROM coverage WHERE {where}", params).fetchone()
+            self.conn.execute(f"DELETE FROM coverage WHERE {where}", params)
+            self.conn.execute(
+                "INSERT INTO coverage (ticker, multiplier, timespan, adjusted, start_ms, end_ms) VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, min(start_ms, lo if lo is not None else start_ms), max(end_ms, hi if hi is not None else end_ms)),
+            )
+
+    def metrics(self) -> dict:
+        with self.lock:
+            bars, intervals = self.conn.execute(
+                "SELECT (SELECT COUNT(*) FROM bars), (SELECT COUNT(*) FROM coverage)"
+            ).fetchone()
+        return {**self.stats, "bars_stored": bars, "coverage_intervals": intervals}
@@ -0,0 +1,112 @@
+"""
+Login load test: logins per second per core, and event-loop latency during a login storm.
+
+Runs the auth router in-process against a throwaway SQLite database and fires
+concurrent POST /auth/token requests while timing a trivial /ping route.
+BCRYPT_ROUNDS and PASSWORD_HASH_WORKERS are read from the environment as usual.
+
+    python bench_login.py [--users 20] [--logins 200] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+import auth
+import models
+from password_hashing import bcrypt, BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS
+
+PASSWORD = "correct horse battery staple"
+
+
+def build_app(n_users: int) -> FastAPI:
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(engine, tables=[models.Users.__table__])
+    Session = sessionmaker(bind=engine)
+
+    hashed = bcrypt.hash(PASSWORD)
+    with Session() as db:
+        db.add_all([
+            models.Users(first_name="Bench", last_name=str(i), email=f"bench{i}@example.com", username=f"bench{i}",
+                         phone_number=f"555{i:07d}", hashed_password=hashed, is_verified=True)
+            for i in range(n_users)
+        ])
+        db.commit()
+
+    def get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(auth.router)
+    app.dependency_overrides[auth.get_db] = get_db
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def run(app: FastAPI, n_users: int, n_logins: int, concurrency: int) -> dict:
+    import httpx
+
+    limiter = asyncio.Semaphore(concurrency)
+    done = asyncio.Event()
+
+    async def login(http, i):
+        async with limiter:
+            start = time.perf_counter()
+            response = await http.post("/auth/token", data={"username": f"bench{i % n_users}", "password": PASSWORD})
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+    async def ping_until_done(http):
+        latencies = []
+        while not done.is_set():
+            start = time.perf_counter()
+            await http.get("/ping")
+            latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.01)
+        return latencies
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        pinger = asyncio.create_task(ping_until_done(http))
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(login(http, i) for i in range(n_logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        pings = await pinger
+
+    cores = min(PASSWORD_HASH_WORKERS, os.cpu_count() or 1)
+    return {
+        "elapsed_s": elapsed,
+        "logins_per_s": n_logins / elapsed,
+        "logins_per_s_per_core": n_logins / elapsed / cores,
+        "cores": cores,
+        "login_p50_ms": statistics.median(latencies) * 1000,
+        "ping_p50_ms": statistics.median(pings) * 1000,
+        "ping_max_ms": max(pings) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Login throughput under concurrent load")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(build_app(args.users), args.users, args.logins, args.concurrency))
+    print(f"bcrypt rounds {BCRYPT_ROUNDS}, {PASSWORD_HASH_WORKERS} hash workers, {result['cores']} core(s)")
+    print(f"{args.logins} logins in {result['elapsed_s']:.2f} s: {result['logins_per_s']:.1f}/s, "
+          f"{result['logins_per_s_per_core']:.1f}/s per core, p50 {result['login_p50_ms']:.0f} ms")
+    print(f"/ping during the storm: p50 {result['ping_p50_ms']:.1f} ms, max {result['ping_max_ms']:.1f} ms")
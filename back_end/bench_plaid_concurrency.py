@@ -0,0 +1,116 @@
+"""
+Benchmark: request throughput while Plaid is slow, with blocking vs. offloaded SDK calls.
+
+Starts fake_plaid with an artificial delay and a small app exposing the same
+accounts_get call two ways: called inline from an async route (/blocking) and
+awaited through plaid_client.run_plaid (/offloaded). For each mode it fires a
+burst of concurrent Plaid-backed requests alongside cheap /ping requests and
+reports how long both took.
+
+    python bench_plaid_concurrency.py [--requests 32] [--latency-ms 200]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import threading
+import time
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(app, port: int):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+
+def build_app():
+    from fastapi import FastAPI
+    from plaid.model.accounts_get_request import AccountsGetRequest
+    from plaid.model.item_public_token_exchange_request import ItemPublicTokenExchangeRequest
+    from plaid_client import client, run_plaid, PLAID_CLIENT_ID, PLAID_SECRET
+
+    access_token = client.item_public_token_exchange(
+        ItemPublicTokenExchangeRequest(client_id=PLAID_CLIENT_ID, secret=PLAID_SECRET, public_token="public-bench")
+    )["access_token"]
+    accounts_request = AccountsGetRequest(client_id=PLAID_CLIENT_ID, secret=PLAID_SECRET, access_token=access_token)
+
+    app = FastAPI()
+
+    @app.get("/blocking")
+    async def blocking():
+        return {"accounts": len(client.accounts_get(accounts_request)["accounts"])}
+
+    @app.get("/offloaded")
+    async def offloaded():
+        return {"accounts": len((await run_plaid(client.accounts_get, accounts_request))["accounts"])}
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def run_mode(base_url: str, path: str, n_requests: int) -> dict:
+    import httpx
+
+    async def timed(http, url):
+        start = time.perf_counter()
+        response = await http.get(url)
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    limits = httpx.Limits(max_connections=n_requests * 2)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as http:
+        start = time.perf_counter()
+        plaid_calls = [asyncio.create_task(timed(http, path)) for _ in range(n_requests)]
+        await asyncio.sleep(0.01)  # let the Plaid calls reach the server first
+        pings = await asyncio.gather(*(timed(http, "/ping") for _ in range(n_requests)))
+        plaid_latencies = await asyncio.gather(*plaid_calls)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "mode": path.strip("/"),
+        "elapsed_s": elapsed,
+        "plaid_rps": n_requests / elapsed,
+        "plaid_p50_ms": statistics.median(plaid_latencies) * 1000,
+        "ping_p50_ms": statistics.median(pings) * 1000,
+        "ping_max_ms": max(pings) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent request throughput while Plaid is slow")
+    parser.add_argument("--requests", type=int, default=32, help="Concurrent Plaid-backed requests per mode")
+    parser.add_argument("--latency-ms", type=int, default=200, help="Delay fake_plaid adds to every response")
+    args = parser.parse_args()
+
+    # Configure the fake upstream before plaid_client reads the environment
+    plaid_port, app_port = free_port(), free_port()
+    os.environ["FAKE_PLAID_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["PLAID_HOST"] = f"http://127.0.0.1:{plaid_port}"
+    os.environ.setdefault("PLAID_CLIENT_ID", "bench")
+    os.environ.setdefault("PLAID_SECRET", "bench")
+    if not os.getenv("ENCRYPTION_KEY"):
+        from cryptography.fernet import Fernet
+        os.environ["ENCRYPTION_KEY"] = Fernet.generate_key().decode()
+
+    import fake_plaid
+    serve(fake_plaid.app, plaid_port)
+    serve(build_app(), app_port)
+
+    print(f"{args.requests} concurrent Plaid calls + {args.requests} pings, Plaid latency {args.latency_ms} ms")
+    print(f"{'mode':<10} {'elapsed s':>10} {'plaid req/s':>12} {'plaid p50 ms':>13} {'ping p50 ms':>12} {'ping max ms':>12}")
+    for path in ("/blocking", "/offloaded"):
+        r = asyncio.run(run_mode(f"http://127.0.0.1:{app_port}", path, args.requests))
+        print(f"{r['mode']:<10} {r['elapsed_s']:>10.2f} {r['plaid_rps']:>12.1f} {r['plaid_p50_ms']:>13.0f} "
+              f"{r['ping_p50_ms']:>12.0f} {r['ping_max_ms']:>12.0f}")
@@ -0,0 +1,194 @@
+"""
+Query-plan regression check: EXPLAIN every hot query against a seeded database and fail
+if any of them reads a whole table instead of using an index.
+
+By default runs against a throwaway in-memory SQLite database built from models.py plus
+migrations. Pass --database-url to check a scratch MySQL database instead (tables are
+created and seeded there, so never point it at production).
+
+    python bench_query_plans.py [--users 200] [--database-url URL]
+
+Exits with status 1 when a hot query falls back to a full table scan. The SQLite check also
+runs in the test suite (tests/test_query_plans.py).
+
+No Plaid calls are made, so the Plaid credentials and token key that the route modules require
+at import time get placeholder values when they are not set.
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+os.environ.setdefault("PLAID_CLIENT_ID", "bench-client")
+os.environ.setdefault("PLAID_SECRET", "bench-secret")
+if not (os.getenv("ENCRYPTION_KEYS") or os.getenv("ENCRYPTION_KEY")):
+    from cryptography.fernet import Fernet
+    os.environ["ENCRYPTION_KEY"] = Fernet.generate_key().decode()
+
+from sqlalchemy import create_engine, select, insert, text, literal, union_all
+from sqlalchemy.pool import StaticPool
+import models
+from models import (Users, Plaid_Bank_Account, Plaid_Transactions, Transaction_Category_Link, User_Categories,
+                    User_Balance, Save_Goals, Plaid_Investment, Plaid_Investment_Holding, Holding_Snapshot, Spend_Rollup)
+from migrations import run_migrations
+from user_transactions import transaction_page_query
+from pie_chart import expenses_per_category_query
+from budgets import budget_query
+from user_categories import category_ids_query
+from portfolio_routes import holdings_query
+from holding_snapshots import value_series_query
+from rollups import spend_series_query
+
+ACCOUNTS_PER_USER = 3
+TRANSACTIONS_PER_ACCOUNT = 100
+CATEGORIES_PER_USER = 8
+HOLDINGS_PER_ACCOUNT = 20
+
+
+# ==================== Hot Queries ====================
+def hot_queries() -> dict:
+    """name -> statement. Routes' queries come from the same builders the routes call."""
+    user_id, account_id, day = 1, "acc_1_0", date(2024, 6, 1)
+    return {
+        # Built by the routes' own query builders
+        "transactions page (user_transactions.transaction_page_query)": transaction_page_query(account_id, 51),
+        "next transactions page": transaction_page_query(account_id, 51, after=(day, 10**9)),
+        "transactions page filtered by category": transaction_page_query(
+            account_id, 51, after=(day, 10**9), start=day - timedelta(days=90), category_id=1),
+        "expenses per category (pie_chart.expenses_per_category_query)": expenses_per_category_query(
+            user_id, day - timedelta(days=30), day),
+        "budget status (budgets.budget_query)": budget_query(day - timedelta(days=day.weekday()), user_id=user_id),
+        "budget re-evaluation of touched categories": budget_query(day - timedelta(days=day.weekday()), category_ids=[1, 2]),
+        "budget re-evaluation of touched weeks (budgets.evaluate_touched_buckets)": budget_query(weeks=union_all(*(
+            select(literal(category_id).label("category_id"), literal(day - timedelta(days=7 * n)).label("week_start"))
+            for category_id, n in ((1, 0), (2, 0), (2, 1))
+        )).subquery("touched_weeks")),
+        "category ids (user_categories.CategoryResolver)": category_ids_query(user_id),
+        "category ids by name (CategoryResolver)": category_ids_query(user_id, ["Category 1", "Category 2"]),
+        "portfolio holdings (portfolio_routes.holdings_query)": holdings_query(user_id),
+        "portfolio value series (holding_snapshots.value_series_query)": value_series_query(
+            user_id, day - timedelta(days=5 * 365), day),
+        "spend series (rollups.spend_series_query)": spend_series_query(user_id, "month", day - timedelta(days=365), day),
+        # Single-table lookups written inline in the routes
+        "user's bank accounts": select(Plaid_Bank_Account.account_id).where(Plaid_Bank_Account.user_id == user_id),
+        "user balance by name (balance_routes)": (
+            select(User_Balance.balance_amount).where(User_Balance.id == user_id, User_Balance.balance_name == "Checking")
+        ),
+        "user's save goals": select(Save_Goals.goal_name).where(Save_Goals.user_id == user_id),
+        "holding by account and security": (
+            select(Plaid_Investment_Holding.holding_id)
+            .where(Plaid_Investment_Holding.account_id == "inv_1_0", Plaid_Investment_Holding.security_id == "sec_1")
+        ),
+    }
+
+
+# ==================== Plans ====================
+def explain(conn, stmt) -> list:
+    """Plan rows for `stmt` as strings, with bound values inlined."""
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "sqlite":
+        return [row.detail for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql))]
+    return [" ".join(f"{k}={v}" for k, v in row._mapping.items()) for row in conn.execute(text("EXPLAIN " + sql))]
+
+
+def full_scans(conn, plan: list) -> list:
+    """Plan rows that read a whole table. Scans of small derived tables built inside the query are fine."""
+    tables = set(models.Base.metadata.tables)
+    if conn.dialect.name == "sqlite":
+        # "SCAN <table>" without an index, or a skip-scan ("ANY(col)") over every value of an index's
+        # leading column; "SEARCH ..." on an index prefix and index-only scans are fine
+        return [row for row in plan
+                if (row.startswith("SCAN ") and " INDEX" not in row and row.split()[1] in tables) or "ANY(" in row]
+    return [row for row in plan if " type=ALL " in f" {row} " and any(f" table={t} " in f" {row} " for t in tables)]
+
+
+# ==================== Seed ====================
+def seed(conn, n_users: int):
+    rng = random.Random(0)
+    start = date(2019, 1, 1)
+    conn.execute(insert(Users), [
+        {"id": u, "email": f"plan{u}@example.com", "username": f"plan{u}", "first_name": "Plan", "last_name": str(u),
+         "phone_number": f"555{u:07d}", "hashed_password": "x", "is_verified": True}
+        for u in range(1, n_users + 1)
+    ])
+    conn.execute(insert(User_Categories), [
+        {"id": (u - 1) * CATEGORIES_PER_USER + c + 1, "user_id": u, "name": f"Category {c}", "color": "#000000"}
+        for u in range(1, n_users + 1) for c in range(CATEGORIES_PER_USER)
+    ])
+    accounts = [f"acc_{u}_{a}" for u in range(1, n_users + 1) for a in range(ACCOUNTS_PER_USER)]
+    conn.execute(insert(Plaid_Bank_Account), [
+        {"user_id": int(acc.split("_")[1]), "account_id": acc, "name": acc, "type": "depository"} for acc in accounts
+    ])
+    transactions = [
+        {"transaction_id": f"tx_{acc}_{i}", "account_id": acc, "amount": round(rng.uniform(-50, 200), 2),
+         "merchant_name": "Merchant", "date": start + timedelta(days=rng.randint(0, 5 * 365))}
+        for acc in accounts for i in range(TRANSACTIONS_PER_ACCOUNT)
+    ]
+    conn.execute(insert(Plaid_Transactions), transactions)
+    conn.execute(insert(Transaction_Category_Link), [
+        {"transaction_id": tx["transaction_id"], "category_id": (int(tx["account_id"].split("_")[1]) - 1) * CATEGORIES_PER_USER + i % CATEGORIES_PER_USER + 1}
+        for i, tx in enumerate(transactions)
+    ])
+    conn.execute(insert(User_Balance), [
+        {"id": u, "balance_name": name, "balance_amount": 100.0} for u in range(1, n_users + 1) for name in ("Checking", "Savings")
+    ])
+    conn.execute(insert(Save_Goals), [
+        {"user_id": u, "goal_name": f"Goal {g}", "goal_amount": 1000.0, "goal_date": start} for u in range(1, n_users + 1) for g in range(3)
+    ])
+    investments = [f"inv_{u}_0" for u in range(1, n_users + 1)]
+    conn.execute(insert(Plaid_Investment), [
+        {"user_id": int(acc.split("_")[1]), "account_id": acc, "name": acc, "type": "investment"} for acc in investments
+    ])
+    conn.execute(insert(Plaid_Investment_Holding), [
+        {"holding_id": f"{acc}_sec_{s}", "account_id": acc, "security_id": f"sec_{s}", "symbol": f"T{s}",
+         "quantity": 1.0, "price": 10.0, "value": 10.0}
+        for acc in investments for s in range(HOLDINGS_PER_ACCOUNT)
+    ])
+    conn.execute(insert(Holding_Snapshot), [
+        {"user_id": int(acc.split("_")[1]), "account_id": acc, "security_id": f"sec_{s}", "day": start + timedelta(days=7 * w),
+         "quantity": 1.0, "price": 10.0, "value": 10.0}
+        for acc in investments for s in range(5) for w in range(0, 5 * 52, 4)
+    ])
+    conn.execute(insert(Spend_Rollup), [
+        {"user_id": u, "category_id": (u - 1) * CATEGORIES_PER_USER + 1, "account_id": f"acc_{u}_0", "bucket": "month",
+         "bucket_start": date(2019 + m // 12, m % 12 + 1, 1), "spend": 10.0, "net": 10.0, "txn_count": 1}
+        for u in range(1, n_users + 1) for m in range(60)
+    ])
+
+
+def check(engine, n_users: int) -> list:
+    """Build and seed the schema, then return (name, plan, full scan rows) for every hot query."""
+    models.Base.metadata.create_all(engine)
+    run_migrations(engine)
+    with engine.begin() as conn:
+        seed(conn, n_users)
+        conn.execute(text("ANALYZE" if conn.dialect.name == "sqlite" else
+                          "ANALYZE TABLE " + ", ".join(f"`{t}`" for t in models.Base.metadata.tables)))
+    with engine.connect() as conn:
+        results = []
+        for name, stmt in hot_queries().items():
+            plan = explain(conn, stmt)
+            results.append((name, plan, full_scans(conn, plan)))
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if a hot query's plan falls back to a full table scan")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--database-url", default=None, help="Scratch database to seed and check (default: in-memory SQLite)")
+    args = parser.parse_args()
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+
+    failed = 0
+    for name, plan, scans in check(engine, args.users):
+        failed += bool(scans)
+        print(f"{'FULL SCAN' if scans else 'ok':9s}  {name}")
+        for row in plan:
+            print(f"           {'!' if row in scans else ' '} {row}")
+    print(f"{failed} of {len(hot_queries())} hot queries fall back to a full table scan" if failed else "All hot queries use an index")
+    sys.exit(1 if failed else 0)
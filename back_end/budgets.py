@@ -0,0 +1,167 @@
+import argparse
+from datetime import date, datetime
+from typing import Annotated
+from fastapi import APIRouter, Depends, Query, status
+from sqlalchemy import select, delete, func, case, and_, literal, union_all
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import User_Categories, Spend_Rollup, Budget_Status
+from auth import get_current_user
+from bulk_writer import upsert_from_select
+from ingestion import register_post_commit_hook
+from rollups import bucket_start
+
+router = APIRouter(
+    prefix='/budgets',
+    tags=['budgets']
+)
+
+# ==================== Dependencies ====================
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+db_dependency = Annotated[Session, Depends(get_db)]
+user_dependency = Annotated[dict, Depends(get_current_user)]
+
+# Share of weekly_limit at which a category is flagged before it goes over
+WARNING_RATIO = 0.8
+
+# ==================== Logic ====================
+def budget_query(week_start: date | None = None, user_id: int | None = None, category_ids=None, weeks=None):
+    """
+    One row per category with a weekly_limit: spend so far this week (from the weekly rollup) and a status.
+    Categories without spend this week report 0.
+    Pass `weeks`, a selectable of (category_id, week_start) pairs, instead of `week_start` to report
+    each of those categories for its own week(s).
+    """
+    week = literal(week_start) if weeks is None else weeks.c.week_start
+    spent = func.coalesce(func.sum(Spend_Rollup.spend), 0.0)
+    query = select(
+        User_Categories.user_id,
+        User_Categories.id.label("category_id"),
+        week.label("week_start"),
+        User_Categories.name,
+        User_Categories.weekly_limit,
+        spent.label("spent"),
+        case(
+            (spent > User_Categories.weekly_limit, "over"),
+            (spent >= User_Categories.weekly_limit * WARNING_RATIO, "warning"),
+            else_="ok",
+        ).label("status"),
+    )
+    group_by = [User_Categories.user_id, User_Categories.id, User_Categories.name, User_Categories.weekly_limit]
+    if weeks is not None:
+        query = query.join(weeks, weeks.c.category_id == User_Categories.id)
+        group_by.append(week)
+    query = (
+        query
+        .outerjoin(Spend_Rollup, and_(
+            Spend_Rollup.user_id == User_Categories.user_id,  # leading column of ix_spend_rollup_user_bucket
+            Spend_Rollup.category_id == User_Categories.id,
+            Spend_Rollup.bucket == "week",
+            Spend_Rollup.bucket_start == week,
+        ))
+        .where(User_Categories.weekly_limit.isnot(None))
+        .group_by(*group_by)
+    )
+    if user_id is not None:
+        query = query.where(User_Categories.user_id == user_id)
+    if category_ids is not None:
+        query = query.where(User_Categories.id.in_(category_ids))
+    return query
+
+def store_budget_statuses(db: Session, statuses) -> None:
+    """Upsert the rows of a budget_query into Budget_Status with a single INSERT ... SELECT."""
+    statuses = statuses.subquery()
+    query = select(
+        statuses.c.user_id,
+        statuses.c.category_id,
+        statuses.c.week_start,
+        statuses.c.spent,
+        statuses.c.weekly_limit,
+        statuses.c.status,
+        literal(datetime.utcnow()).label("evaluated_at"),
+    )
+    upsert_from_select(
+        db,
+        Budget_Status,
+        ["user_id", "category_id", "week_start", "spent", "weekly_limit", "status", "evaluated_at"],
+        query,
+        ["category_id", "week_start"],
+        ["spent", "weekly_limit", "status", "evaluated_at"],
+    )
+    db.commit()
+
+def evaluate_budgets(db: Session, week_start: date | None = None, category_ids=None) -> None:
+    """
+    Store every budgeted category's status for the week in Budget_Status.
+    Pass `category_ids` to re-evaluate only those categories.
+    """
+    week_start = bucket_start("week", week_start or date.today())
+    store_budget_statuses(db, budget_query(week_start, category_ids=category_ids))
+
+def evaluate_touched_buckets(db: Session, touched) -> None:
+    """Re-evaluate only the (category, week) pairs whose weekly rollup buckets changed, in one statement."""
+    pairs = {(category_id, start) for _, category_id, bucket, start in touched if bucket == "week"}
+    if not pairs:
+        return
+    weeks = union_all(*(
+        select(literal(category_id).label("category_id"), literal(start).label("week_start"))
+        for category_id, start in sorted(pairs)
+    )).subquery("touched_weeks")
+    store_budget_statuses(db, budget_query(weeks=weeks))
+
+def evaluate_category(db: Session, category_id: int) -> None:
+    """Bring this week's status in line with a category's current weekly_limit (dropping it if unset)."""
+    week_start = bucket_start("week", date.today())
+    db.execute(delete(Budget_Status).where(
+        Budget_Status.category_id == category_id,
+        Budget_Status.week_start == week_start,
+    ))
+    store_budget_statuses(db, budget_query(week_start, category_ids=[category_id]))
+
+@register_post_commit_hook
+def reevaluate_budgets_after_ingestion(db: Session, event: dict):
+    evaluate_touched_buckets(db, event["touched_buckets"])
+
+# ==================== Routes ====================
+@router.get("/status", status_code=status.HTTP_200_OK)
+async def get_budget_status(
+    user: user_dependency,
+    db: db_dependency,
+    week_start: date | None = Query(None, description="Any day in the week to report; defaults to this week")
+):
+    week_start = bucket_start("week", week_start or date.today())
+    return {
+        "week_start": week_start,
+        "categories": [
+            {
+                "category_id": row.category_id,
+                "name": row.name,
+                "weekly_limit": row.weekly_limit,
+                "spent": float(row.spent),
+                "remaining": row.weekly_limit - float(row.spent),
+                "status": row.status,
+            }
+            for row in db.execute(budget_query(week_start, user_id=user["id"]))
+        ],
+    }
+
+# Evaluate every user's budgets, e.g. from cron:
+#   python budgets.py evaluate [--week YYYY-MM-DD]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Weekly budget evaluation")
+    parser.add_argument("command", choices=["evaluate"])
+    parser.add_argument("--week", type=date.fromisoformat, default=None, help="Any day in the week to evaluate")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        evaluate_budgets(db, args.week)
+        print("Budgets evaluated")
+    finally:
+        db.close()
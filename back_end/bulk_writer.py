@@ -0,0 +1,284 @@
+from collections import defaultdict
+from sqlalchemy import select, update, delete, insert as generic_insert, bindparam, and_, tuple_, true
+from sqlalchemy.orm import Session
+from models import Plaid_Bank_Account, Plaid_Transactions, Transaction_Category_Link, Plaid_Investment_Holding
+from user_categories import CategoryResolver
+from rollups import RollupDelta, apply_rollup_deltas
+
+# Rows per INSERT statement; keeps statements well under MySQL's max_allowed_packet
+BATCH_SIZE = 500
+
+# Columns that are rewritten when Plaid sends a transaction we already have
+TRANSACTION_COLUMNS = ("account_id", "amount", "currency", "category", "merchant_name", "date")
+HOLDING_COLUMNS = ("account_id", "security_id", "symbol", "name", "quantity", "price", "value", "currency")
+
+
+def chunked(items, size: int = BATCH_SIZE):
+    """Yield successive lists of at most `size` items."""
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _dialect_insert(db: Session):
+    """Return the dialect name and the matching insert() construct for the session's engine."""
+    name = db.get_bind().dialect.name
+    if name in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert
+    elif name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        insert = None
+    return name, insert
+
+
+def upsert_rows(db: Session, model, rows: list, key_columns: list, update_columns, increment_columns=()) -> None:
+    """
+    Insert `rows` in batches, updating `update_columns` when a row with the same key exists.
+    `increment_columns` are added to the stored value instead of replacing it.
+    Uses ON DUPLICATE KEY UPDATE on MySQL and ON CONFLICT on PostgreSQL/SQLite.
+    Empty `update_columns` and `increment_columns` leave existing rows untouched.
+    """
+    if not rows:
+        return
+    table = model.__table__
+    name, insert = _dialect_insert(db)
+
+    for batch in chunked(rows):
+        if insert is None:
+            _upsert_fallback(db, table, batch, key_columns, update_columns, increment_columns)
+            continue
+
+        stmt = insert(table).values(batch)
+        if name in ("mysql", "mariadb"):
+            # MySQL needs at least one assignment; re-assigning the key is a no-op
+            assignments = {c: stmt.inserted[c] for c in update_columns or key_columns[:1]}
+            assignments.update({c: table.c[c] + stmt.inserted[c] for c in increment_columns})
+            stmt = stmt.on_duplicate_key_update(assignments)
+        elif update_columns or increment_columns:
+            assignments = {c: stmt.excluded[c] for c in update_columns}
+            assignments.update({c: table.c[c] + stmt.excluded[c] for c in increment_columns})
+            stmt = stmt.on_conflict_do_update(index_elements=key_columns, set_=assignments)
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=key_columns)
+        db.execute(stmt)
+
+
+def upsert_from_select(db: Session, model, columns: list, query, key_columns: list, update_columns) -> None:
+    """INSERT ... SELECT with the same conflict handling as upsert_rows, so the rows never leave the database."""
+    table = model.__table__
+    name, insert = _dialect_insert(db)
+    if insert is None:
+        rows = [dict(zip(columns, row)) for row in db.execute(query)]
+        upsert_rows(db, model, rows, key_columns, update_columns)
+        return
+
+    if name == "sqlite":
+        query = query.where(true())  # SQLite needs a WHERE to parse INSERT ... SELECT ... ON CONFLICT
+    stmt = insert(table).from_select(columns, query)
+    if name in ("mysql", "mariadb"):
+        stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in update_columns})
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=key_columns, set_={c: stmt.excluded[c] for c in update_columns})
+    db.execute(stmt)
+
+
+def _upsert_fallback(db: Session, table, batch: list, key_columns: list, update_columns, increment_columns) -> None:
+    """Portable upsert for dialects without a native statement: one SELECT, one INSERT, one UPDATE."""
+    keys = [table.c[c] for c in key_columns]
+
+    def row_key(r):
+        return tuple(r[c] for c in key_columns)
+
+    existing = set(db.execute(select(*keys).where(tuple_(*keys).in_([row_key(r) for r in batch]))).all())
+
+    new_rows = [r for r in batch if row_key(r) not in existing]
+    if new_rows:
+        db.execute(generic_insert(table), new_rows)
+
+    changed = [r for r in batch if row_key(r) in existing]
+    if changed and (update_columns or increment_columns):
+        values = {c: bindparam(f"_{c}") for c in update_columns}
+        values.update({c: table.c[c] + bindparam(f"_{c}") for c in increment_columns})
+        stmt = (
+            update(table)
+            .where(and_(*(k == bindparam(f"_key_{k.name}") for k in keys)))
+            .values(values)
+        )
+        db.execute(stmt, [
+            {**{f"_key_{c}": r[c] for c in key_columns}, **{f"_{c}": r[c] for c in (*update_columns, *increment_columns)}}
+            for r in changed
+        ])
+
+
+def bulk_upsert_transactions(db: Session, rows: list, commit: bool = True, resolvers: dict = None, rollup: RollupDelta = None) -> dict:
+    """
+    Write normalized transaction rows and their category links with a fixed number of statements.
+    Rows must be unique by transaction_id (see ingestion.dedupe_transactions).
+    Pass the same `resolvers` dict (user_id -> CategoryResolver) across pages to reuse category lookups,
+    and a shared `rollup` to apply Spend_Rollup changes once at the end instead of per call.
+    Returns the number of rows inserted, updated and skipped (unchanged or unknown account).
+    """
+    result = {"inserted": 0, "updated": 0, "skipped": 0}
+    by_id = {r["transaction_id"]: r for r in rows}
+    if not by_id:
+        return result
+
+    # 1) Resolve account_id -> user_id once for every account in the batch
+    account_ids = {r["account_id"] for r in by_id.values()}
+    account_users = {}
+    for batch in chunked(account_ids):
+        account_users.update(db.execute(
+            select(Plaid_Bank_Account.account_id, Plaid_Bank_Account.user_id)
+            .where(Plaid_Bank_Account.account_id.in_(batch))
+        ).all())
+
+    # 2) Prefetch the transactions we already have, with their current category link
+    existing = {}
+    columns = [Plaid_Transactions.transaction_id] + [getattr(Plaid_Transactions, c) for c in TRANSACTION_COLUMNS]
+    for batch in chunked(by_id):
+        query = (
+            select(*columns, Transaction_Category_Link.category_id)
+            .outerjoin(Transaction_Category_Link, Transaction_Category_Link.transaction_id == Plaid_Transactions.transaction_id)
+            .where(Plaid_Transactions.transaction_id.in_(batch))
+        )
+        for row in db.execute(query):
+            existing[row.transaction_id] = row
+
+    # 3) Classify rows as new, changed or unchanged
+    to_write = []
+    for tx_id, r in by_id.items():
+        if r["account_id"] not in account_users:
+            result["skipped"] += 1  # the FK would reject it anyway
+            continue
+        old = existing.get(tx_id)
+        if old is None:
+            result["inserted"] += 1
+        elif any(getattr(old, c) != r[c] for c in TRANSACTION_COLUMNS):
+            result["updated"] += 1
+        else:
+            result["skipped"] += 1
+            continue
+        to_write.append(r)
+
+    upsert_rows(db, Plaid_Transactions, to_write, ["transaction_id"], TRANSACTION_COLUMNS)
+
+    # 4) Link written transactions to the owning user's categories
+    category_ids = _link_categories(db, to_write, account_users, {} if resolvers is None else resolvers)
+
+    # 5) Move each written transaction's contribution between spend rollup buckets
+    delta = RollupDelta() if rollup is None else rollup
+    for r in to_write:
+        user_id = account_users[r["account_id"]]
+        old = existing.get(r["transaction_id"])
+        if old is not None:
+            delta.add_transaction(user_id, old.category_id, old.account_id, old.date, old.amount, sign=-1)
+        delta.add_transaction(user_id, category_ids.get(r["transaction_id"]), r["account_id"], r["date"], r["amount"])
+    if rollup is None:
+        apply_rollup_deltas(db, delta)
+
+    if commit:
+        db.commit()
+    return result
+
+
+def _link_categories(db: Session, rows: list, account_users: dict, resolvers: dict) -> dict:
+    """Upsert Transaction_Category_Link rows, creating any missing user categories first. Returns transaction_id -> category_id."""
+    # Drop links for transactions that no longer carry a category
+    uncategorized = [r["transaction_id"] for r in rows if not r["category"]]
+    for batch in chunked(uncategorized):
+        db.execute(delete(Transaction_Category_Link).where(Transaction_Category_Link.transaction_id.in_(batch)))
+
+    names_by_user = defaultdict(set)
+    for r in rows:
+        if r["category"]:
+            names_by_user[account_users[r["account_id"]]].add(r["category"])
+
+    category_ids = {}
+    for user_id, names in names_by_user.items():
+        if user_id not in resolvers:
+            resolvers[user_id] = CategoryResolver(db, user_id)
+        for name, category_id in resolvers[user_id].resolve(names).items():
+            category_ids[(user_id, name)] = category_id
+
+    links = [
+        {"transaction_id": r["transaction_id"], "category_id": category_ids[(account_users[r["account_id"]], r["category"])]}
+        for r in rows
+        if r["category"]
+    ]
+    upsert_rows(db, Transaction_Category_Link, links, ["transaction_id"], ["category_id"])
+    return {link["transaction_id"]: link["category_id"] for link in links}
+
+
+def delete_transactions(db: Session, transaction_ids: list, commit: bool = True, rollup: RollupDelta = None) -> int:
+    """Delete transactions (and their category links) that Plaid reports as removed."""
+    removed = 0
+    delta = RollupDelta() if rollup is None else rollup
+    for batch in chunked(set(transaction_ids)):
+        # Uncount them from the spend rollups first
+        old_rows = db.execute(
+            select(
+                Plaid_Bank_Account.user_id,
+                Transaction_Category_Link.category_id,
+                Plaid_Transactions.account_id,
+                Plaid_Transactions.date,
+                Plaid_Transactions.amount,
+            )
+            .join(Plaid_Bank_Account, Plaid_Bank_Account.account_id == Plaid_Transactions.account_id)
+            .join(Transaction_Category_Link, Transaction_Category_Link.transaction_id == Plaid_Transactions.transaction_id)
+            .where(Plaid_Transactions.transaction_id.in_(batch))
+        )
+        for old in old_rows:
+            delta.add_transaction(old.user_id, old.category_id, old.account_id, old.date, old.amount, sign=-1)
+
+        db.execute(delete(Transaction_Category_Link).where(Transaction_Category_Link.transaction_id.in_(batch)))
+        removed += db.execute(delete(Plaid_Transactions).where(Plaid_Transactions.transaction_id.in_(batch))).rowcount
+    if rollup is None:
+        apply_rollup_deltas(db, delta)
+    if commit:
+        db.commit()
+    return removed
+
+
+def bulk_upsert_holdings(db: Session, account_ids, rows: list, commit: bool = True) -> dict:
+    """
+    Replace the stored holdings of `account_ids` with `rows`, a full holdings snapshot keyed by holding_id.
+    Holdings no longer in the snapshot are deleted and unchanged ones are not written.
+    Returns the number of rows inserted, updated, skipped and deleted.
+    """
+    result = {"inserted": 0, "updated": 0, "skipped": 0, "deleted": 0}
+    account_ids = set(account_ids)
+    by_id = {r["holding_id"]: r for r in rows if r["account_id"] in account_ids}
+
+    # 1) Prefetch every stored holding of these accounts
+    existing = {}
+    columns = [Plaid_Investment_Holding.holding_id] + [getattr(Plaid_Investment_Holding, c) for c in HOLDING_COLUMNS]
+    for batch in chunked(account_ids):
+        for row in db.execute(select(*columns).where(Plaid_Investment_Holding.account_id.in_(batch))):
+            existing[row.holding_id] = row
+
+    # 2) Classify rows as new, changed or unchanged
+    to_write = []
+    for holding_id, r in by_id.items():
+        old = existing.get(holding_id)
+        if old is None:
+            result["inserted"] += 1
+        elif any(getattr(old, c) != r[c] for c in HOLDING_COLUMNS):
+            result["updated"] += 1
+        else:
+            result["skipped"] += 1
+            continue
+        to_write.append(r)
+    upsert_rows(db, Plaid_Investment_Holding, to_write, ["holding_id"], HOLDING_COLUMNS)
+
+    # 3) Positions missing from the snapshot were sold or moved
+    for batch in chunked(set(existing) - set(by_id)):
+        result["deleted"] += db.execute(
+            delete(Plaid_Investment_Holding).where(Plaid_Investment_Holding.holding_id.in_(batch))
+        ).rowcount
+
+    if commit:
+        db.commit()
+    return result
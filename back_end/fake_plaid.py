@@ -0,0 +1,290 @@
+"""
+Local stand-in for the Plaid API so ingestion can be exercised offline.
+
+Run it with:
+    uvicorn fake_plaid:app --port 8001
+and point the backend at it with PLAID_HOST=http://localhost:8001.
+
+Responses carry every field the plaid-python SDK requires, so the real client
+deserializes them unchanged. Use POST /fake/mutate to add, modify or remove
+transactions on an item between syncs. Set FAKE_PLAID_LATENCY_MS to delay
+every response and simulate a slow upstream, and FAKE_PLAID_RATE_LIMIT_RPS (or
+POST /fake/rate_limit) to answer with RATE_LIMIT_EXCEEDED above that rate.
+"""
+import asyncio
+import os
+import random
+import time
+import uuid
+from collections import deque
+from datetime import date, timedelta
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI()
+
+# Number of transactions each newly linked item starts with
+SEED_TRANSACTIONS = int(os.getenv("FAKE_PLAID_SEED_TRANSACTIONS", "250"))
+# Artificial delay added to every response
+LATENCY_MS = int(os.getenv("FAKE_PLAID_LATENCY_MS", "0"))
+# Requests per second served before RATE_LIMIT_EXCEEDED; 0 means unlimited
+RATE_LIMIT_RPS = int(os.getenv("FAKE_PLAID_RATE_LIMIT_RPS", "0"))
+
+CATEGORIES = ["FOOD_AND_DRINK", "GENERAL_MERCHANDISE", "TRANSPORTATION", "ENTERTAINMENT", "RENT_AND_UTILITIES"]
+MERCHANTS = ["Starbucks", "Target", "Uber", "Netflix", "Shell", "Amazon", "Chipotle"]
+
+# access_token -> item state
+items = {}
+# Arrival times of requests in the last second, for the rate limit
+recent_requests = deque()
+
+
+class FakeItem:
+    """In-memory item: accounts, current transactions and an append-only change log for /transactions/sync."""
+
+    def __init__(self, seed: int):
+        self.item_id = f"item-{seed}"
+        self.rng = random.Random(seed)
+        self.accounts = [
+            _account(f"acc-{seed}-chk", "Checking", "depository", "checking", 1250.0),
+            _account(f"acc-{seed}-cc", "Credit Card", "credit", "credit card", 410.5),
+            _account(f"acc-{seed}-inv", "Brokerage", "investment", "brokerage", 15230.0),
+        ]
+        self.transactions = {}
+        self.log = []  # list of (kind, transaction) where kind is added/modified/removed
+        for _ in range(SEED_TRANSACTIONS):
+            self.add_transaction()
+
+    def add_transaction(self):
+        tx_id = uuid.UUID(int=self.rng.getrandbits(128)).hex
+        days_ago = self.rng.randint(0, 29)
+        tx = {
+            "transaction_id": tx_id,
+            "account_id": self.rng.choice(self.accounts[:2])["account_id"],
+            "amount": round(self.rng.uniform(-50, 200), 2),
+            "iso_currency_code": "USD",
+            "unofficial_currency_code": None,
+            "date": (date.today() - timedelta(days=days_ago)).isoformat(),
+            "pending": False,
+            "authorized_date": None,
+            "authorized_datetime": None,
+            "datetime": None,
+            "payment_channel": "in store",
+            "transaction_code": None,
+            "name": self.rng.choice(MERCHANTS),
+            "merchant_name": self.rng.choice(MERCHANTS),
+            "personal_finance_category": {
+                "primary": self.rng.choice(CATEGORIES),
+                "detailed": "OTHER",
+                "confidence_level": "HIGH",
+            },
+        }
+        self.transactions[tx_id] = tx
+        self.log.append(("added", tx))
+
+    def modify_transaction(self):
+        if not self.transactions:
+            return
+        tx = dict(self.transactions[self.rng.choice(list(self.transactions))])
+        tx["amount"] = round(tx["amount"] + 1, 2)
+        tx["personal_finance_category"] = dict(tx["personal_finance_category"], primary=self.rng.choice(CATEGORIES))
+        self.transactions[tx["transaction_id"]] = tx
+        self.log.append(("modified", tx))
+
+    def remove_transaction(self):
+        if not self.transactions:
+            return
+        tx = self.transactions.pop(self.rng.choice(list(self.transactions)))
+        self.log.append(("removed", {"transaction_id": tx["transaction_id"], "account_id": tx["account_id"]}))
+
+    def item(self):
+        return {
+            "item_id": self.item_id,
+            "webhook": None,
+            "error": None,
+            "available_products": [],
+            "billed_products": ["transactions", "investments"],
+            "consent_expiration_time": None,
+            "update_type": "background",
+        }
+
+
+def _account(account_id, name, type_, subtype, balance):
+    return {
+        "account_id": account_id,
+        "balances": {
+            "available": balance,
+            "current": balance,
+            "limit": None,
+            "iso_currency_code": "USD",
+            "unofficial_currency_code": None,
+        },
+        "mask": "0000",
+        "name": name,
+        "official_name": None,
+        "type": type_,
+        "subtype": subtype,
+    }
+
+
+def plaid_error(error_type: str, error_code: str, message: str, status_code: int = 400):
+    """Return an error body shaped like Plaid's."""
+    return JSONResponse(status_code=status_code, content={
+        "error_type": error_type,
+        "error_code": error_code,
+        "error_message": message,
+        "display_message": None,
+        "request_id": uuid.uuid4().hex,
+    })
+
+
+async def _item_for(request: Request):
+    body = await request.json()
+    item = items.get(body.get("access_token"))
+    return body, item
+
+
+def _invalid_token():
+    return plaid_error("INVALID_INPUT", "INVALID_ACCESS_TOKEN", "provided access token is in an invalid format")
+
+
+@app.middleware("http")
+async def add_latency(request: Request, call_next):
+    if LATENCY_MS:
+        await asyncio.sleep(LATENCY_MS / 1000)
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def rate_limit(request: Request, call_next):
+    if RATE_LIMIT_RPS and not request.url.path.startswith("/fake/"):
+        now = time.monotonic()
+        while recent_requests and recent_requests[0] <= now - 1:
+            recent_requests.popleft()
+        if len(recent_requests) >= RATE_LIMIT_RPS:
+            return plaid_error("RATE_LIMIT_EXCEEDED", "RATE_LIMIT_EXCEEDED", "rate limit exceeded", status_code=429)
+        recent_requests.append(now)
+    return await call_next(request)
+
+
+# ==================== Routes ====================
+@app.post("/link/token/create")
+async def link_token_create():
+    return {"link_token": f"link-fake-{uuid.uuid4().hex}", "expiration": "2099-01-01T00:00:00Z", "request_id": uuid.uuid4().hex}
+
+
+@app.post("/item/public_token/exchange")
+async def item_public_token_exchange(request: Request):
+    seed = len(items) + 1
+    access_token = f"access-fake-{seed}"
+    items[access_token] = FakeItem(seed)
+    return {"access_token": access_token, "item_id": items[access_token].item_id, "request_id": uuid.uuid4().hex}
+
+
+@app.post("/accounts/get")
+@app.post("/accounts/balance/get")
+async def accounts_get(request: Request):
+    _, item = await _item_for(request)
+    if item is None:
+        return _invalid_token()
+    return {"accounts": item.accounts, "item": item.item(), "request_id": uuid.uuid4().hex}
+
+
+@app.post("/transactions/get")
+async def transactions_get(request: Request):
+    body, item = await _item_for(request)
+    if item is None:
+        return _invalid_token()
+    options = body.get("options") or {}
+    count = min(int(options.get("count", 100)), 500)
+    offset = int(options.get("offset", 0))
+    matching = sorted(
+        (t for t in item.transactions.values() if body["start_date"] <= t["date"] <= body["end_date"]),
+        key=lambda t: (t["date"], t["transaction_id"]),
+        reverse=True,
+    )
+    return {
+        "accounts": item.accounts,
+        "transactions": matching[offset:offset + count],
+        "total_transactions": len(matching),
+        "item": item.item(),
+        "request_id": uuid.uuid4().hex,
+    }
+
+
+@app.post("/transactions/sync")
+async def transactions_sync(request: Request):
+    body, item = await _item_for(request)
+    if item is None:
+        return _invalid_token()
+    count = min(int(body.get("count") or 100), 500)
+    try:
+        start = int(body.get("cursor") or 0)
+    except ValueError:
+        return plaid_error("INVALID_INPUT", "INVALID_FIELD", "cursor is invalid")
+
+    page = item.log[start:start + count]
+    changes = {"added": [], "modified": [], "removed": []}
+    for kind, tx in page:
+        changes[kind].append(tx)
+    next_cursor = start + len(page)
+    return {
+        "transactions_update_status": "HISTORICAL_UPDATE_COMPLETE",
+        "accounts": item.accounts,
+        **changes,
+        "next_cursor": str(next_cursor),
+        "has_more": next_cursor < len(item.log),
+        "request_id": uuid.uuid4().hex,
+    }
+
+
+@app.post("/investments/holdings/get")
+async def investments_holdings_get(request: Request):
+    _, item = await _item_for(request)
+    if item is None:
+        return _invalid_token()
+    account_id = item.accounts[2]["account_id"]
+    securities, holdings = [], []
+    for i, (ticker, price) in enumerate([("AAPL", 190.1), ("MSFT", 410.3), ("VTI", 250.7)]):
+        security_id = f"sec-{ticker}"
+        quantity = 10.0 + i
+        securities.append({
+            "security_id": security_id, "name": ticker, "ticker_symbol": ticker, "type": "equity",
+            "close_price": price, "iso_currency_code": "USD",
+        })
+        holdings.append({
+            "account_id": account_id, "security_id": security_id, "quantity": quantity,
+            "institution_price": price, "institution_value": round(price * quantity, 2),
+            "cost_basis": None, "iso_currency_code": "USD", "unofficial_currency_code": None,
+        })
+    return {
+        "accounts": [item.accounts[2]],
+        "holdings": holdings,
+        "securities": securities,
+        "item": item.item(),
+        "request_id": uuid.uuid4().hex,
+    }
+
+
+@app.post("/fake/mutate")
+async def mutate(request: Request):
+    """Simulate activity on an item: {"access_token": ..., "added": n, "modified": n, "removed": n}."""
+    body, item = await _item_for(request)
+    if item is None:
+        return _invalid_token()
+    for _ in range(int(body.get("added", 0))):
+        item.add_transaction()
+    for _ in range(int(body.get("modified", 0))):
+        item.modify_transaction()
+    for _ in range(int(body.get("removed", 0))):
+        item.remove_transaction()
+    return {"log_size": len(item.log), "transactions": len(item.transactions)}
+
+
+@app.post("/fake/rate_limit")
+async def set_rate_limit(request: Request):
+    """Change the rate limit at runtime: {"requests_per_second": n}, 0 to disable."""
+    global RATE_LIMIT_RPS
+    RATE_LIMIT_RPS = int((await request.json()).get("requests_per_second", 0))
+    recent_requests.clear()
+    return {"requests_per_second": RATE_LIMIT_RPS}
@@ -0,0 +1,166 @@
+import argparse
+import os
+from collections import defaultdict
+from datetime import date, timedelta
+from sqlalchemy import select, delete, func
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import Holding_Snapshot, Plaid_Investment, Plaid_Investment_Holding
+from bulk_writer import upsert_rows, chunked
+
+# Daily holdings history for portfolio performance charts. Every investment sync writes one row
+# per (account, security, day) for all of the user's investment accounts, not just the synced
+# item's, so each snapshot day holds the whole portfolio; re-syncing on the same day overwrites
+# that day's rows. Each account's rows older than DAILY_DAYS are thinned to its last snapshot day
+# of each week, and rows older than WEEKLY_DAYS to its last snapshot day of each month, so a
+# 5-year series stays small. The value series reports one point per week or month over that range.
+
+DAILY_DAYS = int(os.getenv("HOLDING_SNAPSHOT_DAILY_DAYS", "90"))
+WEEKLY_DAYS = int(os.getenv("HOLDING_SNAPSHOT_WEEKLY_DAYS", "730"))
+SNAPSHOT_COLUMNS = ["user_id", "symbol", "quantity", "price", "value"]
+
+# ==================== Writes ====================
+def write_holding_snapshot(db: Session, user_id: int, day: date | None = None) -> int:
+    """
+    Record today's stored holdings of every investment account of the user without committing.
+    Call after the sync has written the synced item's holdings. Positions that were in an earlier
+    snapshot of the same day but are gone now, including whole unlinked accounts, are removed.
+    """
+    day = day or date.today()
+    holdings = db.execute(
+        select(
+            Plaid_Investment_Holding.account_id,
+            Plaid_Investment_Holding.security_id,
+            Plaid_Investment_Holding.symbol,
+            Plaid_Investment_Holding.quantity,
+            Plaid_Investment_Holding.price,
+            Plaid_Investment_Holding.value,
+        )
+        .join(Plaid_Investment, Plaid_Investment.account_id == Plaid_Investment_Holding.account_id)
+        .where(Plaid_Investment.user_id == user_id)
+    ).all()
+    rows = {
+        (h.account_id, h.security_id or ""): {
+            "user_id": user_id,
+            "account_id": h.account_id,
+            "security_id": h.security_id or "",
+            "day": day,
+            "symbol": h.symbol,
+            "quantity": h.quantity,
+            "price": h.price,
+            "value": h.value,
+        }
+        for h in holdings
+    }
+    upsert_rows(db, Holding_Snapshot, list(rows.values()), ["account_id", "security_id", "day"], SNAPSHOT_COLUMNS)
+
+    # Sold or unlinked since the last sync today
+    stale = db.execute(
+        select(Holding_Snapshot.id, Holding_Snapshot.account_id, Holding_Snapshot.security_id)
+        .where(Holding_Snapshot.user_id == user_id, Holding_Snapshot.day == day)
+    ).all()
+    stale_ids = [row.id for row in stale if (row.account_id, row.security_id) not in rows]
+    for batch in chunked(stale_ids):
+        db.execute(delete(Holding_Snapshot).where(Holding_Snapshot.id.in_(batch)))
+    return len(rows)
+
+# ==================== Downsampling ====================
+def retained_day(day: date, today: date) -> tuple:
+    """(granularity, bucket start) that an old snapshot day falls into: week from Monday, or month."""
+    age = (today - day).days
+    if age >= WEEKLY_DAYS:
+        return "month", day.replace(day=1)
+    return "week", day - timedelta(days=day.weekday())
+
+def downsample_user_snapshots(db: Session, user_id: int, today: date | None = None) -> int:
+    """
+    Keep only each account's last snapshot day in each week (older than DAILY_DAYS) or month (older
+    than WEEKLY_DAYS). Accounts synced on different days each keep their own latest day, so no
+    account drops out of a bucket. Returns rows deleted.
+    """
+    today = today or date.today()
+    days = db.execute(
+        select(Holding_Snapshot.account_id, Holding_Snapshot.day).distinct()
+        .where(Holding_Snapshot.user_id == user_id, Holding_Snapshot.day < today - timedelta(days=DAILY_DAYS))
+    ).all()
+
+    # 1) Group each account's old days into buckets and keep the latest day of each
+    buckets = defaultdict(list)
+    for account_id, day in days:
+        buckets[(account_id, retained_day(day, today))].append(day)
+    dropped = defaultdict(list)  # account_id -> days
+    for (account_id, _), bucket_days in buckets.items():
+        dropped[account_id].extend(sorted(bucket_days)[:-1])
+
+    # 2) Delete every other day's rows, account by account
+    deleted = 0
+    for account_id, account_days in dropped.items():
+        for batch in chunked(account_days):
+            deleted += db.execute(
+                delete(Holding_Snapshot).where(
+                    Holding_Snapshot.user_id == user_id,
+                    Holding_Snapshot.account_id == account_id,
+                    Holding_Snapshot.day.in_(batch),
+                )
+            ).rowcount
+    return deleted
+
+def downsample_snapshots(db: Session, user_id: int | None = None) -> int:
+    """Downsample one user or every user with snapshots, committing per user."""
+    user_ids = [user_id] if user_id is not None else db.execute(select(Holding_Snapshot.user_id).distinct()).scalars().all()
+    deleted = 0
+    for uid in user_ids:
+        deleted += downsample_user_snapshots(db, uid)
+        db.commit()
+    return deleted
+
+# ==================== Queries ====================
+def value_series_query(user_id: int, start: date, end: date, account_id: str | None = None):
+    """Value of each account on each snapshot day between start and end, in day order."""
+    query = (
+        select(Holding_Snapshot.account_id, Holding_Snapshot.day, func.sum(Holding_Snapshot.value).label("value"))
+        .where(Holding_Snapshot.user_id == user_id, Holding_Snapshot.day >= start, Holding_Snapshot.day <= end)
+        .group_by(Holding_Snapshot.day, Holding_Snapshot.account_id)  # index order, so no sort step
+        .order_by(Holding_Snapshot.day, Holding_Snapshot.account_id)
+    )
+    if account_id is not None:
+        query = query.where(Holding_Snapshot.account_id == account_id)
+    return query
+
+def get_value_series(db: Session, user_id: int, start: date, end: date, account_id: str | None = None,
+                     today: date | None = None) -> dict:
+    """
+    Portfolio value between start and end as columnar arrays: one point per snapshot day for the
+    last DAILY_DAYS, and one per week or month before that, summing each account's latest
+    snapshot in the bucket and dated on the bucket's last snapshot day.
+    """
+    today = today or date.today()
+
+    # 1) Latest (day, value) of each account per bucket; rows arrive in day order
+    daily_from = today - timedelta(days=DAILY_DAYS)
+    buckets = {}  # bucket -> {account_id: (day, value)}
+    for row in db.execute(value_series_query(user_id, start, end, account_id)):
+        bucket = ("day", row.day) if row.day >= daily_from else retained_day(row.day, today)
+        buckets.setdefault(bucket, {})[row.account_id] = (row.day, float(row.value or 0))
+
+    # 2) One point per bucket
+    points = sorted(
+        (max(day for day, _ in accounts.values()), sum(value for _, value in accounts.values()))
+        for accounts in buckets.values()
+    )
+    return {"day": [day.isoformat() for day, _ in points], "value": [value for _, value in points]}
+
+# Thin old history (also run on each user's investment sync):
+#   python holding_snapshots.py downsample [--user-id ID]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Holding snapshot maintenance")
+    parser.add_argument("command", choices=["downsample"])
+    parser.add_argument("--user-id", type=int, default=None, help="Only downsample this user's snapshots")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        deleted = downsample_snapshots(db, args.user_id)
+        print(f"Deleted {deleted} snapshot rows")
+    finally:
+        db.close()
@@ -0,0 +1,186 @@
+import math
+from operator import itemgetter
+import numpy as np
+
+# Technical indicators over contiguous float64 arrays. Every function is vectorized:
+# no Python loop runs per bar. Values before an indicator has enough history are NaN.
+
+# Longest EMA block whose decay factors stay well inside float64 range
+EMA_MAX_BLOCK = 8192
+EMA_MIN_DECAY = 1e-100
+
+
+def sma(x: np.ndarray, n: int) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    if n <= len(x):
+        csum = np.cumsum(np.concatenate(([0.0], x)))
+        out[n - 1:] = (csum[n:] - csum[:-n]) / n
+    return out
+
+
+def _ema_from(x: np.ndarray, alpha: float, seed: float) -> np.ndarray:
+    """y[t] = alpha * x[t] + (1 - alpha) * y[t - 1], with y[-1] = seed, in closed form per block."""
+    decay = 1.0 - alpha
+    out = np.empty(len(x))
+    if decay == 0.0:
+        out[:] = x
+        return out
+    # Within a block, y[j] = decay^(j+1) * y_prev + alpha * decay^j * cumsum(x[k] / decay^k)
+    block = max(1, min(EMA_MAX_BLOCK, int(math.log(EMA_MIN_DECAY) / math.log(decay))))
+    powers = decay ** np.arange(block + 1)
+    prev = seed
+    for start in range(0, len(x), block):
+        chunk = x[start:start + block]
+        m = len(chunk)
+        scaled = np.cumsum(chunk / powers[:m])
+        out[start:start + m] = powers[1:m + 1] * prev + alpha * powers[:m] * scaled
+        prev = out[start + m - 1]
+    return out
+
+
+def ema(x: np.ndarray, n: int, alpha: float | None = None) -> np.ndarray:
+    """Exponential moving average seeded with the SMA of the first n values; alpha defaults to 2 / (n + 1)."""
+    alpha = 2.0 / (n + 1) if alpha is None else alpha
+    out = np.full(len(x), np.nan)
+    valid = np.flatnonzero(~np.isnan(x))
+    if len(valid) < n:
+        return out
+    first = valid[0]  # inputs like the MACD line start with NaNs
+    seed_end = first + n
+    out[seed_end - 1] = x[first:seed_end].mean()
+    out[seed_end:] = _ema_from(x[seed_end:], alpha, out[seed_end - 1])
+    return out
+
+
+def rsi(close: np.ndarray, n: int = 14) -> np.ndarray:
+    """Wilder's RSI."""
+    out = np.full(len(close), np.nan)
+    if len(close) <= n:
+        return out
+    change = np.diff(close)
+    gain = ema(np.clip(change, 0, None), n, alpha=1.0 / n)
+    loss = ema(np.clip(-change, 0, None), n, alpha=1.0 / n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[1:] = np.where(loss == 0, 100.0, 100.0 - 100.0 / (1.0 + gain / loss))
+    return out
+
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> dict:
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return {"macd": line, "signal": signal_line, "hist": line - signal_line}
+
+
+def bollinger(close: np.ndarray, n: int = 20, k: float = 2.0) -> dict:
+    middle = sma(close, n)
+    # Rolling variance from windowed sums; centring first keeps E[x^2] - E[x]^2 accurate
+    centred = close - np.nanmean(close) if len(close) else close
+    variance = sma(centred * centred, n) - sma(centred, n) ** 2
+    std = np.sqrt(np.clip(variance, 0, None))
+    return {"middle": middle, "upper": middle + k * std, "lower": middle - k * std}
+
+
+def vwap(high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray,
+         session: np.ndarray | None = None) -> np.ndarray:
+    """Cumulative VWAP of the typical price, restarting wherever `session` (e.g. the trading day) changes."""
+    pv = np.cumsum((high + low + close) / 3.0 * volume)
+    vol = np.cumsum(volume)
+    if session is not None and len(session):
+        # Subtract the running totals as of each session's first bar
+        is_start = np.concatenate(([True], session[1:] != session[:-1]))
+        index = np.maximum.accumulate(np.where(is_start, np.arange(len(session)), 0))
+        pv = pv - np.concatenate(([0.0], pv))[index]
+        vol = vol - np.concatenate(([0.0], vol))[index]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(vol > 0, pv / vol, np.nan)
+
+
+# name -> (default params, function of (arrays, *params))
+INDICATORS = {
+    "sma": ((20,), lambda a, n: sma(a["close"], int(n))),
+    "ema": ((20,), lambda a, n: ema(a["close"], int(n))),
+    "rsi": ((14,), lambda a, n: rsi(a["close"], int(n))),
+    "macd": ((12, 26, 9), lambda a, f, s, g: macd(a["close"], int(f), int(s), int(g))),
+    "bollinger": ((20, 2.0), lambda a, n, k: bollinger(a["close"], int(n), float(k))),
+    "vwap": ((), lambda a: vwap(a["high"], a["low"], a["close"], a["volume"], a.get("session"))),
+}
+
+
+def parse_spec(spec: str) -> tuple:
+    """"macd:12:26:9" -> ("macd", (12.0, 26.0, 9.0)); missing params take the defaults.
+
+    Window lengths (the params whose default is an int) must be whole numbers of bars.
+    """
+    name, *raw = spec.strip().lower().split(":")
+    if name not in INDICATORS:
+        raise ValueError(f"Unknown indicator {name!r}; choose from {', '.join(INDICATORS)}")
+    defaults = INDICATORS[name][0]
+    if len(raw) > len(defaults):
+        raise ValueError(f"{name} takes at most {len(defaults)} parameters")
+    try:
+        params = tuple(float(p) for p in [*raw, *defaults[len(raw):]])
+    except ValueError:
+        raise ValueError(f"{name} parameters must be numbers, got {spec!r}")
+    for value, default in zip(params, defaults):
+        if isinstance(default, int) and (not value.is_integer() or value < 1):
+            raise ValueError(f"{name} window lengths must be integers >= 1, got {value:g}")
+        if not value > 0 or math.isinf(value):
+            raise ValueError(f"{name} parameters must be positive and finite")
+    return name, params
+
+
+def bars_to_arrays(bars: list, intraday: bool = False) -> dict:
+    """Bar dicts -> contiguous float64 columns (plus a per-day session id for intraday VWAP)."""
+    columns = ("timestamp", "open", "high", "low", "close", "volume")
+    # One C-level pass per column; the object -> float64 cast turns missing (None) values into NaN
+    arrays = {c: np.fromiter(map(itemgetter(c), bars), dtype=object, count=len(bars)).astype(np.float64)
+              for c in columns}
+    if intraday:
+        arrays["session"] = (arrays["timestamp"] // 86_400_000).astype(np.int64)
+    return arrays
+
+
+def compute(arrays: dict, specs) -> dict:
+    """Compute each parsed (name, params) spec over the bar arrays."""
+    results = {}
+    for name, params in specs:
+        key = ":".join([name, *(f"{p:g}" for p in params)])
+        results[key] = INDICATORS[name][1](arrays, *params)
+    return results
+
+
+def to_json_list(values: np.ndarray) -> list:
+    """Float list for JSON with NaN -> None; only the NaN positions are touched in Python."""
+    out = values.tolist()
+    for i in np.flatnonzero(np.isnan(values)).tolist():
+        out[i] = None
+    return out
+
+
+# Timing check: python indicators.py [bars]
+if __name__ == "__main__":
+    import sys
+    import time
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(0, 0.1, n))
+    arrays = {"close": close, "high": close + 0.05, "low": close - 0.05,
+              "volume": rng.integers(100, 10_000, n).astype(np.float64),
+              "session": np.arange(n) // 390}
+    specs = [parse_spec(s) for s in ("sma:20", "ema:50", "rsi:14", "macd", "bollinger:20:2", "vwap")]
+    compute(arrays, specs)  # warm up
+    start = time.perf_counter()
+    results = compute(arrays, specs)
+    print(f"{len(specs)} indicators over {n} bars: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    bars = [{"timestamp": i * 60_000, "open": c, "high": c + 0.05, "low": c - 0.05, "close": c, "volume": None}
+            for i, c in enumerate(close.tolist())]
+    start = time.perf_counter()
+    bars_to_arrays(bars, intraday=True)
+    print(f"bars_to_arrays over {n} bars: {(time.perf_counter() - start) * 1000:.2f} ms")
+    series = [v for value in results.values() for v in (value.values() if isinstance(value, dict) else [value])]
+    start = time.perf_counter()
+    for values in series:
+        to_json_list(values)
+    print(f"to_json_list over {len(series)} series: {(time.perf_counter() - start) * 1000:.2f} ms")
@@ -0,0 +1,360 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from time import perf_counter
+import queue
+import threading
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from plaid import ApiException
+from plaid.model.accounts_get_request import AccountsGetRequest
+from plaid.model.transactions_get_request import TransactionsGetRequest
+from plaid.model.transactions_get_request_options import TransactionsGetRequestOptions
+from plaid.model.transactions_sync_request import TransactionsSyncRequest
+from models import Plaid_Bank_Account, Plaid_Sync_State
+from plaid_client import client, PLAID_CLIENT_ID, PLAID_SECRET, PLAID_TIMEOUT_SECONDS, plaid_error_code
+from bulk_writer import upsert_rows, bulk_upsert_transactions, delete_transactions
+from rollups import RollupDelta, apply_rollup_deltas
+from response_cache import response_cache
+
+# Bank data ingestion: fetch -> normalize -> dedupe -> bulk write -> post-commit hooks.
+# Used by the post-link background import and by /refresh_bank_data.
+
+# /transactions/get paging settings
+TRANSACTIONS_PAGE_SIZE = 500  # Plaid's maximum count per request
+PREFETCH_PAGES = 1  # pages fetched ahead of the page being written
+WINDOW_DAYS = 30
+
+# /transactions/sync settings
+SYNC_PAGE_SIZE = 500  # Plaid's maximum
+SYNC_MAX_RESTARTS = 3
+
+ACCOUNT_COLUMNS = ("name", "type", "subtype", "current_balance", "available_balance", "currency")
+
+# Called as hook(db, event) after the ingestion commit
+POST_COMMIT_HOOKS = []
+
+# (user_id, product) -> lock standing in for the sync state row lock on SQLite
+_local_locks = defaultdict(threading.Lock)
+_local_locks_guard = threading.Lock()
+
+
+def register_post_commit_hook(hook):
+    """Run `hook(db, event)` after every successful ingestion commit. Usable as a decorator."""
+    POST_COMMIT_HOOKS.append(hook)
+    return hook
+
+
+@register_post_commit_hook
+def invalidate_cached_responses(db: Session, event: dict):
+    """New or changed transactions and categories change this user's dashboard responses."""
+    response_cache.invalidate_user(event["user_id"])
+
+
+class StageTimer:
+    """Accumulates wall-clock milliseconds per pipeline stage."""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (perf_counter() - start) * 1000
+            self.timings[name] = round(self.timings.get(name, 0.0) + elapsed, 3)
+
+    def timed_iter(self, name: str, iterator):
+        """Yield from `iterator`, charging the time spent waiting on it to `name`."""
+        iterator = iter(iterator)
+        while True:
+            with self.stage(name):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+
+# ==================== Fetch ====================
+def fetch_accounts(decrypted_access_token: str) -> list:
+    accounts_request = AccountsGetRequest(
+        client_id=PLAID_CLIENT_ID,
+        secret=PLAID_SECRET,
+        access_token=decrypted_access_token
+    )
+    return client.accounts_get(accounts_request, _request_timeout=PLAID_TIMEOUT_SECONDS).to_dict().get("accounts", [])
+
+
+def iter_transaction_pages(decrypted_access_token: str, start_date, end_date, page_size: int = TRANSACTIONS_PAGE_SIZE):
+    """Yield /transactions/get pages using count/offset until total_transactions have been read."""
+    offset = 0
+    while True:
+        transactions_request = TransactionsGetRequest(
+            client_id=PLAID_CLIENT_ID,
+            secret=PLAID_SECRET,
+            access_token=decrypted_access_token,
+            start_date=start_date,
+            end_date=end_date,
+            options=TransactionsGetRequestOptions(count=page_size, offset=offset),
+        )
+        response = client.transactions_get(transactions_request, _request_timeout=PLAID_TIMEOUT_SECONDS).to_dict()
+        page = response.get("transactions", [])
+        yield page
+
+        offset += len(page)
+        if not page or offset >= response["total_transactions"]:
+            break
+
+
+def iter_sync_pages(decrypted_access_token: str, cursor):
+    """Yield (added + modified, removed, next_cursor) for each /transactions/sync page after `cursor`."""
+    has_more = True
+    while has_more:
+        sync_request = TransactionsSyncRequest(
+            client_id=PLAID_CLIENT_ID,
+            secret=PLAID_SECRET,
+            access_token=decrypted_access_token,
+            count=SYNC_PAGE_SIZE,
+            **({"cursor": cursor} if cursor else {})
+        )
+        response = client.transactions_sync(sync_request, _request_timeout=PLAID_TIMEOUT_SECONDS).to_dict()
+        cursor = response["next_cursor"]
+        has_more = response["has_more"]
+        yield response["added"] + response["modified"], response["removed"], cursor
+
+
+def prefetched(pages, depth: int = PREFETCH_PAGES):
+    """
+    Consume a page iterator on a background thread, keeping at most `depth` pages queued.
+    The next Plaid fetch overlaps with the caller's DB write, and memory stays bounded by the page size.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item) -> bool:
+        """Block until there is room, or give up once the consumer has gone away."""
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for page in pages:
+                if not put(page):
+                    return
+            put(done)
+        except Exception as e:
+            put(e)
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+# ==================== Normalize ====================
+def normalize_account(acc: dict, user_id: int) -> dict:
+    """Convert a Plaid account dict into a Plaid_Bank_Account row."""
+    balances = acc.get("balances") or {}
+    return {
+        "user_id": user_id,
+        "account_id": acc["account_id"],
+        "name": acc["name"],
+        "type": str(acc["type"]),
+        "subtype": str(acc["subtype"]) if acc.get("subtype") else None,
+        "current_balance": balances.get("current"),
+        "available_balance": balances.get("available"),
+        "currency": balances.get("iso_currency_code"),
+    }
+
+
+def normalize_transaction(t: dict) -> dict:
+    """Convert a Plaid transaction dict into a Plaid_Transactions row."""
+    # Plaid returns a date object from the SDK and a string from the raw REST API
+    try:
+        if isinstance(t["date"], str):
+            tx_date = datetime.strptime(t["date"], "%Y-%m-%d").date()
+        else:
+            tx_date = t["date"]
+    except Exception:
+        tx_date = None
+
+    # Prefer personal_finance_category, fall back to the legacy category hierarchy
+    category = None
+    if t.get("personal_finance_category"):
+        category = t["personal_finance_category"].get("primary")
+    elif t.get("category"):
+        category = t["category"][0]
+
+    return {
+        "transaction_id": t["transaction_id"],
+        "account_id": t["account_id"],
+        "amount": t["amount"],
+        "currency": t.get("iso_currency_code"),
+        "category": category,
+        "merchant_name": t.get("merchant_name"),
+        "date": tx_date,
+    }
+
+
+# ==================== Dedupe ====================
+def dedupe_transactions(rows: list, removed_ids=()) -> list:
+    """Keep the last copy of each transaction and drop any removed in the same page."""
+    removed = set(removed_ids)
+    by_id = {r["transaction_id"]: r for r in rows if r["transaction_id"] not in removed}
+    return list(by_id.values())
+
+
+# ==================== Write ====================
+def write_accounts(db: Session, rows: list) -> int:
+    upsert_rows(db, Plaid_Bank_Account, rows, ["account_id"], ACCOUNT_COLUMNS)
+    return len(rows)
+
+
+def get_sync_state(db: Session, user_id: int, product: str) -> Plaid_Sync_State:
+    """Return the user's sync state row for a product, creating it if needed."""
+    state = db.query(Plaid_Sync_State).filter_by(user_id=user_id, product=product).first()
+    if not state:
+        state = Plaid_Sync_State(user_id=user_id, product=product)
+        db.add(state)
+    return state
+
+
+@contextmanager
+def sync_lock(db: Session, user_id: int, product: str):
+    """
+    Hold the user's Plaid_Sync_State row for `product` (SELECT ... FOR UPDATE) until the caller commits,
+    so two ingestions of one user never read the same cursor and rows. SQLite has no row locks, so a
+    process-local lock stands in. Yields the locked state row; rolls back if the body raises.
+    """
+    db.commit()  # reads under the lock must see what the previous holder committed
+    upsert_rows(db, Plaid_Sync_State, [{"user_id": user_id, "product": product}], ["user_id", "product"], [])
+    db.commit()
+
+    local = None
+    if db.get_bind().dialect.name == "sqlite":
+        with _local_locks_guard:
+            local = _local_locks[(user_id, product)]
+        local.acquire()
+    try:
+        state = (
+            db.query(Plaid_Sync_State)
+            .filter_by(user_id=user_id, product=product)
+            .with_for_update()
+            .populate_existing()
+            .one()
+        )
+        yield state
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        if local is not None:
+            local.release()
+
+
+# ==================== Pipeline ====================
+def run_bank_ingestion(db: Session, user_id: int, decrypted_access_token: str, mode: str = "sync") -> dict:
+    """
+    Refresh a user's bank accounts and transactions in one commit, then run post-commit hooks.
+    mode="sync" applies changes since the stored /transactions/sync cursor;
+    mode="window" re-reads the last WINDOW_DAYS days with /transactions/get.
+    Runs of the same user wait for each other (see sync_lock), whichever route or job started them.
+    """
+    for _ in range(SYNC_MAX_RESTARTS):
+        timer = StageTimer()
+        event = {
+            "user_id": user_id,
+            "mode": mode,
+            "accounts": 0,
+            "inserted": 0,
+            "updated": 0,
+            "skipped": 0,
+            "removed": 0,
+            "transaction_ids": [],
+            "removed_ids": [],
+            "touched_buckets": set(),
+        }
+        try:
+            with sync_lock(db, user_id, "transactions") as state:
+                _ingest(db, user_id, decrypted_access_token, mode, timer, event, state)
+        except ApiException as e:
+            db.rollback()
+            if mode == "sync" and plaid_error_code(e) == "TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION":
+                continue  # Plaid requires restarting from the original cursor
+            raise
+        break
+    else:
+        raise HTTPException(status_code=503, detail="Transactions kept changing during sync, try again later")
+
+    with timer.stage("hooks"):
+        for hook in POST_COMMIT_HOOKS:
+            try:
+                hook(db, event)
+            except Exception as e:
+                print(f"Post-commit hook {hook.__name__} failed:", e)
+
+    event["timings_ms"] = timer.timings
+    return {key: value for key, value in event.items() if key not in ("transaction_ids", "removed_ids", "touched_buckets")}
+
+
+def _ingest(db: Session, user_id: int, decrypted_access_token: str, mode: str, timer: StageTimer, event: dict,
+            state: Plaid_Sync_State):
+    # 1) Accounts
+    with timer.stage("fetch"):
+        accounts = fetch_accounts(decrypted_access_token)
+    with timer.stage("normalize"):
+        account_rows = [normalize_account(acc, user_id) for acc in accounts]
+    with timer.stage("write"):
+        event["accounts"] = write_accounts(db, account_rows)
+
+    # 2) Transactions, one page at a time
+    if mode == "sync":
+        pages = iter_sync_pages(decrypted_access_token, state.cursor)
+    else:
+        end_date = datetime.now().date()
+        start_date = end_date - timedelta(days=WINDOW_DAYS)
+        pages = ((page, [], None) for page in iter_transaction_pages(decrypted_access_token, start_date, end_date))
+
+    cursor = None
+    resolvers = {}  # user_id -> CategoryResolver, shared by every page of this run
+    rollup = RollupDelta()  # spend rollup changes, applied once before the commit
+    for raw, removed, cursor in timer.timed_iter("fetch", prefetched(pages)):
+        removed_ids = [t["transaction_id"] for t in removed]
+        with timer.stage("normalize"):
+            rows = [normalize_transaction(t) for t in raw]
+        with timer.stage("dedupe"):
+            rows = dedupe_transactions(rows, removed_ids)
+        with timer.stage("write"):
+            for key, count in bulk_upsert_transactions(db, rows, commit=False, resolvers=resolvers, rollup=rollup).items():
+                event[key] += count
+            event["removed"] += delete_transactions(db, removed_ids, commit=False, rollup=rollup)
+        event["transaction_ids"].extend(r["transaction_id"] for r in rows)
+        event["removed_ids"].extend(removed_ids)
+
+    with timer.stage("write"):
+        apply_rollup_deltas(db, rollup)
+    event["touched_buckets"] = rollup.touched()
+
+    # 3) Commit everything, including the new cursor, at once
+    with timer.stage("commit"):
+        if mode == "sync":
+            if cursor:
+                state.cursor = cursor
+            state.last_synced_at = datetime.utcnow()
+        db.commit()
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, status, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import models
@@ -15,8 +16,21 @@ import pie_chart
 import user_balances
 import user_transactions
 import balance_routes
+import rollups
+import budgets
+import sync_scheduler
+import portfolio_routes
+import migrations
+import response_cache
 
-app = FastAPI()
+# Background Plaid sync workers live as long as the app
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sync_scheduler.scheduler.start()
+    yield
+    sync_scheduler.scheduler.stop(timeout=30)
+
+app = FastAPI(lifespan=lifespan)
 
 origins = {
     "https://localhost:5173",
@@ -42,10 +56,17 @@ app.include_router(pie_chart.router)
 app.include_router(user_balances.router)
 app.include_router(user_transactions.router)
 app.include_router(balance_routes.router)
+app.include_router(rollups.router)
+app.include_router(budgets.router)
+app.include_router(sync_scheduler.router)
+app.include_router(portfolio_routes.router)
+app.include_router(response_cache.router)
 
 
 # Create MySQL tables (make sure this is called at least once)
 models.Base.metadata.create_all(bind=engine)
+# Bring existing tables up to date (indexes etc.)
+migrations.run_migrations(engine)
 
 #models.Base.metadata.create_all(bind=engine)
 
@@ -0,0 +1,175 @@
+import argparse
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import inspect, select, insert, text
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.engine import Connection, Engine
+import models
+from models import Schema_Version
+
+# Versioned schema changes for existing databases. create_all only creates missing tables,
+# so indexes and other changes to tables that already exist are applied here, in version order,
+# and recorded in Schema_Version. Every app worker runs them at startup, so the runner holds a
+# database-wide lock and re-reads the applied versions once it has it.
+#
+# MySQL commits each DDL statement implicitly: a step that fails partway is not rolled back,
+# and its Schema_Version row is only written once the whole step has succeeded. Every step
+# must therefore check before it changes anything, so that rerunning it finishes the job and
+# it is a no-op on a fresh database that create_all has just built from models.py.
+
+MIGRATION_LOCK_NAME = "schema_migrations"
+MIGRATION_LOCK_TIMEOUT_SECONDS = int(os.getenv("MIGRATION_LOCK_TIMEOUT_SECONDS", "300"))
+
+MIGRATIONS = []  # (version, name, fn(conn)) in registration order
+
+
+def migration(version: int, name: str):
+    """Register `fn(conn)` as schema version `version`. Usable as a decorator."""
+    def register(fn):
+        if any(v == version for v, _, _ in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version {version}")
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return register
+
+
+def create_missing_indexes(conn: Connection, index_names) -> list:
+    """Create the named indexes declared in models.py that the database does not have yet."""
+    inspector = inspect(conn)
+    wanted = set(index_names)
+    created = []
+    for table in models.Base.metadata.sorted_tables:
+        declared = [index for index in table.indexes if index.name in wanted]
+        if not declared:
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in declared:
+            if index.name not in existing:
+                index.create(conn)
+                created.append(index.name)
+    return created
+
+
+def add_missing_columns(conn: Connection, table_name: str, column_names) -> list:
+    """ALTER TABLE ... ADD COLUMN for the named columns declared in models.py that the table does not have yet."""
+    table = models.Base.metadata.tables[table_name]
+    existing = {column["name"] for column in inspect(conn).get_columns(table_name)}
+    added = []
+    for name in column_names:
+        if name not in existing:
+            spec = CreateColumn(table.c[name]).compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {conn.dialect.identifier_preparer.quote(table_name)} ADD COLUMN {spec}"))
+            added.append(name)
+    return added
+
+
+# ==================== Migrations ====================
+HOT_PATH_INDEXES = (
+    "ix_plaid_transactions_account_date",
+    "ix_plaid_bank_account_user",
+    "ix_transaction_category_link_category",
+    "ix_user_balance_user_name",
+    "ix_save_goals_user",
+    "ix_plaid_investment_user",
+    "ix_plaid_investment_holding_account_security",
+)
+
+
+@migration(1, "hot path indexes")
+def add_hot_path_indexes(conn: Connection):
+    create_missing_indexes(conn, HOT_PATH_INDEXES)
+
+
+@migration(2, "sync state failure backoff")
+def add_sync_failure_columns(conn: Connection):
+    add_missing_columns(conn, "Plaid_Sync_State", ("failure_count", "next_attempt_at", "last_error"))
+
+
+@migration(3, "covering holding snapshot index")
+def replace_holding_snapshot_index(conn: Connection):
+    # The first version of the index lacked account_id, which value_series_query groups by
+    create_missing_indexes(conn, ("ix_holding_snapshot_user_day_account",))
+    existing = {index["name"] for index in inspect(conn).get_indexes("Holding_Snapshot")}
+    if "ix_holding_snapshot_user_day" in existing:
+        quote = conn.dialect.identifier_preparer.quote
+        on_table = f" ON {quote('Holding_Snapshot')}" if conn.dialect.name in ("mysql", "mariadb") else ""
+        conn.execute(text(f"DROP INDEX {quote('ix_holding_snapshot_user_day')}{on_table}"))
+
+
+# ==================== Runner ====================
+_local_lock = threading.Lock()  # SQLite has no named locks; it is only used for development and tests
+
+
+@contextmanager
+def migration_lock(engine: Engine):
+    """
+    Hold a database-wide lock while migrating: GET_LOCK on MySQL, an advisory lock on PostgreSQL,
+    and a process-local lock on SQLite. The lock lives on its own connection, so migrations can
+    commit on others while it is held.
+    """
+    with engine.connect() as conn:
+        dialect = conn.dialect.name
+        if dialect == "mysql":
+            acquired = conn.execute(text("SELECT GET_LOCK(:name, :timeout)"),
+                                    {"name": MIGRATION_LOCK_NAME, "timeout": MIGRATION_LOCK_TIMEOUT_SECONDS}).scalar()
+            if acquired != 1:
+                raise RuntimeError(f"Timed out waiting for the {MIGRATION_LOCK_NAME} lock")
+            release = (text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK_NAME})
+        elif dialect == "postgresql":
+            key = zlib.crc32(MIGRATION_LOCK_NAME.encode())
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": key})
+            release = (text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+        else:
+            if not _local_lock.acquire(timeout=MIGRATION_LOCK_TIMEOUT_SECONDS):
+                raise RuntimeError(f"Timed out waiting for the {MIGRATION_LOCK_NAME} lock")
+            release = None
+        try:
+            yield
+        finally:
+            if release is None:
+                _local_lock.release()
+            else:
+                conn.execute(*release)
+
+
+def applied_versions(engine: Engine) -> set:
+    Schema_Version.__table__.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        return set(conn.execute(select(Schema_Version.version)).scalars())
+
+
+def run_migrations(engine: Engine, target: int | None = None) -> list:
+    """Apply pending migrations up to `target` (default: all). Returns the versions applied."""
+    applied = []
+    with migration_lock(engine):
+        done = applied_versions(engine)  # read under the lock: another worker may have just migrated
+        for version, name, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+            if version in done or (target is not None and version > target):
+                continue
+            with engine.begin() as conn:
+                fn(conn)
+                conn.execute(insert(Schema_Version).values(version=version, name=name, applied_at=datetime.utcnow()))
+            applied.append(version)
+    return applied
+
+
+# Apply pending migrations (also run at app startup):
+#   python migrations.py [--target VERSION] [--status]
+if __name__ == "__main__":
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations")
+    parser.add_argument("--target", type=int, default=None, help="Stop after this version")
+    parser.add_argument("--status", action="store_true", help="List migrations without applying them")
+    args = parser.parse_args()
+
+    if args.status:
+        done = applied_versions(engine)
+        for version, name, _ in sorted(MIGRATIONS, key=lambda m: m[0]):
+            print(f"{version:4d}  {'applied' if version in done else 'pending'}  {name}")
+    else:
+        applied = run_migrations(engine, args.target)
+        print(f"Applied {len(applied)} migration(s): {applied}" if applied else "Schema is up to date")
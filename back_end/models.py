@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Float, Date, DateTime, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Float, Date, DateTime, Text, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -42,6 +42,11 @@ class Users(Base):
         back_populates="user",
         cascade="all, delete-orphan"
     )
+    sync_states = relationship(
+        "Plaid_Sync_State",
+        back_populates="user",
+        cascade="all, delete-orphan"
+    )
 
 
 class Settings(Base):
@@ -73,6 +78,9 @@ class Plaid_Bank_Account(Base):
         back_populates="bank_account",
         cascade="all, delete-orphan"
     )
+    __table_args__ = (
+        Index('ix_plaid_bank_account_user', 'user_id'),
+    )
 
 
 class Plaid_Transactions(Base):
@@ -97,6 +105,10 @@ class Plaid_Transactions(Base):
         back_populates="transaction",
         cascade="all, delete-orphan"
     )
+    __table_args__ = (
+        # Keyset pagination of an account's transactions, newest first
+        Index('ix_plaid_transactions_account_date', 'account_id', 'date', 'id'),
+    )
 
 
 class User_Categories(Base):
@@ -130,6 +142,82 @@ class Transaction_Category_Link(Base):
     category = relationship("User_Categories", back_populates="transaction_links")
     __table_args__ = (
         UniqueConstraint('transaction_id', name='_transaction_id_uc'),
+        Index('ix_transaction_category_link_category', 'category_id', 'transaction_id'),
+    )
+
+
+class Spend_Rollup(Base):
+    __tablename__ = "Spend_Rollup"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("Users.id", ondelete="CASCADE"), nullable=False)
+    category_id = Column(Integer, ForeignKey("User_Categories.id", ondelete="CASCADE"), nullable=False)
+    account_id = Column(
+        String(100),
+        ForeignKey("Plaid_Bank_Account.account_id", ondelete="CASCADE"),
+        nullable=False
+    )
+    bucket = Column(String(5), nullable=False)  # "day", "week" (starting Monday) or "month"
+    bucket_start = Column(Date, nullable=False)
+    spend = Column(Float, default=0.0)  # sum of positive amounts (money out)
+    net = Column(Float, default=0.0)  # sum of all amounts
+    txn_count = Column(Integer, default=0)
+    __table_args__ = (
+        UniqueConstraint('user_id', 'category_id', 'account_id', 'bucket', 'bucket_start', name='_spend_rollup_uc'),
+        Index('ix_spend_rollup_user_bucket', 'user_id', 'bucket', 'bucket_start'),
+    )
+
+
+class Holding_Snapshot(Base):
+    __tablename__ = "Holding_Snapshot"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("Users.id", ondelete="CASCADE"), nullable=False)
+    account_id = Column(String(100), nullable=False)  # kept after the account is unlinked
+    security_id = Column(String(100), nullable=False)
+    symbol = Column(String(20))
+    day = Column(Date, nullable=False)  # one row per day; older history keeps one day per week or month
+    quantity = Column(Float)
+    price = Column(Float)
+    value = Column(Float)
+    __table_args__ = (
+        UniqueConstraint('account_id', 'security_id', 'day', name='_holding_snapshot_uc'),
+        # Covering index for holding_snapshots.value_series_query: a range scan in (day, account) group order
+        Index('ix_holding_snapshot_user_day_account', 'user_id', 'day', 'account_id', 'value'),
+    )
+
+
+class Budget_Status(Base):
+    __tablename__ = "Budget_Status"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("Users.id", ondelete="CASCADE"), nullable=False)
+    category_id = Column(Integer, ForeignKey("User_Categories.id", ondelete="CASCADE"), nullable=False)
+    week_start = Column(Date, nullable=False)  # Monday
+    spent = Column(Float, default=0.0)
+    weekly_limit = Column(Float, nullable=False)
+    status = Column(String(10), nullable=False)  # "ok", "warning" or "over"
+    evaluated_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        UniqueConstraint('category_id', 'week_start', name='_category_week_uc'),
+        Index('ix_budget_status_user_week', 'user_id', 'week_start'),
+    )
+
+
+class Plaid_Sync_State(Base):
+    __tablename__ = "Plaid_Sync_State"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("Users.id", ondelete="CASCADE"), nullable=False)
+    product = Column(String(20), nullable=False)  # "transactions" or "investments"
+    cursor = Column(Text, nullable=True)  # /transactions/sync next_cursor
+    last_synced_at = Column(DateTime, nullable=True)
+    failure_count = Column(Integer, nullable=False, default=0, server_default="0")  # consecutive failed syncs
+    next_attempt_at = Column(DateTime, nullable=True)  # no background refresh is queued before this
+    last_error = Column(String(255), nullable=True)
+    user = relationship("Users", back_populates="sync_states")
+    __table_args__ = (
+        UniqueConstraint('user_id', 'product', name='_user_product_uc'),
     )
 
 
@@ -152,6 +240,9 @@ class Plaid_Investment(Base):
         back_populates="investment_account",
         cascade="all, delete-orphan"
     )
+    __table_args__ = (
+        Index('ix_plaid_investment_user', 'user_id'),
+    )
 
 
 class Plaid_Investment_Holding(Base):
@@ -173,6 +264,9 @@ class Plaid_Investment_Holding(Base):
     currency = Column(String(10))
     created_at = Column(DateTime, default=datetime.utcnow)
     investment_account = relationship("Plaid_Investment", back_populates="holdings")
+    __table_args__ = (
+        Index('ix_plaid_investment_holding_account_security', 'account_id', 'security_id'),
+    )
 
 class Save_Goals(Base):
     __tablename__ = "Save_Goals"
@@ -186,6 +280,9 @@ class Save_Goals(Base):
     user_id = Column(Integer, ForeignKey("Users.id", ondelete="CASCADE"), nullable=False)
 
     user = relationship("Users", back_populates="save_goals")
+    __table_args__ = (
+        Index('ix_save_goals_user', 'user_id'),
+    )
 
     def __repr__(self):
         return f"<Save_Goals(goal_id={self.goal_id}, goal_name={self.goal_name}, user_id={self.user_id})>"
@@ -201,4 +298,15 @@ class User_Balance(Base):
     balance_date = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("Users", back_populates="balances")
+    __table_args__ = (
+        Index('ix_user_balance_user_name', 'id', 'balance_name'),
+    )
+
+
+class Schema_Version(Base):
+    __tablename__ = "Schema_Version"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String(100), nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
 
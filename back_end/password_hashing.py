@@ -0,0 +1,26 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+
+# bcrypt costs ~250 ms of CPU per call at 12 rounds, so it runs on a bounded pool instead
+# of the event loop. The bcrypt backend releases the GIL, so threads use every core.
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+
+# Hashes made with a different cost are flagged by verify_and_update and rehashed on login
+bcrypt = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(hash_executor, bcrypt.hash, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """Check a password; also returns a replacement hash when the stored one uses an outdated cost."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(hash_executor, bcrypt.verify_and_update, password, hashed_password)
@@ -1,10 +1,12 @@
-from fastapi import FastAPI, Depends, HTTPException, status, APIRouter
+from fastapi import FastAPI, Depends, HTTPException, Query, status, APIRouter
+from sqlalchemy import select, func, and_
 from sqlalchemy.orm import Session
+from datetime import date
 from typing import Annotated
 from database import SessionLocal
 from models import Plaid_Transactions, User_Categories, Users, Transaction_Category_Link
 from pydantic import BaseModel
-from user_categories import get_user_categories
+from response_cache import response_cache
 
 router = APIRouter(
     prefix='/pie_chart',
@@ -21,17 +23,34 @@ def get_db():
 
 db_dependency = Annotated[Session, Depends(get_db)]
 
+#Sum of expenses per category in a single GROUP BY query
+def expenses_per_category_query(user_id: int, start: date | None = None, end: date | None = None, account_id: str | None = None):
+    # Filters live in the join conditions so categories without matching transactions still report 0
+    tx_join = Plaid_Transactions.transaction_id == Transaction_Category_Link.transaction_id
+    if start:
+        tx_join = and_(tx_join, Plaid_Transactions.date >= start)
+    if end:
+        tx_join = and_(tx_join, Plaid_Transactions.date <= end)
+    if account_id:
+        tx_join = and_(tx_join, Plaid_Transactions.account_id == account_id)
+
+    return (
+        select(User_Categories.name, func.coalesce(func.sum(func.abs(Plaid_Transactions.amount)), 0).label("total"))
+        .select_from(User_Categories)
+        .outerjoin(Transaction_Category_Link, Transaction_Category_Link.category_id == User_Categories.id)
+        .outerjoin(Plaid_Transactions, tx_join)
+        .where(User_Categories.user_id == user_id)
+        .group_by(User_Categories.id, User_Categories.name)
+    )
+
 #Gets the sum of expenses per category
-def get_total_expenses_per_category(user_id: int, db: Session):
-    categories = get_user_categories(user_id, db)
-    category_expenses = {}
+def get_total_expenses_per_category(user_id: int, db: Session, start: date | None = None, end: date | None = None, account_id: str | None = None):
+    rows = db.execute(expenses_per_category_query(user_id, start, end, account_id)).all()
 
-    for category in categories:
-        transactions = db.query(Plaid_Transactions).join(Transaction_Category_Link).filter(Transaction_Category_Link.category_id == category["id"]).all()
-        total_expense = sum(abs(transaction.amount) for transaction in transactions)
-        category_expenses[category["name"]] = total_expense
+    if not rows and not db.query(Users.id).filter(Users.id == user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
 
-    return category_expenses
+    return {row.name: float(row.total) for row in rows}
 
 # Routes
 @router.get("/")
@@ -42,8 +61,17 @@ async def get_pie_chart_default():
     raise HTTPException(status_code=400, detail="user_id is required")
 
 @router.get("/{user_id}")
-async def get_pie_chart_data_as_json(user_id: int, db: db_dependency):
+async def get_pie_chart_data_as_json(
+    user_id: int,
+    db: db_dependency,
+    start: date | None = Query(None, description="Only count transactions on or after this date"),
+    end: date | None = Query(None, description="Only count transactions on or before this date"),
+    account_id: str | None = Query(None, description="Only count transactions from this Plaid account"),
+):
     """
     Returns the pie chart data as a JSON string with total expenses per category.
     """
-    return get_total_expenses_per_category(user_id, db)
+    return response_cache.get_or_compute(
+        user_id, "pie_chart", {"start": start, "end": end, "account_id": account_id},
+        lambda: get_total_expenses_per_category(user_id, db, start, end, account_id)
+    )
@@ -0,0 +1,135 @@
+import os
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import requests
+from requests.adapters import HTTPAdapter
+from fastapi import HTTPException
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
+from plaid.api import plaid_api
+from plaid.configuration import Configuration
+from plaid.api_client import ApiClient
+from plaid import ApiException
+from dotenv import load_dotenv
+from ttl_cache import TTLCache
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Plaid Credentials from environment variables
+PLAID_CLIENT_ID = os.getenv("PLAID_CLIENT_ID")
+PLAID_SECRET = os.getenv("PLAID_SECRET")
+PLAID_ENVIRONMENT = os.getenv("PLAID_ENVIRONMENT", "sandbox")  # default to sandbox if not set
+PLAID_HOST = os.getenv("PLAID_HOST", f"https://{PLAID_ENVIRONMENT}.plaid.com")  # e.g. http://localhost:8001 for fake_plaid
+
+if not all([PLAID_CLIENT_ID, PLAID_SECRET]):
+    raise Exception("Plaid credentials are not fully set in the environment variables.")
+
+# The SDK is blocking; async routes run its calls on this bounded pool (see run_plaid)
+PLAID_WORKERS = int(os.getenv("PLAID_WORKERS", "16"))
+PLAID_TIMEOUT_SECONDS = float(os.getenv("PLAID_TIMEOUT_SECONDS", "30"))
+# Multi-call jobs such as a full ingestion get their own pool so they can't starve single calls (see run_plaid_job)
+PLAID_JOB_WORKERS = int(os.getenv("PLAID_JOB_WORKERS", "4"))
+
+configuration = Configuration(
+    host=PLAID_HOST
+)
+configuration.connection_pool_maxsize = PLAID_WORKERS  # one keep-alive connection per worker
+api_client = ApiClient(configuration)
+client = plaid_api.PlaidApi(api_client)
+
+plaid_executor = ThreadPoolExecutor(max_workers=PLAID_WORKERS, thread_name_prefix="plaid")
+plaid_job_executor = ThreadPoolExecutor(max_workers=PLAID_JOB_WORKERS, thread_name_prefix="plaid-job")
+
+# Pooled keep-alive session for the endpoints we call over raw REST
+http = requests.Session()
+http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=PLAID_WORKERS))
+http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=PLAID_WORKERS))
+
+async def run_plaid(fn, *args, timeout: float = PLAID_TIMEOUT_SECONDS, **kwargs):
+    """
+    Await one blocking Plaid call on the Plaid pool so a slow response doesn't stall the event loop.
+    The wait is bounded by `timeout`, and SDK calls also get it as a socket-level timeout.
+    """
+    if getattr(fn, "__self__", None) is client:
+        kwargs.setdefault("_request_timeout", timeout)
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(plaid_executor, partial(fn, *args, **kwargs))
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Plaid did not respond in time")
+
+async def run_plaid_job(fn, *args, **kwargs):
+    """
+    Await a blocking job that makes many Plaid calls, such as a full ingestion, on the job pool.
+    The job has no overall deadline; each Plaid call inside it must pass its own _request_timeout.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(plaid_job_executor, partial(fn, *args, **kwargs))
+
+# Token encryption & decryption with keys from .env.
+# ENCRYPTION_KEYS is a comma-separated list, newest first: new tokens are encrypted with the
+# first key and any listed key can decrypt. To rotate, prepend a new key, run
+# `python token_rotation.py`, then drop the old key. ENCRYPTION_KEY alone still works.
+ENCRYPTION_KEYS = [k.strip() for k in os.getenv("ENCRYPTION_KEYS", os.getenv("ENCRYPTION_KEY", "")).split(",") if k.strip()]
+if not ENCRYPTION_KEYS:
+    raise Exception("ENCRYPTION_KEYS or ENCRYPTION_KEY not set in environment variables")
+ENCRYPTION_KEY = ENCRYPTION_KEYS[0]
+primary_cipher = Fernet(ENCRYPTION_KEY.encode())
+cipher_suite = MultiFernet([Fernet(k.encode()) for k in ENCRYPTION_KEYS])
+
+def encrypt_token(token: str) -> str:
+    return cipher_suite.encrypt(token.encode()).decode()
+
+def decrypt_token(encrypted_token: str) -> str:
+    return cipher_suite.decrypt(encrypted_token.encode()).decode()
+
+def is_current_encryption(encrypted_token: str) -> bool:
+    """True if the token is already encrypted with the newest key."""
+    try:
+        primary_cipher.decrypt(encrypted_token.encode())
+        return True
+    except InvalidToken:
+        return False
+
+def rotate_token(encrypted_token: str) -> str:
+    """Re-encrypt a token with the newest key."""
+    return cipher_suite.rotate(encrypted_token.encode()).decode()
+
+# Decrypted tokens, keyed by (user_id, kind) and checked against the stored ciphertext
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300"))
+token_cache = TTLCache(maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")), ttl=TOKEN_CACHE_TTL_SECONDS)
+TOKEN_KINDS = ("bank", "brokerage")
+
+def decrypt_user_token(user_id: int, encrypted_token: str, kind: str = "bank") -> str:
+    """decrypt_token with a short-lived per-user cache; a changed ciphertext is a miss."""
+    cached = token_cache.get((user_id, kind))
+    if cached and cached[0] == encrypted_token:
+        return cached[1]
+    token = decrypt_token(encrypted_token)
+    token_cache.set((user_id, kind), (encrypted_token, token))
+    return token
+
+def forget_user_tokens(user_id: int):
+    """Wipe a user's decrypted tokens, e.g. on unlink or relink."""
+    for kind in TOKEN_KINDS:
+        token_cache.invalidate((user_id, kind))
+
+def plaid_error_code(error: ApiException):
+    """Extract Plaid's error_code from an ApiException body."""
+    try:
+        return json.loads(error.body).get("error_code")
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+def raise_for_plaid_response(response: requests.Response):
+    """Raise an ApiException, as the SDK does, for a failed raw REST call so both fail the same way."""
+    if response.ok:
+        return
+    error = ApiException(status=response.status_code, reason=response.reason)
+    error.body = response.text
+    if response.status_code == 429 and plaid_error_code(error) is None:
+        error.body = json.dumps({"error_type": "RATE_LIMIT_EXCEEDED", "error_code": "RATE_LIMIT_EXCEEDED"})
+    raise error
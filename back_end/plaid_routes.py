@@ -1,47 +1,33 @@
 import os
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, status
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from cryptography.fernet import Fernet
-from plaid.api import plaid_api
 from plaid.model.link_token_create_request import LinkTokenCreateRequest
 from plaid.model.products import Products
 from plaid.model.country_code import CountryCode
 from plaid.model.item_public_token_exchange_request import ItemPublicTokenExchangeRequest
 from plaid.model.accounts_get_request import AccountsGetRequest
-from plaid.model.transactions_get_request import TransactionsGetRequest
-from plaid.configuration import Configuration
-from plaid.api_client import ApiClient
 from database import SessionLocal
-from models import Users
 from auth import get_current_user
 from dotenv import load_dotenv
-from models import Users, Plaid_Bank_Account, Plaid_Transactions, User_Categories, Transaction_Category_Link, Plaid_Investment, Plaid_Investment_Holding
-from datetime import datetime, timedelta
-from datetime import date
-from user_categories import create_user_category, UserCategoryCreate
-import requests
-import json
+from models import Users, Plaid_Bank_Account, Plaid_Transactions, Transaction_Category_Link, Plaid_Investment, Plaid_Investment_Holding, Plaid_Sync_State
+from plaid_client import client, http, run_plaid, run_plaid_job, PLAID_CLIENT_ID, PLAID_SECRET, PLAID_HOST, PLAID_TIMEOUT_SECONDS, encrypt_token, decrypt_user_token, forget_user_tokens, plaid_error_code, raise_for_plaid_response
+from ingestion import run_bank_ingestion, get_sync_state, fetch_accounts, normalize_account, ACCOUNT_COLUMNS
+from bulk_writer import upsert_rows, bulk_upsert_holdings
+from holding_snapshots import write_holding_snapshot, downsample_user_snapshots
+from response_cache import response_cache
+from sync_scheduler import scheduler, register_sync_job, is_rate_limited, backoff_delay
+from plaid import ApiException
 
 # Load environment variables from .env file
 load_dotenv()
 
 router = APIRouter()
 
-# Plaid Credentials from environment variables
-PLAID_CLIENT_ID = os.getenv("PLAID_CLIENT_ID")
-PLAID_SECRET = os.getenv("PLAID_SECRET")
-PLAID_ENVIRONMENT = os.getenv("PLAID_ENVIRONMENT", "sandbox")  # default to sandbox if not set
-
-if not all([PLAID_CLIENT_ID, PLAID_SECRET]):
-    raise Exception("Plaid credentials are not fully set in the environment variables.")
-
-configuration = Configuration(
-    host=f"https://{PLAID_ENVIRONMENT}.plaid.com"
-)
-api_client = ApiClient(configuration)
-client = plaid_api.PlaidApi(api_client)
+# /investments answers from the database and queues a background refresh once data is this old
+INVESTMENTS_STALE_SECONDS = int(os.getenv("INVESTMENTS_STALE_SECONDS", "900"))
 
 # Dependency for Database Session
 def get_db():
@@ -51,18 +37,6 @@ def get_db():
     finally:
         db.close()
 
-# Token encryption & decryption using a fixed key from .env
-ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY")
-if not ENCRYPTION_KEY:
-    raise Exception("ENCRYPTION_KEY not set in environment variables")
-cipher_suite = Fernet(ENCRYPTION_KEY.encode())
-
-def encrypt_token(token: str) -> str:
-    return cipher_suite.encrypt(token.encode()).decode()
-
-def decrypt_token(encrypted_token: str) -> str:
-    return cipher_suite.decrypt(encrypted_token.encode()).decode()
-
 # Pydantic Model for Public Token Request
 class PublicTokenRequest(BaseModel):
     public_token: str
@@ -85,166 +59,52 @@ async def create_link_token(user: dict = Depends(get_current_user)):
         }
 
         request = LinkTokenCreateRequest(**request_data)
-        response = client.link_token_create(request)
+        response = await run_plaid(client.link_token_create, request)
         return response.to_dict()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-def fetch_and_store_accounts(user_id: int):
-    """Background task to fetch Plaid accounts for this user and store them in Plaid_Bank_Account."""
-    db = SessionLocal()
-    try:
-        # 1) Retrieve user & decrypt token
-        db_user = db.query(Users).filter(Users.id == user_id).first()
-        if not db_user or not db_user.plaid_access_token:
-            return  # user or token missing
-
-        decrypted_access_token = decrypt_token(db_user.plaid_access_token)
-
-        # 2) Fetch accounts
-        accounts_request = AccountsGetRequest(
-            client_id=PLAID_CLIENT_ID,
-            secret=PLAID_SECRET,
-            access_token=decrypted_access_token
-        )
-        accounts_response = client.accounts_get(accounts_request)
-        accounts_data = accounts_response.to_dict().get("accounts", [])
-
-        # 3) Save accounts
-        for acc in accounts_data:
-            # Check if this account already exists
-            existing_account = (
-                db.query(Plaid_Bank_Account)
-                .filter_by(account_id=acc["account_id"])
-                .first()
-            )
-            if existing_account:
-                # Optionally update balances, etc.
-                existing_account.current_balance = acc["balances"].get("current")
-                existing_account.available_balance = acc["balances"].get("available")
-                existing_account.currency = acc["balances"].get("iso_currency_code")
-                existing_account.name = acc["name"]
-                existing_account.type = acc["type"]
-                existing_account.subtype = acc.get("subtype")
-            else:
-                # Create a new bank account record
-                new_account = Plaid_Bank_Account(
-                    user_id=user_id,
-                    account_id=acc["account_id"],
-                    name=acc["name"],
-                    type=acc["type"],
-                    subtype=acc.get("subtype"),
-                    current_balance=acc["balances"].get("current"),
-                    available_balance=acc["balances"].get("available"),
-                    currency=acc["balances"].get("iso_currency_code"),
-                )
-                db.add(new_account)
-        db.commit()
+@register_sync_job("bank")
+def fetch_and_store_accounts(db: Session, user_id: int):
+    """Sync job: import this user's Plaid accounts, transactions and investments."""
+    # 1) Retrieve user & decrypt token
+    db_user = db.query(Users).filter(Users.id == user_id).first()
+    if not db_user or not db_user.plaid_access_token:
+        return  # user or token missing
 
-        # 4) Now fetch transactions for these accounts
-        #    You can fetch them in one call or multiple calls per account.
-        fetch_and_store_transactions(db, decrypted_access_token)
-        
-        # 5) Fetch investment data
-        fetch_and_store_investments(db, decrypted_access_token, user_id)
+    decrypted_access_token = decrypt_user_token(user_id, db_user.plaid_access_token)
 
-    except Exception as e:
-        print("Error fetching/storing accounts:", e)
-    finally:
-        db.close()
+    # 2) Accounts and transactions; the first sync returns the full history
+    result = run_bank_ingestion(db, user_id, decrypted_access_token)
+    print("Imported bank data:", result)
 
-def fetch_and_store_transactions(db: Session, decrypted_access_token: str):
-    """Fetch transactions for the last 30 days and store them in Plaid_Transactions."""
+    # 3) Fetch investment data. Only a rate limit fails the bank job (so it backs off). Other errors,
+    #    e.g. a bank item without the investments product, are not recorded on the investments sync
+    #    state: that state belongs to the investments job, which may read a separate brokerage item
     try:
-        # 1) Prepare date range
-        end_date = datetime.now().date()
-        start_date = (datetime.now() - timedelta(days=30)).date()
-
-        # 2) Fetch transactions
-        transactions_request = TransactionsGetRequest(
-            client_id=PLAID_CLIENT_ID,
-            secret=PLAID_SECRET,
-            access_token=decrypted_access_token,
-            start_date=start_date,
-            end_date=end_date,
-        )
-        transactions_response = client.transactions_get(transactions_request)
-        transactions_data = transactions_response.to_dict().get("transactions", [])
-
-        # 3) Store each transaction
-        for t in transactions_data:
-            existing_tx = (
-                db.query(Plaid_Transactions)
-                .filter_by(transaction_id=t["transaction_id"])
-                .first()
-            )
-            if existing_tx:
-                continue  # or update if you prefer
-
-            # If Plaid returns the date as a string, parse it:
-            tx_date = (
-                t["date"]
-                if isinstance(t["date"], date)
-                else datetime.strptime(t["date"], "%Y-%m-%d").date()
-            )
-
-            # Get category from personal_finance_category if available
-            category = None
-            if t.get("personal_finance_category"):
-                category = t["personal_finance_category"].get("primary")
-            elif t.get("category"):
-                category = t["category"][0] if t["category"] else None 
-
-            new_tx = Plaid_Transactions(
-                transaction_id=t["transaction_id"],
-                account_id=t["account_id"],  # references Plaid_Bank_Account.account_id
-                amount=t["amount"],
-                currency=t.get("iso_currency_code"),
-                category=category,
-                merchant_name=t.get("merchant_name"),
-                date=tx_date,
-            )
-            db.add(new_tx)
-            db.flush()  # Flush to get the transaction ID
-            
-            # Handle category linking
-            if category:
-                # Check if the user already has a category with this name
-                bank_account = db.query(Plaid_Bank_Account).filter_by(account_id=t["account_id"]).first()
-                if not bank_account:
-                    continue
-
-                user_id = bank_account.user_id
-                user_category = (
-                    db.query(User_Categories)
-                    .filter_by(user_id=user_id, name=category)
-                    .first()
-                )
-
-                # If the category doesn't exist, create it
-                if not user_category:
-                    try:
-                        category_data = UserCategoryCreate(name=category, color="#000000", weekly_limit=None)
-                        user_category = create_user_category(user_id, category_data, db)
-                        db.flush()  # Flush to get the category ID
-                    except HTTPException:
-                        continue  # Skip this transaction and proceed to the next one
-
-                # Create a Transaction_Category_Link
-                category_link = Transaction_Category_Link(
-                    transaction_id=new_tx.transaction_id,
-                    category_id=user_category.id,
-                )
-                db.add(category_link)
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        print("Error importing transactions:", e)
+        fetch_and_store_investments(db, decrypted_access_token, user_id, record_failure=False)
+    except ApiException as e:
+        if is_rate_limited(e):
+            raise
+        print("Investments sync failed:", e)
+
+@register_sync_job("investments")
+def sync_investments(db: Session, user_id: int):
+    """Sync job: import the investments on this user's brokerage item, or on the bank item if none is linked."""
+    db_user = db.query(Users).filter(Users.id == user_id).first()
+    if not db_user:
+        return  # user missing
+    if db_user.plaid_brokerage_access_token:
+        token = decrypt_user_token(user_id, db_user.plaid_brokerage_access_token, kind="brokerage")
+    elif db_user.plaid_access_token:
+        token = decrypt_user_token(user_id, db_user.plaid_access_token)
+    else:
+        return  # token missing
+    fetch_and_store_investments(db, token, user_id)
 
 @router.post("/exchange_public_token")
 async def exchange_public_token(
     request: PublicTokenRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     user: dict = Depends(get_current_user)
 ):
@@ -255,7 +115,7 @@ async def exchange_public_token(
             secret=PLAID_SECRET,
             public_token=request.public_token
         )
-        exchange_response = client.item_public_token_exchange(exchange_request)
+        exchange_response = await run_plaid(client.item_public_token_exchange, exchange_request)
         access_token = exchange_response["access_token"]
 
         # Encrypt before storing
@@ -271,18 +131,24 @@ async def exchange_public_token(
             db_user.plaid_brokerage_access_token = encrypted_access_token
         else:  # bank
             db_user.plaid_access_token = encrypted_access_token
+            # A new item invalidates the old cursor
+            db.query(Plaid_Sync_State).filter(
+                Plaid_Sync_State.user_id == user["id"],
+                Plaid_Sync_State.product == "transactions"
+            ).delete(synchronize_session=False)
         
         db.commit()
+        forget_user_tokens(user["id"])
 
-        # Schedule the appropriate data import as a background task
+        # Queue the appropriate data import on the sync workers
         if request.account_type == "brokerage":
-            background_tasks.add_task(fetch_and_store_investments, user["id"])
+            scheduler.enqueue("investments", user["id"])
         else:  # bank
-            background_tasks.add_task(fetch_and_store_accounts, user["id"])
+            scheduler.enqueue("bank", user["id"])
 
         return {"status": "success", "message": f"{request.account_type.capitalize()} account connected successfully"}
 
-    except PlaidError as e:
+    except ApiException as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -299,7 +165,7 @@ async def get_accounts(
             raise HTTPException(status_code=400, detail="No Plaid account linked")
 
         # Decrypt the stored Plaid token
-        decrypted_access_token = decrypt_token(db_user.plaid_access_token)
+        decrypted_access_token = decrypt_user_token(user["id"], db_user.plaid_access_token)
 
         # Create a request object including client_id and secret
         request_obj = AccountsGetRequest(
@@ -309,7 +175,7 @@ async def get_accounts(
         )
 
         # Call the accounts_get endpoint on the client
-        response = client.accounts_get(request_obj)
+        response = await run_plaid(client.accounts_get, request_obj)
         return response.to_dict()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -318,13 +184,15 @@ async def get_accounts(
 @router.post("/refresh_bank_data", status_code=status.HTTP_200_OK)
 async def refresh_bank_data(
     db: Session = Depends(get_db), 
-    user: dict = Depends(get_current_user)
+    user: dict = Depends(get_current_user),
+    mode: Literal["sync", "window"] = Query("sync", description="'sync' applies changes since the last cursor, 'window' re-reads the last 30 days")
 ):
     """
     Refreshes the user's bank account and transaction data from Plaid.
     This endpoint will:
       - Re-fetch and update bank account information in Plaid_Bank_Account.
-      - Re-fetch and insert new transactions in Plaid_Transactions (for the past 30 days).
+      - In sync mode, apply transactions added, modified or removed since the last sync.
+      - In window mode, re-fetch and upsert transactions in Plaid_Transactions (for the past 30 days).
     """
     try:
         db_user = db.query(Users).filter(Users.id == user["id"]).first()
@@ -332,138 +200,12 @@ async def refresh_bank_data(
             raise HTTPException(status_code=400, detail="Plaid account not linked.")
 
         # Decrypt the stored Plaid token
-        decrypted_access_token = decrypt_token(db_user.plaid_access_token)
-
-        # Refresh Bank Accounts
-        try:
-            accounts_request = AccountsGetRequest(
-                client_id=PLAID_CLIENT_ID,
-                secret=PLAID_SECRET,
-                access_token=decrypted_access_token
-            )
-            accounts_response = client.accounts_get(accounts_request)
-            accounts_data = accounts_response.to_dict().get("accounts", [])
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error fetching accounts: {str(e)}")
-
-        for acc in accounts_data:
-            # Upsert account record based on the unique account_id
-            existing_account = (
-                db.query(Plaid_Bank_Account)
-                .filter(Plaid_Bank_Account.account_id == acc["account_id"])
-                .first()
-            )
-            if existing_account:
-                # Update account details
-                existing_account.name = acc["name"]
-                existing_account.type = acc["type"]
-                existing_account.subtype = acc.get("subtype")
-                existing_account.current_balance = acc["balances"].get("current")
-                existing_account.available_balance = acc["balances"].get("available")
-                existing_account.currency = acc["balances"].get("iso_currency_code")
-            else:
-                new_account = Plaid_Bank_Account(
-                    user_id=user["id"],
-                    account_id=acc["account_id"],
-                    name=acc["name"],
-                    type=acc["type"],
-                    subtype=acc.get("subtype"),
-                    current_balance=acc["balances"].get("current"),
-                    available_balance=acc["balances"].get("available"),
-                    currency=acc["balances"].get("iso_currency_code")
-                )
-                db.add(new_account)
-        db.commit()
-
-        # Refresh Transactions (for the past 30 days)
-        try:
-            end_date = datetime.now().date()
-            start_date = (datetime.now() - timedelta(days=30)).date()
-            transactions_request = TransactionsGetRequest(
-                client_id=PLAID_CLIENT_ID,
-                secret=PLAID_SECRET,
-                access_token=decrypted_access_token,
-                start_date=start_date,
-                end_date=end_date
-            )
-            transactions_response = client.transactions_get(transactions_request)
-            transactions_data = transactions_response.to_dict().get("transactions", [])
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error fetching transactions: {str(e)}")
-
-        for t in transactions_data:
-            existing_tx = (
-                db.query(Plaid_Transactions)
-                .filter(Plaid_Transactions.transaction_id == t["transaction_id"])
-                .first()
-            )
-            if existing_tx:
-                continue
-
-            # Parse the transaction date if it is a string
-            try:
-                if isinstance(t["date"], str):
-                    tx_date = datetime.strptime(t["date"], "%Y-%m-%d").date()
-                else:
-                    tx_date = t["date"]
-            except Exception:
-                tx_date = None
-
-            # Get category from personal_finance_category if available
-            category = None
-            if t.get("personal_finance_category"):
-                category = t["personal_finance_category"].get("primary")
-            elif t.get("category"):
-
-                raw_category = t["category"][0] if t["category"] else None
-                if raw_category:
-                    # Convert to title case and replace underscores with spaces
-                    category = raw_category.replace("_", " ").title()
-
-            new_tx = Plaid_Transactions(
-                transaction_id=t["transaction_id"],
-                account_id=t["account_id"],  # This FK references Plaid_Bank_Account.account_id
-                amount=t["amount"],
-                currency=t.get("iso_currency_code"),
-                category=category,
-                merchant_name=t.get("merchant_name"),
-                date=tx_date
-            )
-            db.add(new_tx)
-            db.flush()  # Flush to get the transaction ID
-
-            # Handle category linking
-            if category:
-                # Check if the user already has a category with this name
-                bank_account = db.query(Plaid_Bank_Account).filter_by(account_id=t["account_id"]).first()
-                if not bank_account:
-                    continue
-
-                user_id = bank_account.user_id
-                user_category = (
-                    db.query(User_Categories)
-                    .filter_by(user_id=user_id, name=category)
-                    .first()
-                )
-
-                # If the category doesn't exist, create it
-                if not user_category:
-                    try:
-                        category_data = UserCategoryCreate(name=category, color="#000000", weekly_limit=None)
-                        user_category = create_user_category(user_id, category_data, db)
-                        db.flush()  # Flush to get the category ID
-                    except HTTPException:
-                        continue
-
-                # Create a Transaction_Category_Link
-                category_link = Transaction_Category_Link(
-                    transaction_id=new_tx.transaction_id,
-                    category_id=user_category.id,
-                )
-                db.add(category_link)
+        decrypted_access_token = decrypt_user_token(user["id"], db_user.plaid_access_token)
 
-        db.commit()
-        return {"message": "Bank accounts and transactions refreshed successfully."}
+        result = await run_plaid_job(run_bank_ingestion, db, user["id"], decrypted_access_token, mode=mode)
+        return {"message": "Bank accounts and transactions refreshed successfully.", "result": result}
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -482,6 +224,11 @@ async def unlink_plaid(
         # Clear the Plaid access token
         db_user.plaid_access_token = None
 
+        # Forget sync cursors; they belong to the removed item
+        db.query(Plaid_Sync_State).filter(
+            Plaid_Sync_State.user_id == user["id"]
+        ).delete(synchronize_session=False)
+
         # Delete all bank accounts and their associated transactions
         # (transactions will be deleted by cascade)
         db.query(Plaid_Bank_Account).filter(
@@ -508,6 +255,8 @@ async def unlink_plaid(
         ).delete(synchronize_session=False)
 
         db.commit()
+        forget_user_tokens(user["id"])
+        response_cache.invalidate_user(user["id"])
         
         return {
             "message": "Plaid access token and all associated data (bank accounts, transactions, investments, and holdings) deleted. Please re-link your account."
@@ -519,52 +268,19 @@ async def unlink_plaid(
             detail=f"Error unlinking Plaid account: {str(e)}"
         )
 
-def fetch_and_store_investments(db: Session, decrypted_access_token: str, user_id: int):
-    """Fetch investment accounts and holdings from Plaid and store them in the database."""
+def fetch_and_store_investments(db: Session, decrypted_access_token: str, user_id: int, record_failure: bool = True):
+    """
+    Fetch investment accounts and holdings from Plaid and store them in the database.
+    Failures back off the investments job (record_investments_failure) unless `record_failure` is False.
+    """
     try:
-        # 1. Get investment accounts
-        accounts_request = AccountsGetRequest(
-            client_id=PLAID_CLIENT_ID,
-            secret=PLAID_SECRET,
-            access_token=decrypted_access_token
-        )
-        accounts_response = client.accounts_get(accounts_request)
-        accounts_data = accounts_response.to_dict()
-        
-        # Filter for investment accounts
-        investment_accounts = [acc for acc in accounts_data.get("accounts", []) if acc.get("type") == "investment"]
-        
-        for acc in investment_accounts:
-            # Check if this investment account already exists
-            existing_account = (
-                db.query(Plaid_Investment)
-                .filter_by(account_id=acc["account_id"])
-                .first()
-            )
-            
-            if existing_account:
-                # Update account details
-                existing_account.name = acc["name"]
-                existing_account.type = acc["type"]
-                existing_account.subtype = acc.get("subtype")
-                existing_account.current_balance = acc["balances"].get("current")
-                existing_account.available_balance = acc["balances"].get("available")
-                existing_account.currency = acc["balances"].get("iso_currency_code")
-            else:
-                # Create a new investment account record
-                new_account = Plaid_Investment(
-                    user_id=user_id,
-                    account_id=acc["account_id"],
-                    name=acc["name"],
-                    type=acc["type"],
-                    subtype=acc.get("subtype"),
-                    current_balance=acc["balances"].get("current"),
-                    available_balance=acc["balances"].get("available"),
-                    currency=acc["balances"].get("iso_currency_code"),
-                )
-                db.add(new_account)
-        
-        db.commit()
+        # 1. Upsert the investment accounts
+        investment_accounts = [
+            normalize_account(acc, user_id)
+            for acc in fetch_accounts(decrypted_access_token)
+            if str(acc.get("type")) == "investment"
+        ]
+        upsert_rows(db, Plaid_Investment, investment_accounts, ["account_id"], ACCOUNT_COLUMNS)
         
         # 2. Get holdings and securities using direct REST API calls
         headers = {
@@ -580,101 +296,132 @@ def fetch_and_store_investments(db: Session, decrypted_access_token: str, user_i
         }
         
         # Get holdings and securities data
-        securities_response = requests.post(
-            f'https://{PLAID_ENVIRONMENT}.plaid.com/investments/holdings/get',
+        securities_response = http.post(
+            f'{PLAID_HOST}/investments/holdings/get',
             headers=headers,
-            json=payload
+            json=payload,
+            timeout=PLAID_TIMEOUT_SECONDS
         )
+        raise_for_plaid_response(securities_response)  # a 429 becomes RATE_LIMIT_EXCEEDED, like the SDK's
         
-        if securities_response.status_code == 200:
-            holdings_data = securities_response.json()
-            holdings = holdings_data.get('holdings', [])
-            securities = holdings_data.get('securities', [])
-            
-            # Create a map of security_id to security details
-            securities_map = {
-                security['security_id']: {
-                    'name': security.get('name', ''),
-                    'ticker_symbol': security.get('ticker_symbol', ''),
-                    'type': security.get('type', '')
-                }
-                for security in securities
-            }
-            
-            # Process holdings
-            for holding in holdings:
-                security_id = holding.get('security_id')
-                security = securities_map.get(security_id, {})
-                
-                # Check if this holding already exists
-                existing_holding = (
-                    db.query(Plaid_Investment_Holding)
-                    .filter_by(
-                        account_id=holding['account_id'],
-                        security_id=security_id
-                    )
-                    .first()
-                )
-                
-                holding_data = {
-                    'quantity': float(holding.get('quantity', 0)),
-                    'price': float(holding.get('institution_price', 0)),
-                    'value': float(holding.get('institution_value', 0)),
-                    'currency': holding.get('iso_currency_code'),
-                    'symbol': security.get('ticker_symbol', ''),
-                    'name': security.get('name', '')
-                }
-                
-                if existing_holding:
-                    # Update holding details
-                    for key, value in holding_data.items():
-                        setattr(existing_holding, key, value)
-                else:
-                    # Create a new holding record
-                    new_holding = Plaid_Investment_Holding(
-                        holding_id=f"{holding['account_id']}_{security_id}",
-                        account_id=holding['account_id'],
-                        security_id=security_id,
-                        **holding_data
-                    )
-                    db.add(new_holding)
-            
-            db.commit()
+        holdings_data = securities_response.json()
+        holdings = holdings_data.get('holdings', [])
+        securities = holdings_data.get('securities', [])
+        
+        # Create a map of security_id to security details
+        securities_map = {security['security_id']: security for security in securities}
+        
+        # 3. Replace the accounts' holdings with this snapshot in a few batched statements
+        rows = []
+        for holding in holdings:
+            security_id = holding.get('security_id')
+            security = securities_map.get(security_id, {})
+            rows.append({
+                'holding_id': f"{holding['account_id']}_{security_id}",
+                'account_id': holding['account_id'],
+                'security_id': security_id,
+                'symbol': security.get('ticker_symbol') or '',
+                'name': security.get('name') or '',
+                'quantity': float(holding.get('quantity') or 0),
+                'price': float(holding.get('institution_price') or 0),
+                'value': float(holding.get('institution_value') or 0),
+                'currency': holding.get('iso_currency_code'),
+            })
+        account_ids = [acc["account_id"] for acc in investment_accounts]
+        bulk_upsert_holdings(db, account_ids, rows, commit=False)
+        
+        # 4. Append today's row to the performance history
+        write_holding_snapshot(db, user_id)  # every investment account of the user, not just this item's
+        downsample_user_snapshots(db, user_id)
+        
+        state = get_sync_state(db, user_id, "investments")
+        state.last_synced_at = datetime.utcnow()
+        state.failure_count, state.next_attempt_at, state.last_error = 0, None, None
+        
+        db.commit()
                 
+    except ApiException as e:
+        db.rollback()
+        if record_failure:
+            record_investments_failure(db, user_id, plaid_error_code(e) or f"HTTP {e.status}")
+        raise  # keep Plaid's error code for the sync workers' rate-limit backoff
     except Exception as e:
+        db.rollback()
+        if record_failure:
+            record_investments_failure(db, user_id, str(e))
         raise HTTPException(status_code=500, detail=f"Error fetching investment data: {str(e)}")
 
 
+def record_investments_failure(db: Session, user_id: int, error: str):
+    """Count a failed investments sync and hold off background refreshes with exponential backoff."""
+    try:
+        state = get_sync_state(db, user_id, "investments")
+        state.failure_count = (state.failure_count or 0) + 1
+        state.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff_delay(state.failure_count))
+        state.last_error = error[:255]
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print("Recording investments sync failure failed:", e)
+
+
 @router.get("/investments")
 async def get_investments(
     db: Session = Depends(get_db),
     user: dict = Depends(get_current_user)
 ):
     """
-    Fetch and return the user's investment accounts and holdings from Plaid.
-    This endpoint will:
-    1. Get all investment accounts
-    2. Get all holdings for each investment account
-    3. Return the data in a structured format
+    Return the user's stored investment accounts and holdings with `last_synced_at`.
+    Plaid is never called inline: when the data is missing or older than INVESTMENTS_STALE_SECONDS,
+    one refresh is queued on the sync workers and `refreshing` is set. After a failed sync,
+    `sync_error` holds the error and no refresh is queued until its backoff has passed.
     """
     try:
-        # Get user's Plaid access token
-        db_user = db.query(Users).filter(Users.id == user["id"]).first()
-        if not db_user or not db_user.plaid_access_token:
+        # 1) Linked item and last successful investments sync
+        db_user = db.query(Users.plaid_access_token, Users.plaid_brokerage_access_token).filter(Users.id == user["id"]).first()
+        if not db_user or not (db_user.plaid_access_token or db_user.plaid_brokerage_access_token):
             raise HTTPException(status_code=400, detail="No Plaid account linked")
-        
-        # Decrypt the stored Plaid token
-        decrypted_access_token = decrypt_token(db_user.plaid_access_token)
-        
-        # Fetch and store investment data
-        fetch_and_store_investments(db, decrypted_access_token, user["id"])
-        
-        # Retrieve the stored investment data
+
+        state = db.query(
+            Plaid_Sync_State.last_synced_at, Plaid_Sync_State.next_attempt_at, Plaid_Sync_State.last_error
+        ).filter(
+            Plaid_Sync_State.user_id == user["id"],
+            Plaid_Sync_State.product == "investments"
+        ).first()
+        last_synced_at, next_attempt_at, last_error = state if state else (None, None, None)
+
+        # 2) Revalidate in the background; the scheduler runs at most one job per user,
+        #    and after a failed sync nothing is queued until its backoff has passed
+        now = datetime.utcnow()
+        stale = last_synced_at is None or now - last_synced_at > timedelta(seconds=INVESTMENTS_STALE_SECONDS)
+        backing_off = next_attempt_at is not None and now < next_attempt_at
+        refreshing = scheduler.is_pending("investments", user["id"])
+        if stale and not backing_off and not refreshing:
+            refreshing = scheduler.enqueue("investments", user["id"])
+
+        # 3) Stored accounts and all their holdings in two queries
         investment_accounts = db.query(Plaid_Investment).filter(Plaid_Investment.user_id == user["id"]).all()
-        
-        result = []
-        for account in investment_accounts:
-            account_data = {
+        holdings = (
+            db.query(Plaid_Investment_Holding)
+            .join(Plaid_Investment, Plaid_Investment.account_id == Plaid_Investment_Holding.account_id)
+            .filter(Plaid_Investment.user_id == user["id"])
+            .all()
+        )
+        holdings_by_account = {}
+        for holding in holdings:
+            holdings_by_account.setdefault(holding.account_id, []).append({
+                "holding_id": holding.holding_id,
+                "security_id": holding.security_id,
+                "symbol": holding.symbol,
+                "name": holding.name,
+                "quantity": holding.quantity,
+                "price": holding.price,
+                "value": holding.value,
+                "currency": holding.currency
+            })
+
+        result = [
+            {
                 "account_id": account.account_id,
                 "name": account.name,
                 "type": account.type,
@@ -682,30 +429,13 @@ async def get_investments(
                 "current_balance": account.current_balance,
                 "available_balance": account.available_balance,
                 "currency": account.currency,
-                "holdings": []
+                "holdings": holdings_by_account.get(account.account_id, [])
             }
-            
-            # Get holdings for this account
-            holdings = db.query(Plaid_Investment_Holding).filter(
-                Plaid_Investment_Holding.account_id == account.account_id
-            ).all()
-            
-            for holding in holdings:
-                holding_data = {
-                    "holding_id": holding.holding_id,
-                    "security_id": holding.security_id,
-                    "symbol": holding.symbol,
-                    "name": holding.name,
-                    "quantity": holding.quantity,
-                    "price": holding.price,
-                    "value": holding.value,
-                    "currency": holding.currency
-                }
-                account_data["holdings"].append(holding_data)
-            
-            result.append(account_data)
-        
-        return {"investments": result}
-    
+            for account in investment_accounts
+        ]
+
+        return {"investments": result, "last_synced_at": last_synced_at, "refreshing": refreshing, "sync_error": last_error}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,146 @@
+from datetime import date, timedelta
+from typing import Annotated
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import Plaid_Investment, Plaid_Investment_Holding
+from auth import get_current_user
+from stock_routes import snapshot_cache
+from holding_snapshots import get_value_series
+
+router = APIRouter(
+    prefix='/portfolio',
+    tags=['portfolio']
+)
+
+# ==================== Dependencies ====================
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+db_dependency = Annotated[Session, Depends(get_db)]
+user_dependency = Annotated[dict, Depends(get_current_user)]
+
+# ==================== Snapshot Prices ====================
+def _field(snapshot: dict, bar: str, name: str):
+    value = (snapshot.get(bar) or {}).get(name)
+    return float(value) if value else None  # Polygon reports 0 for fields it has no data for yet
+
+def snapshot_prices(snapshot: dict) -> tuple:
+    """(last price, previous close) from a Polygon ticker snapshot; either may be None."""
+    prev_close = _field(snapshot, "prev_day", "close")
+    last = (_field(snapshot, "last_trade", "price")
+            or _field(snapshot, "min", "close")
+            or _field(snapshot, "day", "close")
+            or prev_close)
+    return last, prev_close
+
+def holdings_query(user_id: int):
+    """Holdings across all of the user's investment accounts."""
+    return (
+        select(
+            Plaid_Investment_Holding.holding_id,
+            Plaid_Investment_Holding.account_id,
+            Plaid_Investment_Holding.symbol,
+            Plaid_Investment_Holding.name,
+            Plaid_Investment_Holding.quantity,
+            Plaid_Investment_Holding.price,
+            Plaid_Investment_Holding.value,
+            Plaid_Investment_Holding.currency,
+        )
+        .join(Plaid_Investment, Plaid_Investment.account_id == Plaid_Investment_Holding.account_id)
+        .where(Plaid_Investment.user_id == user_id)
+        .order_by(Plaid_Investment_Holding.id)
+    )
+
+def _column(values) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+# ==================== Valuation ====================
+@router.get("/valuation", status_code=status.HTTP_200_OK)
+async def get_portfolio_valuation(db: db_dependency, user: user_dependency):
+    """
+    Value the user's stored holdings at live prices. Every distinct symbol is priced from one
+    batched snapshot call; holdings without a live price keep the value from the last Plaid pull.
+    """
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
+
+    # 1) Holdings across all of the user's investment accounts
+    rows = db.execute(holdings_query(user["id"])).all()
+    if not rows:
+        return {"total_value": 0.0, "day_change": 0.0, "day_change_percent": None, "priced_live": 0, "positions": []}
+
+    # 2) One batched snapshot fetch for every distinct symbol
+    symbols = [(row.symbol or "").strip().upper() for row in rows]
+    try:
+        snapshots = await snapshot_cache.get_many(s for s in set(symbols) if s)
+    except Exception:
+        snapshots = {}  # price everything from the stored values rather than fail the request
+    prices = {symbol: snapshot_prices(snapshot) for symbol, snapshot in snapshots.items()}
+
+    # 3) Vectorized valuation
+    quantity = _column(row.quantity for row in rows)
+    stored_price = _column(row.price for row in rows)
+    stored_value = _column(row.value for row in rows)
+    live_price = _column(prices.get(s, (None, None))[0] for s in symbols)
+    prev_close = _column(prices.get(s, (None, None))[1] for s in symbols)
+
+    live = ~np.isnan(live_price) & ~np.isnan(quantity)
+    price = np.where(live, live_price, stored_price)
+    market_value = np.where(live, quantity * live_price, stored_value)
+    market_value = np.nan_to_num(market_value)
+    has_prev = live & ~np.isnan(prev_close)
+    day_change = np.where(has_prev, market_value - quantity * prev_close, 0.0)
+
+    total_value = float(market_value.sum())
+    total_change = float(day_change.sum())
+    weights = market_value / total_value if total_value else np.zeros(len(rows))
+    previous_total = total_value - total_change
+
+    positions = []
+    for i, row in enumerate(rows):
+        positions.append({
+            "holding_id": row.holding_id,
+            "account_id": row.account_id,
+            "symbol": row.symbol,
+            "name": row.name,
+            "currency": row.currency,
+            "quantity": None if np.isnan(quantity[i]) else float(quantity[i]),
+            "price": None if np.isnan(price[i]) else float(price[i]),
+            "market_value": float(market_value[i]),
+            "day_change": float(day_change[i]),
+            "weight": float(weights[i]),
+            "price_source": "live" if live[i] else "plaid",
+        })
+
+    return {
+        "total_value": total_value,
+        "day_change": total_change,
+        "day_change_percent": total_change / previous_total * 100 if previous_total else None,
+        "priced_live": int(live.sum()),
+        "positions": positions,
+    }
+
+# ==================== History ====================
+@router.get("/history", status_code=status.HTTP_200_OK)
+async def get_portfolio_history(
+    db: db_dependency,
+    user: user_dependency,
+    start: date | None = Query(None, description="Defaults to 5 years before end"),
+    end: date | None = Query(None, description="Defaults to today"),
+    account_id: str | None = None,
+):
+    """Portfolio value per snapshot day as {"day": [...], "value": [...]}; older history is weekly or monthly."""
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed")
+    end = end or date.today()
+    start = start or end - timedelta(days=5 * 365)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return get_value_series(db, user["id"], start, end, account_id)
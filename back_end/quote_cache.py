@@ -0,0 +1,153 @@
+import asyncio
+import os
+import time
+from collections import deque
+from fastapi.encoders import jsonable_encoder
+
+# Process-wide last-quote cache for the stock websockets. Quotes are kept for
+# QUOTE_CACHE_TTL_SECONDS, and concurrent misses for one ticker share a single
+# upstream call (single-flight), so upstream load scales with tickers, not clients.
+# With a `fetch_many`, get_many() fetches every missing ticker in one upstream call.
+
+QUOTE_CACHE_TTL_SECONDS = float(os.getenv("QUOTE_CACHE_TTL_SECONDS", "1.0"))
+RATE_WINDOW_SECONDS = 60
+
+
+class QuoteCache:
+    """
+    TTL cache over a blocking `fetch(ticker)` call, with request coalescing and metrics.
+    `fetch_many(tickers)` optionally returns objects for many tickers at once, each carrying
+    a `ticker` field (e.g. Polygon snapshots).
+    """
+
+    def __init__(self, fetch, ttl: float = QUOTE_CACHE_TTL_SECONDS, fetch_many=None):
+        self.fetch = fetch
+        self.fetch_many = fetch_many
+        self.ttl = ttl
+        self.quotes = {}  # ticker -> (expires_at, quote)
+        self.in_flight = {}  # ticker -> Task shared by every waiter; resolves to {ticker: quote}
+        self.upstream_times = deque()  # monotonic times of upstream calls in the last RATE_WINDOW_SECONDS
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "upstream_calls": 0, "upstream_errors": 0}
+
+    def _fresh(self, ticker: str):
+        entry = self.quotes.get(ticker)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    async def get(self, ticker: str) -> dict:
+        """Latest quote for `ticker` as a JSON-ready dict."""
+        ticker = ticker.upper()
+        quote = self._fresh(ticker)
+        if quote is not None:
+            self.stats["hits"] += 1
+            return quote
+
+        # Join the call already in flight for this ticker, or start one. The call runs as its own
+        # task so a cancelled waiter (e.g. a disconnected client) doesn't cancel it for the others.
+        task = self.in_flight.get(ticker)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            task = asyncio.create_task(self._refresh(ticker))
+            self.in_flight[ticker] = task
+        quotes = await asyncio.shield(task)
+        if ticker not in quotes:
+            raise LookupError(f"No quote for {ticker}")
+        return quotes[ticker]
+
+    async def get_many(self, tickers) -> dict:
+        """
+        Quotes for many tickers as {ticker: quote}; tickers upstream has no data for are left out.
+        Fresh quotes come from the cache, tickers already in flight join those calls, and all the
+        rest are fetched together in one `fetch_many` call.
+        """
+        tickers = sorted({t.upper() for t in tickers if t})
+        quotes = {}
+        waiting = {}  # ticker -> in-flight Task
+        missing = []
+        for ticker in tickers:
+            quote = self._fresh(ticker)
+            if quote is not None:
+                self.stats["hits"] += 1
+                quotes[ticker] = quote
+            elif ticker in self.in_flight:
+                self.stats["coalesced"] += 1
+                waiting[ticker] = self.in_flight[ticker]
+            else:
+                missing.append(ticker)
+
+        if missing:
+            self.stats["misses"] += len(missing)
+            if self.fetch_many is None:
+                tasks = {ticker: asyncio.create_task(self._refresh(ticker)) for ticker in missing}
+            else:
+                batch = asyncio.create_task(self._refresh_many(missing))
+                tasks = dict.fromkeys(missing, batch)
+            self.in_flight.update(tasks)
+            waiting.update(tasks)
+
+        # Await each distinct task once; a failed batch fails the whole call
+        results = {}
+        for task in set(waiting.values()):
+            results[task] = await asyncio.shield(task)
+        for ticker, task in waiting.items():
+            if ticker in results[task]:
+                quotes[ticker] = results[task][ticker]
+        return quotes
+
+    async def _refresh(self, ticker: str) -> dict:
+        try:
+            quote = await self._fetch_upstream(ticker)
+            self.quotes[ticker] = (time.monotonic() + self.ttl, quote)
+            return {ticker: quote}
+        finally:
+            del self.in_flight[ticker]
+
+    async def _refresh_many(self, tickers: list) -> dict:
+        task = asyncio.current_task()
+        try:
+            self.stats["upstream_calls"] += 1
+            self.upstream_times.append(time.monotonic())
+            try:
+                items = jsonable_encoder(await asyncio.to_thread(self.fetch_many, tickers))
+            except Exception:
+                self.stats["upstream_errors"] += 1
+                raise
+            expires_at = time.monotonic() + self.ttl
+            wanted = set(tickers)
+            quotes = {}
+            for item in items or ():
+                ticker = (item.get("ticker") or "").upper()
+                if ticker in wanted:
+                    quotes[ticker] = item
+                    self.quotes[ticker] = (expires_at, item)
+            return quotes
+        finally:
+            for ticker in tickers:
+                if self.in_flight.get(ticker) is task:
+                    del self.in_flight[ticker]
+
+    async def _fetch_upstream(self, ticker: str) -> dict:
+        self.stats["upstream_calls"] += 1
+        self.upstream_times.append(time.monotonic())
+        try:
+            return jsonable_encoder(await asyncio.to_thread(self.fetch, ticker))
+        except Exception:
+            self.stats["upstream_errors"] += 1
+            raise
+
+    def metrics(self) -> dict:
+        now = time.monotonic()
+        while self.upstream_times and self.upstream_times[0] <= now - RATE_WINDOW_SECONDS:
+            self.upstream_times.popleft()
+        requests = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "ttl_seconds": self.ttl,
+            "tickers_cached": len(self.quotes),
+            "in_flight": len(set(self.in_flight.values())),
+            "hit_ratio": round((requests - self.stats["misses"]) / requests, 4) if requests else 0.0,
+            "upstream_calls_per_second": round(len(self.upstream_times) / RATE_WINDOW_SECONDS, 3),
+        }
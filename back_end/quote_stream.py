@@ -0,0 +1,139 @@
+import asyncio
+import os
+from collections import deque
+from fastapi import WebSocket
+
+# Subscription fan-out for /stocks/ws/getlastquote. One poller task per subscribed ticker
+# reads the shared QuoteCache and pushes changed quotes to every subscriber's outbox.
+# The outbox holds at most one unsent quote per ticker, so a slow client skips stale quotes
+# rather than holding up the others; replies and errors are always delivered, in order.
+
+QUOTE_POLL_INTERVAL_SECONDS = float(os.getenv("QUOTE_POLL_INTERVAL_SECONDS", "1.0"))
+MAX_TICKERS_PER_CONNECTION = int(os.getenv("QUOTE_MAX_TICKERS_PER_CONNECTION", "50"))
+
+
+class Subscriber:
+    """One websocket connection: its tickers, its outbox and the task draining it."""
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.tickers = set()
+        self.control = deque()  # replies and errors, never dropped
+        self.quotes = {}  # ticker -> latest unsent quote message, oldest ticker first
+        self.ready = asyncio.Event()
+        self.dropped = 0  # quotes replaced by a newer one before they were sent
+        self.sender = asyncio.create_task(self._send_loop())
+
+    def offer(self, message: dict):
+        """Queue a message without waiting. A quote replaces its ticker's unsent quote; anything else is kept."""
+        if message.get("type") == "quote":
+            if message["ticker"] in self.quotes:
+                self.dropped += 1
+            self.quotes[message["ticker"]] = message  # an existing ticker keeps its place in line
+        else:
+            self.control.append(message)
+        self.ready.set()
+
+    def discard(self, ticker: str):
+        """Drop the unsent quote of a ticker the client no longer wants."""
+        self.quotes.pop(ticker, None)
+
+    def _next_message(self):
+        if self.control:
+            return self.control.popleft()
+        if self.quotes:
+            return self.quotes.pop(next(iter(self.quotes)))
+        return None
+
+    async def _send_loop(self):
+        try:
+            while True:
+                await self.ready.wait()
+                message = self._next_message()
+                if message is None:
+                    self.ready.clear()
+                    continue
+                await self.websocket.send_json(message)
+        except Exception:
+            pass  # connection closed; the receive loop cleans up
+
+    def close(self):
+        self.sender.cancel()
+
+
+class QuoteHub:
+    """Tracks subscribers per ticker and runs one poller for each ticker with subscribers."""
+
+    def __init__(self, quote_cache, interval: float = QUOTE_POLL_INTERVAL_SECONDS):
+        self.quote_cache = quote_cache
+        self.interval = interval
+        self.subscribers = {}  # ticker -> set of Subscriber
+        self.pollers = {}  # ticker -> Task
+        self.latest = {}  # ticker -> last broadcast quote
+
+    def subscribe(self, subscriber: Subscriber, tickers) -> list:
+        """Add tickers to a connection, up to MAX_TICKERS_PER_CONNECTION. Returns the ones added."""
+        added = []
+        for ticker in {t.upper() for t in tickers} - subscriber.tickers:
+            if len(subscriber.tickers) >= MAX_TICKERS_PER_CONNECTION:
+                break
+            subscriber.tickers.add(ticker)
+            self.subscribers.setdefault(ticker, set()).add(subscriber)
+            if ticker in self.latest:
+                subscriber.offer({"type": "quote", "ticker": ticker, "quote": self.latest[ticker]})
+            if ticker not in self.pollers:
+                self.pollers[ticker] = asyncio.create_task(self._poll(ticker))
+            added.append(ticker)
+        return sorted(added)
+
+    def unsubscribe(self, subscriber: Subscriber, tickers) -> list:
+        removed = []
+        for ticker in {t.upper() for t in tickers} & subscriber.tickers:
+            subscriber.tickers.discard(ticker)
+            subscriber.discard(ticker)
+            subscribers = self.subscribers.get(ticker, set())
+            subscribers.discard(subscriber)
+            if not subscribers:
+                # Last subscriber gone: stop polling this ticker
+                self.subscribers.pop(ticker, None)
+                self.latest.pop(ticker, None)
+                poller = self.pollers.pop(ticker, None)
+                if poller:
+                    poller.cancel()
+            removed.append(ticker)
+        return sorted(removed)
+
+    def disconnect(self, subscriber: Subscriber):
+        self.unsubscribe(subscriber, list(subscriber.tickers))
+        subscriber.close()
+
+    def _broadcast(self, ticker: str, message: dict):
+        for subscriber in list(self.subscribers.get(ticker, ())):
+            subscriber.offer(message)
+
+    async def _poll(self, ticker: str):
+        failing = False
+        while True:
+            try:
+                quote = await self.quote_cache.get(ticker)
+                failing = False
+                if quote != self.latest.get(ticker):
+                    self.latest[ticker] = quote
+                    self._broadcast(ticker, {"type": "quote", "ticker": ticker, "quote": quote})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not failing:  # report once per outage
+                    self._broadcast(ticker, {"type": "error", "ticker": ticker, "detail": str(e)})
+                failing = True
+            await asyncio.sleep(self.interval)
+
+    def metrics(self) -> dict:
+        connections = {s for subscribers in self.subscribers.values() for s in subscribers}
+        return {
+            "tickers_polled": len(self.pollers),
+            "subscriptions": sum(len(s) for s in self.subscribers.values()),
+            "connections": len(connections),
+            "dropped_quotes": sum(s.dropped for s in connections),
+            "poll_interval_seconds": self.interval,
+        }
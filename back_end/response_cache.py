@@ -0,0 +1,210 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Annotated
+from fastapi import APIRouter, Depends, status
+from fastapi.encoders import jsonable_encoder
+from auth import get_current_user
+
+# Cache of per-user dashboard responses (pie chart, balances, categories, goals).
+# Entries are keyed by (user, version, endpoint, params) and stored as JSON bytes. Every write
+# that changes what a user sees bumps that user's version, so their old entries are never read
+# again and age out of the LRU. Setting RESPONSE_CACHE_URL shares entries and versions between
+# workers through Redis. Without it each worker keeps its own versions, so a write handled by one
+# worker does not invalidate another worker's entries: the in-process backend is only exact with a
+# single worker, and it keeps entries for RESPONSE_CACHE_LOCAL_TTL_SECONDS so that with several
+# workers a stale response is served for at most that long.
+
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))  # backstop for missed invalidations
+RESPONSE_CACHE_LOCAL_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_LOCAL_TTL_SECONDS", "30"))
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL")  # e.g. redis://localhost:6379/0
+
+router = APIRouter(
+    prefix='/response_cache',
+    tags=['response_cache']
+)
+
+user_dependency = Annotated[dict, Depends(get_current_user)]
+
+
+# ==================== Backends ====================
+class LocalBackend:
+    """In-process LRU bounded by the total size of the stored values. Versions are per process."""
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES, ttl: float = RESPONSE_CACHE_LOCAL_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, bytes)
+        self.versions = {}  # user_id -> int
+        self.size = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        self.size -= len(self.entries.pop(key)[1])
+
+    def get_version(self, user_id: int) -> int:
+        with self.lock:
+            return self.versions.get(user_id, 0)
+
+    def bump_version(self, user_id: int) -> int:
+        with self.lock:
+            self.versions[user_id] = self.versions.get(user_id, 0) + 1
+            return self.versions[user_id]
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"backend": "local", "entries": len(self.entries), "bytes": self.size,
+                    "max_bytes": self.max_bytes, "evictions": self.evictions, "ttl_seconds": self.ttl}
+
+
+class SharedBackend:
+    """
+    Backend over a Redis-style client (get, set with ex=, incr) shared by every worker.
+    Eviction and the memory cap are the server's job (maxmemory with allkeys-lru).
+    """
+
+    def __init__(self, client, prefix: str = "response_cache", ttl: int = RESPONSE_CACHE_TTL_SECONDS):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get(self, key: str):
+        return self.client.get(f"{self.prefix}:entry:{key}")
+
+    def set(self, key: str, value: bytes):
+        self.client.set(f"{self.prefix}:entry:{key}", value, ex=self.ttl)
+
+    def get_version(self, user_id: int) -> int:
+        return int(self.client.get(f"{self.prefix}:version:{user_id}") or 0)
+
+    def bump_version(self, user_id: int) -> int:
+        return self.client.incr(f"{self.prefix}:version:{user_id}")
+
+    def stats(self) -> dict:
+        return {"backend": "shared", "prefix": self.prefix, "ttl_seconds": self.ttl}
+
+
+class LocalSharedClient:
+    """In-memory stand-in for the Redis client, for development and tests without a server."""
+
+    def __init__(self):
+        self.data = {}  # key -> (expires_at or None, value)
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] <= time.monotonic():
+                del self.data[key]
+                return None
+            return entry[1]
+
+    def set(self, key: str, value, ex: int | None = None):
+        with self.lock:
+            self.data[key] = (time.monotonic() + ex if ex else None, value)
+
+    def incr(self, key: str) -> int:
+        with self.lock:
+            entry = self.data.get(key)
+            value = int(entry[1]) + 1 if entry else 1
+            self.data[key] = (entry[0] if entry else None, str(value).encode())
+            return value
+
+
+def make_backend():
+    """SharedBackend on RESPONSE_CACHE_URL ("local" for the in-memory stand-in), else LocalBackend."""
+    if not RESPONSE_CACHE_URL:
+        return LocalBackend()
+    if RESPONSE_CACHE_URL == "local":
+        return SharedBackend(LocalSharedClient())
+    import redis  # only needed for a shared cache
+    return SharedBackend(redis.Redis.from_url(RESPONSE_CACHE_URL))
+
+
+# ==================== Cache ====================
+class ResponseCache:
+    """Per-user response cache with version-counter invalidation."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()  # guards the counters
+
+    def key(self, user_id: int, endpoint: str, params: dict | None = None) -> str:
+        version = self.backend.get_version(user_id)
+        encoded = json.dumps(jsonable_encoder(params or {}), sort_keys=True, separators=(",", ":"))
+        return f"{user_id}:{version}:{endpoint}:{encoded}"
+
+    def get_or_compute(self, user_id: int, endpoint: str, params: dict | None, compute):
+        """Return the cached JSON response, or `compute()` it and store it for this user's current version."""
+        key = self.key(user_id, endpoint, params)
+        cached = self.backend.get(key)
+        if cached is not None:
+            self._count(hit=True)
+            return json.loads(cached)
+        self._count(hit=False)
+        value = jsonable_encoder(compute())
+        self.backend.set(key, json.dumps(value, separators=(",", ":")).encode())
+        return value
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Call after any write that changes what this user's cached endpoints return."""
+        self.backend.bump_version(user_id)
+
+    def _count(self, hit: bool):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            **self.backend.stats(),
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache(make_backend())
+
+
+# ==================== Routes ====================
+@router.get("/metrics", status_code=status.HTTP_200_OK)
+async def get_response_cache_metrics(user: user_dependency):
+    """Hit/miss counters and size of this worker's response cache."""
+    return response_cache.stats()
@@ -0,0 +1,184 @@
+import argparse
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select, delete, func, case
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import Spend_Rollup, Plaid_Transactions, Plaid_Bank_Account, Transaction_Category_Link
+from auth import get_current_user
+
+router = APIRouter(
+    prefix='/spend',
+    tags=['spend']
+)
+
+# ==================== Dependencies ====================
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+db_dependency = Annotated[Session, Depends(get_db)]
+user_dependency = Annotated[dict, Depends(get_current_user)]
+
+# ==================== Buckets ====================
+BUCKETS = ("day", "week", "month")
+ROLLUP_KEY = ["user_id", "category_id", "account_id", "bucket", "bucket_start"]
+
+def bucket_start(bucket: str, day: date) -> date:
+    """First day of the day/week/month bucket containing `day`; weeks start on Monday."""
+    if bucket == "day":
+        return day
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+# ==================== Incremental Maintenance ====================
+class RollupDelta:
+    """Accumulates spend changes per rollup bucket so a whole batch is applied with one upsert."""
+
+    def __init__(self):
+        self.deltas = defaultdict(lambda: [0.0, 0.0, 0])  # key -> [spend, net, txn_count]
+
+    def add(self, user_id: int, category_id: int, account_id: str, day: date, spend: float, net: float, count: int):
+        for bucket in BUCKETS:
+            totals = self.deltas[(user_id, category_id, account_id, bucket, bucket_start(bucket, day))]
+            totals[0] += spend
+            totals[1] += net
+            totals[2] += count
+
+    def add_transaction(self, user_id: int, category_id, account_id: str, day, amount, sign: int = 1):
+        """Count (sign=1) or uncount (sign=-1) one transaction; uncategorized or undated ones are not rolled up."""
+        if category_id is None or day is None or amount is None:
+            return
+        self.add(user_id, category_id, account_id, day, sign * max(amount, 0.0), sign * amount, sign)
+
+    def touched(self) -> set:
+        """(user_id, category_id, bucket, bucket_start) for every bucket this delta changes."""
+        return {(user_id, category_id, bucket, start) for user_id, category_id, _, bucket, start in self.deltas}
+
+def apply_rollup_deltas(db: Session, delta: RollupDelta) -> None:
+    """Add the accumulated deltas to Spend_Rollup without committing."""
+    from bulk_writer import upsert_rows  # bulk_writer imports this module
+
+    rows = [
+        dict(zip(ROLLUP_KEY, key), spend=spend, net=net, txn_count=count)
+        for key, (spend, net, count) in delta.deltas.items()
+        if count or spend or net
+    ]
+    if not rows:
+        return
+    upsert_rows(db, Spend_Rollup, rows, ROLLUP_KEY, [], increment_columns=["spend", "net", "txn_count"])
+
+    # Drop buckets that no longer hold any transactions
+    user_ids = {row["user_id"] for row in rows}
+    db.execute(delete(Spend_Rollup).where(Spend_Rollup.user_id.in_(user_ids), Spend_Rollup.txn_count <= 0))
+
+# ==================== Rebuild ====================
+def rebuild_user_rollups(db: Session, user_id: int) -> int:
+    """Recompute one user's rollups from Plaid_Transactions with a per-day aggregate query."""
+    daily = (
+        select(
+            Transaction_Category_Link.category_id,
+            Plaid_Transactions.account_id,
+            Plaid_Transactions.date,
+            func.sum(case((Plaid_Transactions.amount > 0, Plaid_Transactions.amount), else_=0)).label("spend"),
+            func.sum(Plaid_Transactions.amount).label("net"),
+            func.count().label("txn_count"),
+        )
+        .join(Transaction_Category_Link, Transaction_Category_Link.transaction_id == Plaid_Transactions.transaction_id)
+        .join(Plaid_Bank_Account, Plaid_Bank_Account.account_id == Plaid_Transactions.account_id)
+        .where(Plaid_Bank_Account.user_id == user_id, Plaid_Transactions.date.isnot(None))
+        .group_by(Transaction_Category_Link.category_id, Plaid_Transactions.account_id, Plaid_Transactions.date)
+    )
+    delta = RollupDelta()
+    for row in db.execute(daily).yield_per(5000):
+        delta.add(user_id, row.category_id, row.account_id, row.date, float(row.spend or 0), float(row.net or 0), row.txn_count)
+
+    db.execute(delete(Spend_Rollup).where(Spend_Rollup.user_id == user_id))
+    apply_rollup_deltas(db, delta)
+    db.commit()
+    return len(delta.deltas)
+
+def rebuild_rollups(db: Session, user_id: int | None = None) -> int:
+    """Backfill rollups for one user or for every user with a linked account, committing per user."""
+    if user_id is not None:
+        return rebuild_user_rollups(db, user_id)
+    user_ids = db.execute(select(Plaid_Bank_Account.user_id).distinct()).scalars().all()
+    return sum(rebuild_user_rollups(db, uid) for uid in user_ids)
+
+# ==================== Queries ====================
+def spend_series_query(user_id: int, bucket: str, start: date, end: date,
+                       category_id: int | None = None, account_id: str | None = None):
+    query = (
+        select(
+            Spend_Rollup.bucket_start,
+            Spend_Rollup.category_id,
+            func.sum(Spend_Rollup.spend).label("spend"),
+            func.sum(Spend_Rollup.net).label("net"),
+            func.sum(Spend_Rollup.txn_count).label("txn_count"),
+        )
+        .where(
+            Spend_Rollup.user_id == user_id,
+            Spend_Rollup.bucket == bucket,
+            Spend_Rollup.bucket_start >= bucket_start(bucket, start),
+            Spend_Rollup.bucket_start <= end,
+        )
+        .group_by(Spend_Rollup.bucket_start, Spend_Rollup.category_id)
+        .order_by(Spend_Rollup.bucket_start, Spend_Rollup.category_id)
+    )
+    if category_id is not None:
+        query = query.where(Spend_Rollup.category_id == category_id)
+    if account_id is not None:
+        query = query.where(Spend_Rollup.account_id == account_id)
+    return query
+
+def get_spend_series(db: Session, user_id: int, bucket: str, start: date, end: date,
+                     category_id: int | None = None, account_id: str | None = None):
+    """Spend per bucket and category between start and end, summed across accounts unless one is given."""
+    return [
+        {
+            "bucket_start": row.bucket_start,
+            "category_id": row.category_id,
+            "spend": float(row.spend or 0),
+            "net": float(row.net or 0),
+            "txn_count": int(row.txn_count or 0),
+        }
+        for row in db.execute(spend_series_query(user_id, bucket, start, end, category_id, account_id))
+    ]
+
+# ==================== Routes ====================
+@router.get("/rollup", status_code=status.HTTP_200_OK)
+async def get_rollup(
+    user: user_dependency,
+    db: db_dependency,
+    bucket: str = Query("month", description="day, week or month"),
+    start: date | None = Query(None, description="Defaults to 12 months before end"),
+    end: date | None = Query(None, description="Defaults to today"),
+    category_id: int | None = None,
+    account_id: str | None = None,
+):
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(BUCKETS)}")
+    end = end or date.today()
+    start = start or end - timedelta(days=365)
+    return get_spend_series(db, user["id"], bucket, start, end, category_id, account_id)
+
+# Backfill from history:
+#   python rollups.py rebuild [--user-id ID]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Spend rollup maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--user-id", type=int, default=None, help="Only rebuild this user's rollups")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        buckets = rebuild_rollups(db, args.user_id)
+        print(f"Rebuilt {buckets} rollup buckets")
+    finally:
+        db.close()
@@ -6,6 +6,7 @@ from models import Save_Goals, Users
 from pydantic import BaseModel
 from datetime import date
 from auth import get_current_user
+from response_cache import response_cache
 
 router = APIRouter(
     prefix="/save_goals",
@@ -49,6 +50,7 @@ async def create_save_goal(user: Annotated[dict, Depends(get_current_user)],
     )
     db.add(save_goal_model)
     db.commit()
+    response_cache.invalidate_user(user["id"])
     return {"message": "Save goal created successfully"}
 
 @router.put("/{goal_id}", status_code=status.HTTP_200_OK)
@@ -68,6 +70,7 @@ async def update_save_goal(user: Annotated[dict, Depends(get_current_user)],
     save_goal_model.goal_status = update_save_goal_request.goal_status
 
     db.commit()
+    response_cache.invalidate_user(user["id"])
     return {"message": "Save goal updated successfully"}
 
 @router.delete("/{goal_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -81,14 +84,17 @@ async def delete_save_goal(user: Annotated[dict, Depends(get_current_user)],
 
     db.delete(save_goal_model)
     db.commit()
+    response_cache.invalidate_user(user["id"])
     return {"message": "Save goal deleted successfully"}
 
 @router.get("/", status_code=status.HTTP_200_OK)
 async def get_save_goals(user: Annotated[dict, Depends(get_current_user)], 
                          db: db_dependency):
     """Retrieve all savings goals."""
-    save_goals = db.query(Save_Goals).filter(Save_Goals.user_id == user["id"]).all()
-    return save_goals 
+    return response_cache.get_or_compute(
+        user["id"], "save_goals", None,
+        lambda: db.query(Save_Goals).filter(Save_Goals.user_id == user["id"]).all()
+    )
 
 
 
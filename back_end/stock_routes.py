@@ -1,11 +1,19 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, status
+import asyncio
+import os
+import threading
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from database import SessionLocal
 from models import Settings
 from auth import get_current_user
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from polygon import RESTClient
 from dotenv import load_dotenv
+from quote_cache import QuoteCache
+from quote_stream import QuoteHub, Subscriber
+from bar_store import BarStore, TIMESPAN_SECONDS
+from ttl_cache import TTLCache
+import indicators
 
 load_dotenv()
 
@@ -17,6 +25,26 @@ router = APIRouter(
 
 polygonapi = RESTClient("POLYGON_API_KEY") 
 
+# Shared by every websocket client; one upstream call per ticker per TTL
+quote_cache = QuoteCache(polygonapi.get_last_quote)
+quote_hub = QuoteHub(quote_cache)
+
+# Full ticker snapshots (last trade, today's and previous day's bars); misses are batched
+# into one snapshot call for all requested tickers
+snapshot_cache = QuoteCache(
+    lambda ticker: polygonapi.get_snapshot_ticker("stocks", ticker),
+    fetch_many=lambda tickers: polygonapi.get_snapshot_all("stocks", tickers=tickers),
+)
+
+# Historical bars are served from the local store; only missing ranges go upstream
+bar_store = BarStore(polygonapi.list_aggs)
+
+# Indicator results per (ticker, range, params); short-lived because the newest bars can still change
+indicator_cache = TTLCache(
+    maxsize=int(os.getenv("INDICATOR_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("INDICATOR_CACHE_TTL_SECONDS", "60"))
+)
+
 
 def get_db():
     db = SessionLocal()
@@ -29,6 +57,10 @@ def get_db():
 class StockRequest(BaseModel):
     ticker: str
 
+class QuoteSubscription(BaseModel):
+    action: str  # "subscribe" or "unsubscribe"
+    tickers: list[str]
+
 class StockCustomBars(BaseModel):
     tick: str
     multiplier: int
@@ -37,45 +69,168 @@ class StockCustomBars(BaseModel):
     To: str
     adjusted: bool
     sort: str
-    limit: int
+    limit: int = Field(ge=1)  # most bars to send
 
 # WebSocket endpoint for retrieving the last quote.
+# Send {"ticker": ...} for a single quote, or {"action": "subscribe"|"unsubscribe", "tickers": [...]}
+# to receive {"type": "quote", "ticker": ..., "quote": ...} frames whenever a subscribed quote changes.
 @router.websocket("/ws/getlastquote")
 async def websocket_lastquote(websocket: WebSocket):
 
     await websocket.accept()
+    subscriber = Subscriber(websocket)
     try:
 
         while True:
             data = await websocket.receive_json()
 
+            if isinstance(data, dict) and "action" in data:
+                try:
+                    request = QuoteSubscription(**data)
+                except Exception as validation_error:
+                    subscriber.offer({"error": "Invalid data format", "detail": str(validation_error)})
+                    continue
+                if request.action == "subscribe":
+                    tickers = quote_hub.subscribe(subscriber, request.tickers)
+                elif request.action == "unsubscribe":
+                    tickers = quote_hub.unsubscribe(subscriber, request.tickers)
+                else:
+                    subscriber.offer({"error": "Unknown action", "detail": request.action})
+                    continue
+                subscriber.offer({"type": request.action + "d", "tickers": tickers, "subscribed": sorted(subscriber.tickers)})
+                continue
+
             try:
                 request = StockRequest(**data)
             except Exception as validation_error:
-                await websocket.send_json({"error": "Invalid data format", "detail": str(validation_error)})
+                subscriber.offer({"error": "Invalid data format", "detail": str(validation_error)})
                 continue
 
 
             try:
-                quote = polygonapi.get_last_quote(request.ticker)
-
-                await websocket.send_json(quote)
+                subscriber.offer(await quote_cache.get(request.ticker))
             except Exception as api_error:
 
-                await websocket.send_json({"error": "Failed to fetch quote", "detail": str(api_error)})
+                subscriber.offer({"error": "Failed to fetch quote", "detail": str(api_error)})
     except WebSocketDisconnect:
 
         print("Client disconnected from /ws/getlastquote")
+    finally:
+        quote_hub.disconnect(subscriber)
+
+
+@router.get("/quote_cache/metrics", status_code=status.HTTP_200_OK)
+async def get_quote_cache_metrics():
+    """Hit ratio and upstream call rate of the shared quote cache."""
+    return quote_cache.metrics()
+
+
+@router.get("/snapshot_cache/metrics", status_code=status.HTTP_200_OK)
+async def get_snapshot_cache_metrics():
+    """Hit ratio and upstream call rate of the batched snapshot cache used for portfolio valuation."""
+    return snapshot_cache.metrics()
+
+
+@router.get("/quote_stream/metrics", status_code=status.HTTP_200_OK)
+async def get_quote_stream_metrics():
+    """Pollers, subscriptions and dropped quotes of the subscription fan-out."""
+    return quote_hub.metrics()
+
+
+def compute_indicators(ticker: str, multiplier: int, timespan: str, start: str, end: str, adjusted: bool, specs: tuple) -> dict:
+    """Load bars from the bar store and compute the requested indicators as columnar lists."""
+    key = (ticker.upper(), multiplier, timespan, start, end, adjusted, specs)
+    result = indicator_cache.get(key)
+    if result is not None:
+        return result
+
+    bars = bar_store.get_bars(ticker, multiplier, timespan, start, end, adjusted)
+    arrays = indicators.bars_to_arrays(bars, intraday=timespan in ("second", "minute", "hour"))
+    values = indicators.compute(arrays, specs)
+    result = {
+        "ticker": ticker.upper(),
+        "timestamp": arrays["timestamp"].astype("int64").tolist(),
+        "close": indicators.to_json_list(arrays["close"]),
+        "indicators": {
+            name: {part: indicators.to_json_list(v) for part, v in value.items()} if isinstance(value, dict)
+            else indicators.to_json_list(value)
+            for name, value in values.items()
+        },
+    }
+    indicator_cache.set(key, result)
+    return result
 
 
+@router.get("/indicators", status_code=status.HTTP_200_OK)
+async def get_indicators(
+    ticker: str,
+    From: str = Query(..., description="YYYY-MM-DD or ms timestamp"),
+    To: str = Query(..., description="YYYY-MM-DD or ms timestamp"),
+    multiplier: int = 1,
+    timespan: str = "day",
+    adjusted: bool = True,
+    indicator: list[str] = Query(["sma:20"], description="name[:param...], e.g. sma:20, ema:50, rsi:14, macd:12:26:9, bollinger:20:2, vwap")
+):
+    """SMA, EMA, RSI, MACD, Bollinger bands and VWAP over stored bars, as arrays aligned with `timestamp`."""
+    try:
+        specs = tuple(indicators.parse_spec(spec) for spec in indicator)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if timespan not in TIMESPAN_SECONDS:
+        raise HTTPException(status_code=400, detail=f"timespan must be one of {', '.join(TIMESPAN_SECONDS)}")
+    try:
+        return await asyncio.to_thread(compute_indicators, ticker, multiplier, timespan, From, To, adjusted, specs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/bar_store/metrics", status_code=status.HTTP_200_OK)
+async def get_bar_store_metrics():
+    """Local bar store size and how many requests needed Polygon."""
+    return await asyncio.to_thread(bar_store.metrics)
+
+
+async def stream_custombars(websocket: WebSocket, request: StockCustomBars):
+    """Send up to request.limit bars as {"type": "bars"} frames of BAR_CHUNK_SIZE, then a {"type": "complete"} frame."""
+    cancelled = threading.Event()
+    chunks = bar_store.iter_bars(
+        request.tick,
+        request.multiplier,
+        request.timeframe,
+        request.From,
+        request.To,
+        request.adjusted,
+        request.sort,
+        cancelled=cancelled
+    )
+    count = frames = 0
+    try:
+        while count < request.limit:
+            # Each chunk is read on a worker thread; the next one is only read after this one is sent
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            chunk = chunk[:request.limit - count]
+            await websocket.send_json({"type": "bars", "ticker": request.tick, "seq": frames, "bars": chunk})
+            count += len(chunk)
+            frames += 1
+        await websocket.send_json({"type": "complete", "ticker": request.tick, "count": count, "frames": frames})
+    finally:
+        cancelled.set()  # stops the generator's upstream paging if we were cancelled mid-stream
+
+
+# Each request streams its bars in chunks. A new request cancels the one in progress,
+# and a disconnect cancels the stream and any upstream paging.
 @router.websocket("/ws/getcustombars")
 async def websocket_custombars(websocket: WebSocket):
 
     await websocket.accept()
+    receive = asyncio.create_task(websocket.receive_json())
     try:
         while True:
 
-            data = await websocket.receive_json()
+            data = await receive
+            receive = asyncio.create_task(websocket.receive_json())
 
             try:
                 request = StockCustomBars(**data)
@@ -83,26 +238,19 @@ async def websocket_custombars(websocket: WebSocket):
                 await websocket.send_json({"error": "Invalid data format", "detail": str(validation_error)})
                 continue
 
+            stream = asyncio.create_task(stream_custombars(websocket, request))
+            await asyncio.wait({stream, receive}, return_when=asyncio.FIRST_COMPLETED)
+            if not stream.done():
+                # A new message or a disconnect arrived first
+                stream.cancel()
+                continue
             try:
-                custombars = polygonapi.list_aggs(
-                    request.tick,
-                    request.multiplier,
-                    request.timeframe,
-                    request.From,
-                    request.To,
-                    request.adjusted,
-                    request.sort,
-                    request.limit
-                )
-                await websocket.send_json(custombars)
+                stream.result()
+            except WebSocketDisconnect:
+                raise
             except Exception as api_error:
                 await websocket.send_json({"error": "Failed to fetch custom bars", "detail": str(api_error)})
     except WebSocketDisconnect:
         print("Client disconnected from /ws/getcustombars")
-
-
-
-
-
-
-
+    finally:
+        receive.cancel()
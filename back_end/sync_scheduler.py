@@ -0,0 +1,293 @@
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+import zlib
+from typing import Annotated
+from fastapi import APIRouter, Depends, status
+from plaid import ApiException
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from database import SessionLocal, engine
+from models import Users
+from auth import get_current_user
+from plaid_client import plaid_error_code
+
+# Background Plaid sync: a queue of per-user jobs run by a fixed pool of worker threads.
+# Rate-limited jobs are retried with exponential backoff, and the periodic refresh of
+# every linked user is spread evenly across the refresh interval. With several app
+# processes on one database, only the holder of the refresh lock schedules the refresh.
+
+router = APIRouter(
+    prefix='/sync',
+    tags=['sync']
+)
+
+user_dependency = Annotated[dict, Depends(get_current_user)]
+
+SYNC_WORKERS = int(os.getenv("SYNC_WORKERS", "4"))
+SYNC_MAX_ATTEMPTS = int(os.getenv("SYNC_MAX_ATTEMPTS", "6"))
+BACKOFF_BASE_SECONDS = float(os.getenv("SYNC_BACKOFF_BASE_SECONDS", "2"))
+BACKOFF_MAX_SECONDS = float(os.getenv("SYNC_BACKOFF_MAX_SECONDS", "300"))
+REFRESH_INTERVAL_SECONDS = float(os.getenv("SYNC_REFRESH_INTERVAL_SECONDS", "3600"))  # 0 disables periodic refresh
+REFRESH_LOCK_NAME = os.getenv("SYNC_REFRESH_LOCK_NAME", "plaid_sync_refresh")
+
+# kind -> handler(db, user_id)
+JOB_HANDLERS = {}
+
+
+def register_sync_job(kind: str):
+    """Register `handler(db, user_id)` as the job run for `kind`. Used as a decorator."""
+    def decorator(handler):
+        JOB_HANDLERS[kind] = handler
+        return handler
+    return decorator
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return isinstance(error, ApiException) and plaid_error_code(error) == "RATE_LIMIT_EXCEEDED"
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with jitter: about base * 2^attempt seconds, capped at BACKOFF_MAX_SECONDS."""
+    return min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+class SyncJob:
+    def __init__(self, kind: str, user_id: int, attempt: int = 0):
+        self.kind = kind
+        self.user_id = user_id
+        self.attempt = attempt
+
+    @property
+    def key(self):
+        return (self.kind, self.user_id)
+
+
+class RefreshLock:
+    """
+    Database-wide lock electing the one process that runs the periodic refresh: GET_LOCK on MySQL,
+    an advisory lock on PostgreSQL. It is taken without waiting and kept on its own connection, so
+    if the holder dies the server releases it and another process takes over on its next cycle.
+    SQLite is only used by a single process, so there the lock is always held.
+    """
+
+    def __init__(self, engine: Engine, name: str = REFRESH_LOCK_NAME):
+        self.engine = engine
+        self.name = name
+        self.conn = None
+
+    def acquire(self) -> bool:
+        """True if this process holds the lock, taking it if it is free."""
+        dialect = self.engine.dialect.name
+        if dialect not in ("mysql", "postgresql"):
+            return True
+        if self.conn is not None:
+            try:
+                self.conn.execute(text("SELECT 1"))  # still connected, so still holding it
+                self.conn.commit()
+                return True
+            except Exception:
+                self.release()
+        conn = self.engine.connect()
+        try:
+            if dialect == "mysql":
+                acquired = conn.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": self.name}).scalar() == 1
+            else:
+                acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"),
+                                        {"key": zlib.crc32(self.name.encode())}).scalar()
+            conn.commit()  # session-level locks outlive the transaction
+        except Exception:
+            conn.close()
+            raise
+        if not acquired:
+            conn.close()
+            return False
+        self.conn = conn
+        return True
+
+    def release(self):
+        if self.conn is not None:
+            # Closing the DBAPI connection releases the lock; returning it to the pool would not
+            self.conn.invalidate()
+            self.conn.close()
+            self.conn = None
+
+
+class SyncScheduler:
+    """
+    Delay queue of sync jobs, at most one queued and one running per (kind, user).
+    Enqueueing a job that is already queued keeps the earlier run time; enqueueing one
+    that is running runs it once more after it finishes.
+    """
+
+    def __init__(self, workers: int = SYNC_WORKERS, session_factory=SessionLocal,
+                 refresh_interval: float = REFRESH_INTERVAL_SECONDS, refresh_lock: RefreshLock | None = None):
+        self.workers = workers
+        self.session_factory = session_factory
+        self.refresh_interval = refresh_interval
+        self.refresh_lock = refresh_lock  # None: this process always refreshes
+        self.cond = threading.Condition()
+        self.heap = []  # (run_at, seq, job)
+        self.seq = itertools.count()
+        self.queued = {}  # key -> run_at of the live heap entry
+        self.running = set()
+        self.rerun = set()
+        self.threads = []
+        self.stopping = False
+        self.stopped = threading.Event()  # wakes the refresh loop on stop
+        self.stats = {"completed": 0, "failed": 0, "retried": 0, "rate_limited": 0}
+
+    # ---------- Queue ----------
+    def enqueue(self, kind: str, user_id: int, delay: float = 0.0, attempt: int = 0) -> bool:
+        """Schedule a job `delay` seconds from now. Returns False if an equal or earlier one is pending."""
+        job = SyncJob(kind, user_id, attempt)
+        run_at = time.monotonic() + delay
+        with self.cond:
+            if job.key in self.running and delay == 0:
+                self.rerun.add(job.key)
+                return False
+            if job.key in self.queued and self.queued[job.key] <= run_at:
+                return False
+            self.queued[job.key] = run_at
+            heapq.heappush(self.heap, (run_at, next(self.seq), job))
+            self.cond.notify()
+        return True
+
+    def is_pending(self, kind: str, user_id: int) -> bool:
+        """True while a job for (kind, user_id) is queued or running."""
+        key = SyncJob(kind, user_id).key
+        with self.cond:
+            return key in self.queued or key in self.running
+
+    def _next_job(self):
+        with self.cond:
+            while not self.stopping:
+                now = time.monotonic()
+                if self.heap and self.heap[0][0] <= now:
+                    run_at, _, job = heapq.heappop(self.heap)
+                    if self.queued.get(job.key) != run_at:
+                        continue  # superseded by an earlier entry
+                    if job.key in self.running:
+                        self.rerun.add(job.key)
+                        del self.queued[job.key]
+                        continue
+                    del self.queued[job.key]
+                    self.running.add(job.key)
+                    return job
+                self.cond.wait(self.heap[0][0] - now if self.heap else None)
+            return None
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            self.run_job(job)
+
+    def run_job(self, job: SyncJob):
+        outcome, retry_in = "completed", None
+        db = self.session_factory()
+        try:
+            JOB_HANDLERS[job.kind](db, job.user_id)
+        except Exception as e:
+            db.rollback()
+            outcome = "failed"
+            if is_rate_limited(e) and job.attempt + 1 < SYNC_MAX_ATTEMPTS:
+                outcome, retry_in = "retried", backoff_delay(job.attempt)
+            else:
+                print(f"Sync job {job.kind} for user {job.user_id} failed:", e)
+            if is_rate_limited(e):
+                self._count("rate_limited")
+        finally:
+            db.close()
+            with self.cond:
+                self.stats[outcome] += 1
+                self.running.discard(job.key)
+                rerun = job.key in self.rerun
+                self.rerun.discard(job.key)
+
+        if retry_in is not None:
+            self.enqueue(job.kind, job.user_id, delay=retry_in, attempt=job.attempt + 1)
+        elif rerun:
+            self.enqueue(job.kind, job.user_id)
+
+    def _count(self, stat: str):
+        with self.cond:
+            self.stats[stat] += 1
+
+    # ---------- Periodic refresh ----------
+    def schedule_refresh_cycle(self) -> int:
+        """Queue a bank sync for every linked user, evenly spaced across one refresh interval."""
+        db = self.session_factory()
+        try:
+            user_ids = db.query(Users.id).filter(Users.plaid_access_token.isnot(None)).order_by(Users.id).all()
+        finally:
+            db.close()
+        spacing = self.refresh_interval / max(len(user_ids), 1)
+        for i, (user_id,) in enumerate(user_ids):
+            self.enqueue("bank", user_id, delay=i * spacing)
+        return len(user_ids)
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                # Another process holding the lock runs this cycle; retry for it next interval
+                if self.refresh_lock is None or self.refresh_lock.acquire():
+                    self.schedule_refresh_cycle()
+            except Exception as e:
+                print("Scheduling periodic sync failed:", e)
+            if self.stopped.wait(self.refresh_interval):
+                if self.refresh_lock is not None:
+                    self.refresh_lock.release()
+                return
+
+    # ---------- Lifecycle ----------
+    def start(self):
+        if self.threads:
+            return
+        self.stopping = False
+        self.stopped.clear()
+        self.threads = [
+            threading.Thread(target=self._work, name=f"sync-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        if self.refresh_interval > 0:
+            self.threads.append(threading.Thread(target=self._refresh_loop, name="sync-refresh", daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout: float | None = None):
+        """Stop after the running jobs finish; queued jobs are dropped."""
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def status(self, user_id: int | None = None) -> dict:
+        with self.cond:
+            result = {
+                "workers": self.workers,
+                "queued": len(self.queued),
+                "running": len(self.running),
+                **self.stats,
+            }
+            if user_id is not None:
+                jobs = {kind: "queued" for kind, uid in self.queued if uid == user_id}
+                jobs.update({kind: "running" for kind, uid in self.running if uid == user_id})
+                result["jobs"] = jobs
+        return result
+
+
+scheduler = SyncScheduler(refresh_lock=RefreshLock(engine))
+
+
+# ==================== Routes ====================
+@router.get("/status", status_code=status.HTTP_200_OK)
+async def get_sync_status(user: user_dependency):
+    return scheduler.status(user["id"])
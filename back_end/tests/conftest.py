@@ -0,0 +1,136 @@
+import os
+import socket
+import sys
+import threading
+import time
+
+# Tests run against an in-memory SQLite database and fake_plaid on a local port; both must be
+# configured before the app modules are imported (plaid_client reads PLAID_HOST at import).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+FAKE_PLAID_PORT = _free_port()
+os.environ["PLAID_HOST"] = f"http://127.0.0.1:{FAKE_PLAID_PORT}"
+os.environ.setdefault("PLAID_CLIENT_ID", "test-client")
+os.environ.setdefault("PLAID_SECRET", "test-secret")
+os.environ.pop("RESPONSE_CACHE_URL", None)
+os.environ.setdefault("BCRYPT_ROUNDS", "4")  # bcrypt's minimum cost keeps password tests fast
+if not (os.getenv("ENCRYPTION_KEYS") or os.getenv("ENCRYPTION_KEY")):
+    from cryptography.fernet import Fernet
+    os.environ["ENCRYPTION_KEY"] = Fernet.generate_key().decode()
+
+import pytest
+import requests
+import uvicorn
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, delete
+from sqlalchemy.pool import StaticPool
+import database
+
+engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+
+@event.listens_for(engine, "connect")
+def _enable_foreign_keys(dbapi_connection, _):
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+
+database.engine = engine
+database.SessionLocal.configure(bind=engine)
+
+import models
+import migrations
+import fake_plaid
+import plaid_client
+import plaid_routes
+from auth import get_current_user
+from plaid.model.item_public_token_exchange_request import ItemPublicTokenExchangeRequest
+
+models.Base.metadata.create_all(engine)
+migrations.run_migrations(engine)
+
+
+# ==================== Database ====================
+@pytest.fixture
+def db():
+    """A session on the test database; every table is emptied afterwards."""
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(models.Base.metadata.sorted_tables):
+                if table.name != "Schema_Version":
+                    conn.execute(delete(table))
+
+
+def make_user(db, user_id: int = 1, access_token: str | None = None) -> models.Users:
+    user = models.Users(
+        id=user_id, email=f"user{user_id}@example.com", username=f"user{user_id}", first_name="Test",
+        last_name=str(user_id), phone_number=f"555{user_id:07d}", hashed_password="x", is_verified=True,
+        plaid_access_token=plaid_client.encrypt_token(access_token) if access_token else None,
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+
+def spend_rollups(db) -> dict:
+    """(category_id, account_id, bucket, bucket_start) -> (spend, net, txn_count), rounded for comparison."""
+    return {
+        (r.category_id, r.account_id, r.bucket, r.bucket_start): (round(r.spend, 6), round(r.net, 6), r.txn_count)
+        for r in db.query(models.Spend_Rollup)
+    }
+
+
+# ==================== Fake Plaid ====================
+@pytest.fixture(scope="session")
+def fake_plaid_url():
+    """fake_plaid served by uvicorn on a background thread for the whole session."""
+    server = uvicorn.Server(uvicorn.Config(fake_plaid.app, host="127.0.0.1", port=FAKE_PLAID_PORT, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("fake_plaid did not start")
+        time.sleep(0.05)
+    yield os.environ["PLAID_HOST"]
+    server.should_exit = True
+    thread.join(5)
+
+
+@pytest.fixture
+def access_token(fake_plaid_url):
+    """A freshly linked fake item; the rate limit is lifted again after the test."""
+    response = plaid_client.client.item_public_token_exchange(
+        ItemPublicTokenExchangeRequest(client_id="test-client", secret="test-secret", public_token="public-fake")
+    )
+    yield response["access_token"]
+    set_rate_limit(fake_plaid_url, 0)
+
+
+def set_rate_limit(url: str, requests_per_second: int):
+    requests.post(f"{url}/fake/rate_limit", json={"requests_per_second": requests_per_second}).raise_for_status()
+
+
+@pytest.fixture
+def plaid_api():
+    """A client for the Plaid routes, authenticated as user 1."""
+    app = FastAPI()
+    app.include_router(plaid_routes.router)
+    app.dependency_overrides[get_current_user] = lambda: {"id": 1, "username": "user1"}
+    return TestClient(app)
+
+
+def mutate_item(url: str, access_token: str, **changes):
+    requests.post(f"{url}/fake/mutate", json={"access_token": access_token, **changes}).raise_for_status()
@@ -0,0 +1,73 @@
+import asyncio
+from datetime import timedelta
+import pytest
+from fastapi import HTTPException
+import auth
+from auth import create_access_token, generate_verification_token, get_current_user, user_cache
+from models import Users
+from user_info import UpdateUserInfo, update_user_info
+from conftest import make_user
+
+
+@pytest.fixture(autouse=True)
+def empty_user_cache():
+    user_cache.clear()
+    yield
+    user_cache.clear()
+
+
+def current_user(db, user_id: int = 1) -> dict:
+    token = create_access_token(f"user{user_id}", user_id, timedelta(minutes=5))
+    return asyncio.run(get_current_user(token, db))
+
+
+def rename_behind_the_cache(db, first_name: str):
+    db.get(Users, 1).first_name = first_name
+    db.commit()
+
+
+def test_current_user_is_cached_until_update_user(db):
+    make_user(db)
+    assert current_user(db)["first_name"] == "Test"
+    rename_behind_the_cache(db, "Stale")
+    assert current_user(db)["first_name"] == "Test"  # served from the cache
+
+    request = auth.UpdateUserRequest(email="new@example.com", phone_number="", password="")
+    asyncio.run(auth.update_user(user={"id": 1}, db=db, update_user_request=request))
+    assert current_user(db)["first_name"] == "Stale"
+
+
+def test_user_info_update_refreshes_the_cached_profile(db):
+    make_user(db)
+    assert current_user(db)["last_name"] == "1"
+
+    update = UpdateUserInfo(username="user1", first_name="Ada", last_name="Lovelace", email="ada@example.com",
+                            phone_number="5550000001", password="secret")
+    asyncio.run(update_user_info({"id": 1, "username": "user1"}, db, update))
+    assert {k: v for k, v in current_user(db).items() if k != "id"} == {
+        "first_name": "Ada", "last_name": "Lovelace", "username": "user1"}
+
+
+def test_unverified_users_are_refused_until_they_verify(db):
+    user = make_user(db)
+    user.is_verified = False
+    db.commit()
+
+    with pytest.raises(HTTPException) as error:
+        current_user(db)
+    assert error.value.status_code == 403
+    assert user_cache.get(1) is None  # refusals are not cached
+
+    asyncio.run(auth.verify_email(generate_verification_token(user.email), db))
+    assert current_user(db)["id"] == 1
+
+
+def test_verify_email_drops_any_cached_principal(db):
+    user = make_user(db)
+    user.is_verified = False
+    db.commit()
+    user_cache.set(1, {"first_name": "Stale", "last_name": "1", "username": "user1", "id": 1})
+
+    asyncio.run(auth.verify_email(generate_verification_token(user.email), db))
+    assert user_cache.get(1) is None
+    assert current_user(db)["first_name"] == "Test"
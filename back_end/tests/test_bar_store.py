@@ -0,0 +1,90 @@
+import pytest
+from bar_store import BarStore, find_gaps, to_ms
+
+DAY_MS = 86_400_000
+KEY = ("AAPL", 1, "day", 1)
+
+
+class DailyBars:
+    """Upstream stand-in with one bar per day; records every requested (start, end) range."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, ticker, multiplier, timespan, start_ms, end_ms, adjusted, sort, limit):
+        self.calls.append((start_ms, end_ms))
+        first = -(-start_ms // DAY_MS) * DAY_MS
+        days = range(first, end_ms + 1, DAY_MS)
+        return [{"timestamp": ts, "open": 1.0, "high": 2.0, "low": 0.5, "close": ts / DAY_MS, "volume": 10.0}
+                for ts in (reversed(days) if sort == "desc" else days)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BarStore(DailyBars(), path=str(tmp_path / "bars.sqlite3"), settle_seconds=0)
+
+
+def coverage(store) -> list:
+    return [tuple(row) for row in store.conn.execute("SELECT start_ms, end_ms FROM coverage ORDER BY start_ms")]
+
+
+# ==================== Gaps ====================
+@pytest.mark.parametrize("intervals, expected", [
+    ([], [(0, 99)]),  # empty store
+    ([(0, 99)], []),
+    ([(-50, 200)], []),  # covers more than asked
+    ([(20, 49), (50, 79)], [(0, 19), (80, 99)]),  # adjacent intervals leave no gap between them
+    ([(10, 19), (40, 59)], [(0, 9), (20, 39), (60, 99)]),
+    ([(-20, 9), (90, 150)], [(10, 89)]),  # partial coverage past both ends
+    ([(-20, -1), (100, 150)], [(0, 99)]),  # only outside the range
+])
+def test_find_gaps(intervals, expected):
+    assert find_gaps(intervals, 0, 99) == expected
+
+
+# ==================== Coverage ====================
+def test_mark_covered_merges_touching_and_overlapping_ranges(store):
+    store._mark_covered(KEY, 100, 199)
+    store._mark_covered(KEY, 300, 399)
+    assert coverage(store) == [(100, 199), (300, 399)]
+
+    store._mark_covered(KEY, 200, 249)  # adjacent to the first
+    assert coverage(store) == [(100, 249), (300, 399)]
+
+    store._mark_covered(KEY, 240, 310)  # overlaps both
+    assert coverage(store) == [(100, 399)]
+
+    store._mark_covered(KEY, 150, 160)  # already inside
+    store._mark_covered(("MSFT", 1, "day", 1), 0, 999)  # another series
+    assert coverage(store) == [(0, 999), (100, 399)]
+    assert store._coverage(KEY, 0, 10_000) == [(100, 399)]
+
+
+def test_plan_splits_a_request_into_local_gap_and_live_segments(store):
+    store._mark_covered(KEY, 100, 199)
+    store._mark_covered(KEY, 300, 399)
+
+    assert store._plan(KEY, 150, 500, cutoff=450) == [
+        ("local", 150, 199), ("gap", 200, 299), ("local", 300, 399), ("gap", 400, 450), ("live", 451, 500)]
+    assert store._plan(KEY, 0, 99, cutoff=1000) == [("gap", 0, 99)]
+    assert store._plan(KEY, 500, 600, cutoff=450) == [("live", 500, 600)]
+
+
+# ==================== Gap filling ====================
+def test_requests_only_fetch_what_is_not_stored(store):
+    jan = store.get_bars("aapl", 1, "day", "2020-01-10", "2020-01-19")
+    assert [bar["timestamp"] for bar in jan] == list(range(to_ms("2020-01-10"), to_ms("2020-01-19") + 1, DAY_MS))
+    assert store.fetch.calls == [(to_ms("2020-01-10"), to_ms("2020-01-19", end=True))]
+
+    # Overlaps the stored range at both ends: only the two missing ends go upstream
+    wider = store.get_bars("AAPL", 1, "day", "2020-01-05", "2020-01-24")
+    assert store.fetch.calls[1:] == [(to_ms("2020-01-05"), to_ms("2020-01-10") - 1),
+                                     (to_ms("2020-01-19", end=True) + 1, to_ms("2020-01-24", end=True))]
+    assert [bar["timestamp"] for bar in wider] == list(range(to_ms("2020-01-05"), to_ms("2020-01-24") + 1, DAY_MS))
+    assert coverage(store) == [(to_ms("2020-01-05"), to_ms("2020-01-24", end=True))]
+
+    # Fully covered, in either order: no upstream call
+    newest_first = store.get_bars("AAPL", 1, "day", "2020-01-07", "2020-01-22", sort="desc")
+    assert len(store.fetch.calls) == 3
+    assert [bar["timestamp"] for bar in newest_first] == list(range(to_ms("2020-01-22"), to_ms("2020-01-07") - 1, -DAY_MS))
+    assert store.stats["local_only"] == 1
@@ -0,0 +1,59 @@
+from datetime import date, timedelta
+from sqlalchemy import event
+import database
+from models import Budget_Status, Plaid_Bank_Account, Spend_Rollup, User_Categories
+from budgets import evaluate_touched_buckets
+from rollups import bucket_start
+from user_categories import UserCategoryUpdate, update_user_category
+from conftest import make_user
+
+THIS_WEEK = bucket_start("week", date.today())
+LAST_WEEK = THIS_WEEK - timedelta(days=7)
+
+
+def budgeted(db):
+    make_user(db)
+    db.add_all([User_Categories(id=c, user_id=1, name=f"Category {c}", color="#000000", weekly_limit=100.0)
+                for c in (1, 2, 3)])
+    db.add(Plaid_Bank_Account(user_id=1, account_id="chk", name="chk", type="depository"))
+    db.flush()
+    for category_id, week, spend in ((1, THIS_WEEK, 50.0), (2, THIS_WEEK, 85.0), (2, LAST_WEEK, 150.0), (3, THIS_WEEK, 10.0)):
+        db.add(Spend_Rollup(user_id=1, category_id=category_id, account_id="chk", bucket="week",
+                            bucket_start=week, spend=spend, net=spend, txn_count=1))
+    db.commit()
+
+
+def statuses(db) -> dict:
+    return {(row.category_id, row.week_start): (row.spent, row.status) for row in db.query(Budget_Status)}
+
+
+def test_touched_buckets_are_evaluated_in_one_statement(db):
+    budgeted(db)
+    statements = []
+    listener = lambda conn, cursor, sql, *args: statements.append(sql)
+    event.listen(database.engine, "before_cursor_execute", listener)
+    try:
+        evaluate_touched_buckets(db, [
+            (1, 1, "week", THIS_WEEK), (1, 1, "day", THIS_WEEK),
+            (1, 2, "week", THIS_WEEK), (1, 2, "week", LAST_WEEK), (1, 2, "month", THIS_WEEK.replace(day=1)),
+        ])
+    finally:
+        event.remove(database.engine, "before_cursor_execute", listener)
+
+    assert len([sql for sql in statements if "Budget_Status" in sql]) == 1
+    assert statuses(db) == {
+        (1, THIS_WEEK): (50.0, "ok"),
+        (2, THIS_WEEK): (85.0, "warning"),
+        (2, LAST_WEEK): (150.0, "over"),
+    }
+
+
+def test_changing_a_weekly_limit_reevaluates_this_week(db):
+    budgeted(db)
+    evaluate_touched_buckets(db, [(1, c, "week", THIS_WEEK) for c in (1, 2, 3)])
+
+    update_user_category(1, UserCategoryUpdate(name="Category 1", color="#000000", weekly_limit=40.0), db)
+    update_user_category(3, UserCategoryUpdate(name="Category 3", color="#000000", weekly_limit=None), db)
+
+    assert statuses(db) == {(1, THIS_WEEK): (50.0, "over"), (2, THIS_WEEK): (85.0, "warning")}
+    assert db.query(Budget_Status).filter_by(category_id=1).one().weekly_limit == 40.0
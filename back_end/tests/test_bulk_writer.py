@@ -0,0 +1,127 @@
+from datetime import date
+import pytest
+from sqlalchemy import select
+import bulk_writer
+from bulk_writer import upsert_rows, bulk_upsert_transactions, delete_transactions, bulk_upsert_holdings
+from models import (Plaid_Bank_Account, Plaid_Investment, Plaid_Investment_Holding, Plaid_Transactions,
+                    Spend_Rollup, Transaction_Category_Link, User_Categories)
+from rollups import rebuild_user_rollups
+from conftest import make_user, spend_rollups
+
+DAY = date(2024, 6, 3)
+
+
+@pytest.fixture(params=["native", "fallback"])
+def dialect(request, monkeypatch):
+    """Run against SQLite's ON CONFLICT and against the portable SELECT/INSERT/UPDATE fallback."""
+    if request.param == "fallback":
+        monkeypatch.setattr(bulk_writer, "_dialect_insert", lambda db: ("other", None))
+    return request.param
+
+
+@pytest.fixture
+def accounts(db):
+    make_user(db)
+    db.add_all([Plaid_Bank_Account(user_id=1, account_id=acc, name=acc, type="depository") for acc in ("chk", "cc")])
+    db.commit()
+
+
+def tx(tx_id: str, amount: float, category: str | None = "FOOD", account_id: str = "chk", day: date = DAY) -> dict:
+    return {"transaction_id": tx_id, "account_id": account_id, "amount": amount, "currency": "USD",
+            "category": category, "merchant_name": "Shop", "date": day}
+
+
+def stored(db) -> dict:
+    """transaction_id -> (amount, category name) of every stored transaction."""
+    query = (
+        select(Plaid_Transactions.transaction_id, Plaid_Transactions.amount, User_Categories.name)
+        .outerjoin(Transaction_Category_Link, Transaction_Category_Link.transaction_id == Plaid_Transactions.transaction_id)
+        .outerjoin(User_Categories, User_Categories.id == Transaction_Category_Link.category_id)
+    )
+    return {row.transaction_id: (row.amount, row.name) for row in db.execute(query)}
+
+
+# ==================== upsert_rows ====================
+def test_upsert_rows_updates_and_increments_existing_keys(db, accounts, dialect):
+    db.add(User_Categories(id=1, user_id=1, name="Food", color="#000000"))
+    db.flush()
+    key = {"user_id": 1, "category_id": 1, "account_id": "chk", "bucket": "day", "bucket_start": DAY}
+    columns = ["user_id", "category_id", "account_id", "bucket", "bucket_start"]
+
+    upsert_rows(db, Spend_Rollup, [dict(key, spend=5.0, net=5.0, txn_count=1)], columns, [], ["spend", "net", "txn_count"])
+    upsert_rows(db, Spend_Rollup, [dict(key, spend=2.5, net=-1.0, txn_count=2)], columns, [], ["spend", "net", "txn_count"])
+    row = db.query(Spend_Rollup).one()
+    assert (row.spend, row.net, row.txn_count) == (7.5, 4.0, 3)
+
+    upsert_rows(db, Plaid_Bank_Account, [{"user_id": 1, "account_id": "chk", "name": "Renamed", "type": "credit"}],
+                ["account_id"], ["name"])
+    upsert_rows(db, Plaid_Bank_Account, [{"user_id": 1, "account_id": "cc", "name": "Ignored", "type": "credit"}],
+                ["account_id"], [])
+    db.expire_all()
+    assert {(a.account_id, a.name, a.type) for a in db.query(Plaid_Bank_Account)} == {
+        ("chk", "Renamed", "depository"), ("cc", "cc", "depository")}
+
+
+def test_upsert_rows_batches_large_inputs(db, accounts, dialect, monkeypatch):
+    monkeypatch.setattr(bulk_writer, "BATCH_SIZE", 7)
+    rows = [tx(f"tx{i}", float(i)) for i in range(30)]
+    upsert_rows(db, Plaid_Transactions, rows, ["transaction_id"], ["amount"])
+    assert db.query(Plaid_Transactions).count() == 30
+
+
+# ==================== Transactions ====================
+def test_bulk_upsert_transactions_counts_and_links(db, accounts, dialect):
+    result = bulk_upsert_transactions(db, [tx("a", 10.0), tx("b", 20.0, "TRAVEL"), tx("c", 5.0, None),
+                                           tx("x", 1.0, account_id="unknown")])
+    assert result == {"inserted": 3, "updated": 0, "skipped": 1}
+    assert stored(db) == {"a": (10.0, "FOOD"), "b": (20.0, "TRAVEL"), "c": (5.0, None)}
+
+    result = bulk_upsert_transactions(db, [tx("a", 10.0), tx("b", 25.0, "FOOD"), tx("c", 5.0, "TRAVEL"), tx("d", 1.0)])
+    assert result == {"inserted": 1, "updated": 2, "skipped": 1}
+    assert stored(db) == {"a": (10.0, "FOOD"), "b": (25.0, "FOOD"), "c": (5.0, "TRAVEL"), "d": (1.0, "FOOD")}
+    assert db.query(User_Categories).filter_by(user_id=1).count() == 2  # created once, then reused
+
+
+def test_delete_transactions_removes_rows_and_links(db, accounts, dialect):
+    bulk_upsert_transactions(db, [tx("a", 10.0), tx("b", 20.0), tx("c", -3.0, account_id="cc")])
+
+    assert delete_transactions(db, ["a", "c", "missing"]) == 2
+    assert stored(db) == {"b": (20.0, "FOOD")}
+    assert db.query(Transaction_Category_Link).count() == 1
+
+
+def test_writes_and_deletes_move_rollup_buckets(db, accounts, dialect):
+    bulk_upsert_transactions(db, [tx("a", 10.0), tx("b", 20.0), tx("c", -3.0, account_id="cc")])
+    bulk_upsert_transactions(db, [tx("b", 20.0, "TRAVEL")])
+    delete_transactions(db, ["a", "c"])
+
+    rollups = spend_rollups(db)
+    assert {key[2] for key in rollups} == {"day", "week", "month"}
+    assert all(value == (20.0, 20.0, 1) for value in rollups.values())
+    rebuild_user_rollups(db, 1)
+    assert spend_rollups(db) == rollups
+
+
+# ==================== Holdings ====================
+def holding(security_id: str, quantity: float, account_id: str = "inv") -> dict:
+    return {"holding_id": f"{account_id}_{security_id}", "account_id": account_id, "security_id": security_id,
+            "symbol": security_id.upper(), "name": security_id, "quantity": quantity, "price": 10.0,
+            "value": 10.0 * quantity, "currency": "USD"}
+
+
+def test_bulk_upsert_holdings_replaces_the_snapshot(db, dialect):
+    make_user(db)
+    db.add_all([Plaid_Investment(user_id=1, account_id=acc, name=acc, type="investment") for acc in ("inv", "ira")])
+    db.commit()
+    bulk_upsert_holdings(db, ["ira"], [holding("vti", 1.0, "ira")])
+
+    result = bulk_upsert_holdings(db, ["inv"], [holding("aapl", 1.0), holding("msft", 2.0), holding("x", 1.0, "ira")])
+    assert result == {"inserted": 2, "updated": 0, "skipped": 0, "deleted": 0}
+
+    result = bulk_upsert_holdings(db, ["inv"], [holding("aapl", 1.0), holding("msft", 3.0), holding("vti", 4.0)])
+    assert result == {"inserted": 1, "updated": 1, "skipped": 1, "deleted": 0}
+
+    result = bulk_upsert_holdings(db, ["inv"], [holding("msft", 3.0)])
+    assert result == {"inserted": 0, "updated": 0, "skipped": 1, "deleted": 2}
+    assert {(h.holding_id, h.quantity) for h in db.query(Plaid_Investment_Holding)} == {
+        ("inv_msft", 3.0), ("ira_vti", 1.0)}
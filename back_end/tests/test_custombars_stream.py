@@ -0,0 +1,45 @@
+import asyncio
+import stock_routes
+from stock_routes import StockCustomBars, stream_custombars
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+
+class FakeBarStore:
+    """Yields ten chunks of 3 bars; records whether the stream was cancelled."""
+
+    def __init__(self):
+        self.cancelled = None
+        self.chunks_read = 0
+
+    def iter_bars(self, ticker, multiplier, timespan, start, end, adjusted, sort, cancelled):
+        self.cancelled = cancelled
+        for first in range(0, 30, 3):
+            self.chunks_read += 1
+            yield [{"t": first + i} for i in range(3)]
+
+
+def request(limit: int) -> StockCustomBars:
+    return StockCustomBars(tick="AAPL", multiplier=1, timeframe="day", From="2020-01-01",
+                           To="2020-12-31", adjusted=True, sort="asc", limit=limit)
+
+
+def test_stream_stops_after_limit_bars(monkeypatch):
+    store = FakeBarStore()
+    monkeypatch.setattr(stock_routes, "bar_store", store)
+    websocket = RecordingWebSocket()
+
+    asyncio.run(stream_custombars(websocket, request(7)))
+
+    frames = [message["bars"] for message in websocket.sent if message["type"] == "bars"]
+    assert [len(bars) for bars in frames] == [3, 3, 1]
+    assert [bar["t"] for bars in frames for bar in bars] == list(range(7))
+    assert websocket.sent[-1] == {"type": "complete", "ticker": "AAPL", "count": 7, "frames": 3}
+    assert store.chunks_read == 3
+    assert store.cancelled.is_set()
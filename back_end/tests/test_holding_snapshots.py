@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+from models import Holding_Snapshot, Plaid_Investment, Plaid_Investment_Holding
+from holding_snapshots import write_holding_snapshot, downsample_user_snapshots, get_value_series
+from conftest import make_user
+
+TODAY = date(2024, 6, 30)  # a Sunday
+
+
+def add_snapshot(db, account_id: str, day: date, value: float, security_id: str = "sec-1"):
+    db.add(Holding_Snapshot(user_id=1, account_id=account_id, security_id=security_id, day=day,
+                            symbol="T", quantity=1.0, price=value, value=value))
+
+
+def test_snapshot_covers_every_investment_account(db):
+    make_user(db)
+    for account_id, value in (("brokerage", 100.0), ("ira", 50.0)):
+        db.add(Plaid_Investment(user_id=1, account_id=account_id, name=account_id, type="investment"))
+        db.add(Plaid_Investment_Holding(holding_id=f"{account_id}_sec-1", account_id=account_id, security_id="sec-1",
+                                        symbol="T", quantity=1.0, price=value, value=value))
+    db.commit()
+
+    assert write_holding_snapshot(db, 1, day=TODAY) == 2
+    db.query(Plaid_Investment_Holding).filter_by(account_id="ira").delete()
+    assert write_holding_snapshot(db, 1, day=TODAY) == 1  # sold since the morning sync
+    db.commit()
+
+    assert [(row.account_id, row.value) for row in db.query(Holding_Snapshot)] == [("brokerage", 100.0)]
+
+
+def test_downsampling_keeps_each_accounts_last_day(db):
+    make_user(db)
+    week = TODAY - timedelta(days=200)
+    monday = week - timedelta(days=week.weekday())
+    tuesday, sunday = monday + timedelta(days=1), monday + timedelta(days=6)
+    # Two items synced on different days of the same old week
+    add_snapshot(db, "brokerage", monday, 100.0)
+    add_snapshot(db, "brokerage", tuesday, 110.0)
+    add_snapshot(db, "ira", sunday, 50.0)
+    add_snapshot(db, "brokerage", TODAY - timedelta(days=1), 120.0)
+    add_snapshot(db, "ira", TODAY - timedelta(days=1), 60.0)
+    db.commit()
+
+    assert downsample_user_snapshots(db, 1, today=TODAY) == 1
+    db.commit()
+    kept = {(row.account_id, row.day) for row in db.query(Holding_Snapshot)}
+    assert kept == {("brokerage", tuesday), ("ira", sunday),
+                    ("brokerage", TODAY - timedelta(days=1)), ("ira", TODAY - timedelta(days=1))}
+
+    # One point for the old week with both accounts' latest values, then daily points
+    series = get_value_series(db, 1, TODAY - timedelta(days=365), TODAY, today=TODAY)
+    assert series == {"day": [sunday.isoformat(), (TODAY - timedelta(days=1)).isoformat()], "value": [160.0, 180.0]}
+
+    series = get_value_series(db, 1, TODAY - timedelta(days=365), TODAY, account_id="brokerage", today=TODAY)
+    assert series["value"] == [110.0, 120.0]
+
+
+def test_value_series_sums_positions_per_day(db):
+    make_user(db)
+    day = TODAY - timedelta(days=3)
+    add_snapshot(db, "brokerage", day, 100.0, security_id="sec-1")
+    add_snapshot(db, "brokerage", day, 25.0, security_id="sec-2")
+    add_snapshot(db, "brokerage", TODAY, 130.0)
+    db.commit()
+
+    series = get_value_series(db, 1, day, TODAY, today=TODAY)
+    assert series == {"day": [day.isoformat(), TODAY.isoformat()], "value": [125.0, 130.0]}
@@ -0,0 +1,52 @@
+import math
+import numpy as np
+import pytest
+import indicators
+from indicators import bars_to_arrays, to_json_list
+
+DAY_MS = 86_400_000
+
+
+def test_bars_to_arrays_builds_float_columns_with_nan_for_missing_values():
+    bars = [{"timestamp": DAY_MS - 60_000, "open": 1, "high": 2.0, "low": 0.5, "close": 1.5, "volume": None, "vwap": 1.2},
+            {"timestamp": DAY_MS, "open": 1.5, "high": 3.0, "low": 1.0, "close": 2.5, "volume": 700, "vwap": None}]
+
+    arrays = bars_to_arrays(bars, intraday=True)
+
+    assert set(arrays) == {"timestamp", "open", "high", "low", "close", "volume", "session"}
+    for column in ("timestamp", "open", "high", "low", "close", "volume"):
+        assert arrays[column].dtype == np.float64 and arrays[column].flags.c_contiguous
+    assert arrays["close"].tolist() == [1.5, 2.5]
+    assert math.isnan(arrays["volume"][0]) and arrays["volume"][1] == 700.0
+    assert arrays["session"].tolist() == [0, 1]
+    assert bars_to_arrays([])["close"].shape == (0,)
+
+
+def test_to_json_list_replaces_only_nan():
+    values = indicators.sma(np.array([1.0, 2.0, 3.0, np.nan, 5.0]), 2)
+
+    assert to_json_list(values) == [None, 1.5, 2.5, None, None]
+    assert to_json_list(np.array([0.0, -1.25])) == [0.0, -1.25]
+    assert to_json_list(np.array([])) == []
+
+
+def test_parse_spec_fills_defaults_and_accepts_fractional_non_window_params():
+    assert indicators.parse_spec("MACD:5") == ("macd", (5.0, 26.0, 9.0))
+    assert indicators.parse_spec("bollinger:10:1.5") == ("bollinger", (10.0, 1.5))
+
+
+@pytest.mark.parametrize("spec, message", [
+    ("sma:0.5", "window lengths must be integers >= 1"),
+    ("macd:12:26.5", "window lengths must be integers >= 1"),
+    ("rsi:0", "window lengths must be integers >= 1"),
+    ("ema:-3", "window lengths must be integers >= 1"),
+    ("bollinger:20:0", "parameters must be positive"),
+    ("bollinger:20:inf", "parameters must be positive"),
+    ("sma:ten", "parameters must be numbers"),
+    ("sma:nan", "window lengths must be integers >= 1"),
+    ("sma:20:2", "at most 1 parameters"),
+    ("kama", "Unknown indicator"),
+])
+def test_parse_spec_rejects_bad_params(spec, message):
+    with pytest.raises(ValueError, match=message):
+        indicators.parse_spec(spec)
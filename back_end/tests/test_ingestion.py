@@ -0,0 +1,150 @@
+import threading
+import time
+import pytest
+import database
+import fake_plaid
+from models import Plaid_Sync_State, Plaid_Transactions
+from ingestion import prefetched, run_bank_ingestion
+from rollups import rebuild_user_rollups
+from conftest import make_user, mutate_item, spend_rollups
+
+
+def wait_for(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def producer_threads(before: set) -> list:
+    return [thread for thread in threading.enumerate() if thread not in before]
+
+
+# ==================== Prefetch ====================
+def test_prefetched_yields_pages_then_reraises_producer_errors():
+    def pages():
+        yield [1]
+        yield [2]
+        raise ValueError("page 3 failed")
+
+    consumed = []
+    with pytest.raises(ValueError, match="page 3 failed"):
+        for page in prefetched(pages()):
+            consumed.append(page)
+    assert consumed == [[1], [2]]
+
+
+@pytest.mark.parametrize("last", ["done", "error"])
+def test_producer_exits_when_consumer_stops_with_a_full_buffer(last):
+    def pages():
+        yield [1]
+        yield [2]  # fills the buffer while the consumer holds page 1
+        if last == "error":
+            raise ValueError("never delivered")
+
+    before = set(threading.enumerate())
+    consumer = prefetched(pages(), depth=1)
+    assert next(consumer) == [1]
+    time.sleep(0.2)  # the producer is now blocked putting its final item
+    consumer.close()
+    wait_for(lambda: not producer_threads(before))
+
+
+# ==================== Sync ====================
+def stored_transactions(db) -> dict:
+    return {t.transaction_id: (t.account_id, t.amount) for t in db.query(Plaid_Transactions)}
+
+
+def fake_transactions(access_token: str) -> dict:
+    return {t["transaction_id"]: (t["account_id"], t["amount"])
+            for t in fake_plaid.items[access_token].transactions.values()}
+
+
+def sync(db, access_token: str) -> dict:
+    db.expire_all()
+    return run_bank_ingestion(db, 1, access_token, mode="sync")
+
+
+def test_sync_applies_changes_since_the_stored_cursor(db, fake_plaid_url, access_token):
+    make_user(db, access_token=access_token)
+    item = fake_plaid.items[access_token]
+
+    result = sync(db, access_token)
+    assert result["accounts"] == len(item.accounts)
+    assert result["inserted"] == len(item.transactions)
+    assert stored_transactions(db) == fake_transactions(access_token)
+    state = db.query(Plaid_Sync_State).filter_by(user_id=1, product="transactions").one()
+    assert state.cursor == str(len(item.log)) and state.last_synced_at is not None
+
+    mutate_item(fake_plaid_url, access_token, added=5)
+    result = sync(db, access_token)
+    assert (result["inserted"], result["updated"], result["removed"]) == (5, 0, 0)
+
+    seen = len(item.log)
+    mutate_item(fake_plaid_url, access_token, modified=4)
+    result = sync(db, access_token)
+    modified = {tx["transaction_id"] for _, tx in item.log[seen:]}  # the fake may modify one twice
+    assert (result["inserted"], result["updated"], result["removed"]) == (0, len(modified), 0)
+    assert stored_transactions(db) == fake_transactions(access_token)
+
+    mutate_item(fake_plaid_url, access_token, removed=3)
+    result = sync(db, access_token)
+    assert (result["inserted"], result["updated"], result["removed"]) == (0, 0, 3)
+    assert stored_transactions(db) == fake_transactions(access_token)
+    db.refresh(state)
+    assert state.cursor == str(len(item.log))
+
+    result = sync(db, access_token)  # nothing new since the cursor
+    assert (result["inserted"], result["updated"], result["removed"]) == (0, 0, 0)
+
+
+def test_window_mode_rereads_without_moving_the_cursor(db, fake_plaid_url, access_token):
+    make_user(db, access_token=access_token)
+    sync(db, access_token)
+    cursor = db.query(Plaid_Sync_State).filter_by(user_id=1, product="transactions").one().cursor
+
+    mutate_item(fake_plaid_url, access_token, added=2)
+    result = run_bank_ingestion(db, 1, access_token, mode="window")
+    assert result["inserted"] == 2 and result["updated"] == 0
+    assert stored_transactions(db) == fake_transactions(access_token)
+    db.expire_all()
+    assert db.query(Plaid_Sync_State).filter_by(user_id=1, product="transactions").one().cursor == cursor
+
+
+def test_rollup_deltas_match_a_full_rebuild(db, fake_plaid_url, access_token):
+    make_user(db, access_token=access_token)
+    sync(db, access_token)
+    for changes in ({"added": 20, "modified": 15}, {"removed": 10, "modified": 5}, {"added": 3, "removed": 3}):
+        mutate_item(fake_plaid_url, access_token, **changes)
+        sync(db, access_token)
+        incremental = spend_rollups(db)
+
+        rebuild_user_rollups(db, 1)
+        assert spend_rollups(db) == incremental
+
+
+def test_concurrent_ingestions_of_one_user_run_one_at_a_time(db, fake_plaid_url, access_token):
+    make_user(db, access_token=access_token)
+    results, errors = [], []
+
+    def ingest(mode):
+        session = database.SessionLocal()
+        try:
+            results.append(run_bank_ingestion(session, 1, access_token, mode=mode))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=ingest, args=(mode,)) for mode in ("sync", "sync", "window")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sum(result["inserted"] for result in results) == len(fake_plaid.items[access_token].transactions)
+    assert stored_transactions(db) == fake_transactions(access_token)
+    incremental = spend_rollups(db)
+    rebuild_user_rollups(db, 1)
+    assert spend_rollups(db) == incremental
@@ -0,0 +1,47 @@
+import threading
+from sqlalchemy import create_engine, inspect, select, text
+import models
+from models import Schema_Version
+from migrations import MIGRATIONS, run_migrations
+
+
+def test_concurrent_workers_apply_each_migration_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'schema.db'}", connect_args={"timeout": 30})
+    models.Base.metadata.create_all(engine)
+    results, errors = [], []
+
+    def worker():
+        try:
+            results.append(run_migrations(engine))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    versions = sorted(version for version, _, _ in MIGRATIONS)
+    assert sorted(v for applied in results for v in applied) == versions
+    with engine.connect() as conn:
+        assert sorted(conn.execute(select(Schema_Version.version)).scalars()) == versions
+
+
+def test_migrations_repair_an_old_schema(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    models.Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text('DROP INDEX ix_plaid_transactions_account_date'))
+        conn.execute(text('ALTER TABLE "Plaid_Sync_State" DROP COLUMN next_attempt_at'))
+        conn.execute(text('DROP INDEX ix_holding_snapshot_user_day_account'))
+        conn.execute(text('CREATE INDEX ix_holding_snapshot_user_day ON "Holding_Snapshot" (user_id, day, value)'))
+
+    assert run_migrations(engine, target=1) == [1]
+    assert "ix_plaid_transactions_account_date" in {i["name"] for i in inspect(engine).get_indexes("Plaid_Transactions")}
+    assert run_migrations(engine, target=2) == [2]
+    assert "next_attempt_at" in {c["name"] for c in inspect(engine).get_columns("Plaid_Sync_State")}
+    assert run_migrations(engine) == [3]
+    assert {i["name"] for i in inspect(engine).get_indexes("Holding_Snapshot")} == {"ix_holding_snapshot_user_day_account"}
+    assert run_migrations(engine) == []
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import time
+from passlib.context import CryptContext
+import password_hashing
+from auth import authenticate_user
+from models import Users
+from password_hashing import hash_password, verify_password
+from conftest import make_user
+
+
+def rounds(hashed: str) -> int:
+    return int(hashed.split("$")[2])
+
+
+def test_login_rehashes_passwords_made_with_other_rounds(db):
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=password_hashing.BCRYPT_ROUNDS + 1).hash("secret")
+    make_user(db)
+    db.get(Users, 1).hashed_password = old_hash
+    db.commit()
+
+    assert asyncio.run(authenticate_user("user1", "wrong", db)) is False
+    assert db.get(Users, 1).hashed_password == old_hash  # only a successful login rehashes
+
+    assert asyncio.run(authenticate_user("user1", "secret", db)).id == 1
+    db.expire_all()
+    new_hash = db.get(Users, 1).hashed_password
+    assert new_hash != old_hash and rounds(new_hash) == password_hashing.BCRYPT_ROUNDS
+    assert asyncio.run(verify_password("secret", new_hash)) == (True, None)
+
+    asyncio.run(authenticate_user("user1", "secret", db))
+    db.expire_all()
+    assert db.get(Users, 1).hashed_password == new_hash  # current hashes are left alone
+
+
+class SlowBcrypt:
+    """Stands in for the CryptContext: records the calling thread and takes a while, like real bcrypt."""
+
+    def __init__(self):
+        self.threads = []
+
+    def hash(self, password):
+        return self._slow(f"hash:{password}")
+
+    def verify_and_update(self, password, hashed_password):
+        return self._slow((hashed_password == f"hash:{password}", None))
+
+    def _slow(self, result):
+        self.threads.append(threading.current_thread().name)
+        time.sleep(0.2)
+        return result
+
+
+def test_hashing_runs_off_the_event_loop(monkeypatch):
+    slow = SlowBcrypt()
+    monkeypatch.setattr(password_hashing, "bcrypt", slow)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        hashed, verified = await asyncio.gather(hash_password("secret"), verify_password("secret", "hash:secret"))
+        task.cancel()
+        return hashed, verified, ticks, threading.current_thread().name
+
+    hashed, verified, ticks, loop_thread = asyncio.run(scenario())
+    assert (hashed, verified) == ("hash:secret", (True, None))
+    assert ticks >= 10  # the loop kept running while both 200 ms calls were in flight
+    assert len(slow.threads) == 2 and all(name.startswith("bcrypt") for name in slow.threads)
+    assert loop_thread not in slow.threads
@@ -0,0 +1,17 @@
+import pytest
+from conftest import make_user
+
+
+def test_refresh_rejects_unknown_modes(db, plaid_api):
+    make_user(db)
+    response = plaid_api.post("/refresh_bank_data", params={"mode": "full"})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["query", "mode"]
+
+
+@pytest.mark.parametrize("mode", ["sync", "window"])
+def test_refresh_runs_each_mode(db, plaid_api, access_token, mode):
+    make_user(db, access_token=access_token)
+    response = plaid_api.post("/refresh_bank_data", params={"mode": mode})
+    assert response.status_code == 200
+    assert response.json()["result"]["mode"] == mode
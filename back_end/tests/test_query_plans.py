@@ -0,0 +1,14 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from bench_query_plans import check
+
+
+@pytest.fixture(scope="module")
+def plans():
+    return check(create_engine("sqlite://", poolclass=StaticPool), n_users=100)
+
+
+def test_every_hot_query_uses_an_index(plans):
+    scans = {name: scans for name, _, scans in plans if scans}
+    assert scans == {}
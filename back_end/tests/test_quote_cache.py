@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import pytest
+from quote_cache import QuoteCache
+
+
+class GatedUpstream:
+    """A blocking quote source that answers only once the test opens the gate."""
+
+    def __init__(self, error: Exception | None = None):
+        self.calls = []
+        self.gate = threading.Event()
+        self.error = error
+
+    def fetch(self, ticker: str) -> dict:
+        self.calls.append(ticker)
+        self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return {"ticker": ticker, "price": 100.0 + len(self.calls)}
+
+    def fetch_many(self, tickers: list) -> list:
+        self.calls.append(tuple(tickers))
+        self.gate.wait(5)
+        return [{"ticker": ticker, "price": 1.0} for ticker in tickers]
+
+
+async def until_in_flight(upstream: GatedUpstream, calls: int = 1):
+    while len(upstream.calls) < calls:
+        await asyncio.sleep(0.001)
+
+
+def test_concurrent_misses_share_one_upstream_call():
+    upstream = GatedUpstream()
+    cache = QuoteCache(upstream.fetch, ttl=60)
+
+    async def scenario():
+        waiters = [asyncio.create_task(cache.get(ticker)) for ticker in ["aapl", "AAPL"] * 10]
+        await until_in_flight(upstream)
+        await asyncio.sleep(0.01)  # every waiter has joined the call by now
+        upstream.gate.set()
+        return await asyncio.gather(*waiters)
+
+    quotes = asyncio.run(scenario())
+    assert upstream.calls == ["AAPL"]
+    assert quotes == [{"ticker": "AAPL", "price": 101.0}] * 20
+    assert (cache.stats["misses"], cache.stats["coalesced"], cache.stats["upstream_calls"]) == (1, 19, 1)
+    assert cache.in_flight == {}
+
+
+def test_every_coalesced_caller_gets_the_upstream_error_and_the_next_call_retries():
+    upstream = GatedUpstream(error=TimeoutError("upstream timed out"))
+    cache = QuoteCache(upstream.fetch, ttl=60)
+
+    async def scenario():
+        waiters = [asyncio.create_task(cache.get("MSFT")) for _ in range(5)]
+        await until_in_flight(upstream)
+        waiters[0].cancel()  # a client that disconnects doesn't cancel the call for the others
+        upstream.gate.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+
+        upstream.error = None
+        return results, await cache.get("MSFT")
+
+    results, retried = asyncio.run(scenario())
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert all(isinstance(result, TimeoutError) and str(result) == "upstream timed out" for result in results[1:])
+    assert retried == {"ticker": "MSFT", "price": 102.0}
+    assert upstream.calls == ["MSFT", "MSFT"]
+    assert cache.stats["upstream_errors"] == 1
+
+
+def test_get_many_joins_calls_in_flight_and_batches_the_rest():
+    upstream = GatedUpstream()
+    cache = QuoteCache(upstream.fetch, ttl=60, fetch_many=upstream.fetch_many)
+
+    async def scenario():
+        single = asyncio.create_task(cache.get_many(["AAPL"]))
+        await until_in_flight(upstream)
+        batch = asyncio.create_task(cache.get_many(["aapl", "msft", "tsla"]))
+        await until_in_flight(upstream, calls=2)
+        upstream.gate.set()
+        return await single, await batch
+
+    single, batch = asyncio.run(scenario())
+    assert upstream.calls == [("AAPL",), ("MSFT", "TSLA")]
+    assert single == {"AAPL": {"ticker": "AAPL", "price": 1.0}}
+    assert set(batch) == {"AAPL", "MSFT", "TSLA"}
@@ -0,0 +1,51 @@
+import asyncio
+from quote_stream import Subscriber
+
+
+class SlowWebSocket:
+    """Records sent messages; sending blocks until the test opens the gate."""
+
+    def __init__(self):
+        self.sent = []
+        self.gate = asyncio.Event()
+
+    async def send_json(self, message):
+        await self.gate.wait()
+        self.sent.append(message)
+
+
+def quote(ticker: str, price: float) -> dict:
+    return {"type": "quote", "ticker": ticker, "quote": {"price": price}}
+
+
+def test_slow_client_gets_latest_quote_per_ticker_and_every_reply():
+    async def scenario():
+        websocket = SlowWebSocket()
+        subscriber = Subscriber(websocket)
+        subscriber.offer(quote("AAPL", 1.0))
+        await asyncio.sleep(0)  # the sender takes AAPL 1.0 and blocks on the socket
+
+        for price in range(2, 100):
+            subscriber.offer(quote("AAPL", float(price)))
+            subscriber.offer(quote("MSFT", float(price)))
+        subscriber.offer({"type": "subscribed", "tickers": ["MSFT"]})
+        subscriber.offer({"type": "error", "ticker": "AAPL", "detail": "upstream down"})
+        subscriber.offer(quote("TSLA", 5.0))
+        subscriber.discard("TSLA")  # unsubscribed before it was sent
+
+        websocket.gate.set()
+        while subscriber.control or subscriber.quotes:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+        subscriber.close()
+        return websocket.sent, subscriber.dropped
+
+    sent, dropped = asyncio.run(scenario())
+    assert sent == [
+        quote("AAPL", 1.0),
+        {"type": "subscribed", "tickers": ["MSFT"]},
+        {"type": "error", "ticker": "AAPL", "detail": "upstream down"},
+        quote("AAPL", 99.0),
+        quote("MSFT", 99.0),
+    ]
+    assert dropped == 2 * 97
@@ -0,0 +1,84 @@
+import threading
+import pytest
+import response_cache
+from response_cache import ResponseCache, LocalBackend
+from models import Plaid_Transactions, Transaction_Category_Link, User_Categories
+from ingestion import run_bank_ingestion
+from user_transactions import recategorize_transaction
+from conftest import make_user, mutate_item
+
+
+def test_local_backend_keeps_entries_briefly_by_default():
+    assert LocalBackend().ttl == response_cache.RESPONSE_CACHE_LOCAL_TTL_SECONDS
+    assert response_cache.RESPONSE_CACHE_LOCAL_TTL_SECONDS < response_cache.RESPONSE_CACHE_TTL_SECONDS
+
+
+def test_counters_are_exact_under_concurrent_lookups():
+    cache = ResponseCache(LocalBackend())
+    threads = [
+        threading.Thread(target=lambda: [cache.get_or_compute(1, "chart", {"n": i % 10}, lambda: {"ok": True})
+                                         for i in range(2000)])
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = cache.stats()
+    assert stats["hits"] + stats["misses"] == 8 * 2000
+    assert stats["misses"] >= 10
+
+
+# ==================== Invalidation ====================
+class Dashboard:
+    """A cached endpoint per user that records when it is recomputed."""
+
+    def __init__(self):
+        self.computed = []
+
+    def get(self, user_id: int):
+        def compute():
+            self.computed.append(user_id)
+            return {"user_id": user_id, "version": len(self.computed)}
+        return response_cache.response_cache.get_or_compute(user_id, "dashboard", {"range": "30d"}, compute)
+
+    def recomputed(self, *user_ids) -> list:
+        """Read each user's dashboard and return the users whose response had to be recomputed."""
+        before = len(self.computed)
+        for user_id in user_ids:
+            self.get(user_id)
+        return self.computed[before:]
+
+
+@pytest.fixture
+def dashboard(db, access_token):
+    make_user(db, access_token=access_token)
+    make_user(db, user_id=2)
+    run_bank_ingestion(db, 1, access_token)
+    view = Dashboard()
+    view.recomputed(1, 2)
+    assert view.recomputed(1, 2) == []  # both cached
+    return view
+
+
+def test_ingestion_invalidates_only_the_synced_user(db, fake_plaid_url, access_token, dashboard):
+    mutate_item(fake_plaid_url, access_token, added=1)
+    run_bank_ingestion(db, 1, access_token)
+    assert dashboard.recomputed(1, 2) == [1]
+
+
+def test_recategorizing_invalidates_the_user(db, dashboard):
+    tx = db.query(Plaid_Transactions.transaction_id, Transaction_Category_Link.category_id).join(
+        Transaction_Category_Link, Transaction_Category_Link.transaction_id == Plaid_Transactions.transaction_id).first()
+    other = db.query(User_Categories.id).filter(User_Categories.user_id == 1, User_Categories.id != tx.category_id).first()
+
+    recategorize_transaction(db, 1, tx.transaction_id, tx.category_id)  # unchanged: nothing to invalidate
+    assert dashboard.recomputed(1, 2) == []
+    recategorize_transaction(db, 1, tx.transaction_id, other.id)
+    assert dashboard.recomputed(1, 2) == [1]
+
+
+def test_unlinking_invalidates_the_user(db, plaid_api, dashboard):
+    assert plaid_api.delete("/unlink").status_code == 200
+    assert dashboard.recomputed(1, 2) == [1]
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+import pytest
+from plaid import ApiException
+import models
+import plaid_routes
+import sync_scheduler
+from sync_scheduler import RefreshLock, SyncScheduler, is_rate_limited
+from conftest import make_user, set_rate_limit
+
+BACKOFF_BASE = 0.05
+
+
+def wait_for(predicate, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def attempts(monkeypatch):
+    """Start times of every investments job attempt."""
+    times = []
+    handler = sync_scheduler.JOB_HANDLERS["investments"]
+
+    def recording_handler(db, user_id):
+        times.append(time.monotonic())
+        handler(db, user_id)
+
+    monkeypatch.setitem(sync_scheduler.JOB_HANDLERS, "investments", recording_handler)
+    monkeypatch.setattr(sync_scheduler, "BACKOFF_BASE_SECONDS", BACKOFF_BASE)
+    return times
+
+
+@pytest.fixture
+def scheduler():
+    workers = SyncScheduler(workers=2, refresh_interval=0)
+    workers.start()
+    yield workers
+    workers.stop(timeout=5)
+
+
+def test_rate_limited_investments_job_backs_off_then_completes(db, access_token, fake_plaid_url, attempts, scheduler):
+    make_user(db, 1, access_token)
+    set_rate_limit(fake_plaid_url, 1)
+
+    scheduler.enqueue("investments", 1)
+    wait_for(lambda: len(attempts) >= 3)
+    set_rate_limit(fake_plaid_url, 0)
+    wait_for(lambda: scheduler.status()["completed"] == 1)
+
+    stats = scheduler.status()
+    assert stats["failed"] == 0
+    assert stats["retried"] == len(attempts) - 1 >= 2
+    assert stats["rate_limited"] == stats["retried"]
+    # Each retry waits at least the lower end of its jittered exponential delay
+    for attempt, (earlier, later) in enumerate(zip(attempts, attempts[1:])):
+        assert later - earlier >= 0.5 * BACKOFF_BASE * 2 ** attempt
+
+    db.expire_all()
+    assert db.query(models.Plaid_Investment_Holding).count() == 3
+    state = db.query(models.Plaid_Sync_State).filter_by(user_id=1, product="investments").one()
+    assert state.last_synced_at is not None
+    assert (state.failure_count, state.next_attempt_at, state.last_error) == (0, None, None)
+
+
+def test_rate_limited_job_gives_up_after_max_attempts(db, access_token, fake_plaid_url, attempts, scheduler, monkeypatch):
+    monkeypatch.setattr(sync_scheduler, "SYNC_MAX_ATTEMPTS", 3)
+    make_user(db, 1, access_token)
+    set_rate_limit(fake_plaid_url, 1)
+
+    scheduler.enqueue("investments", 1)
+    wait_for(lambda: scheduler.status()["failed"] == 1)
+
+    stats = scheduler.status()
+    assert len(attempts) == 3
+    assert (stats["retried"], stats["rate_limited"], stats["completed"]) == (2, 3, 0)
+    assert not scheduler.is_pending("investments", 1)
+
+
+def test_holdings_rate_limit_defers_background_refresh(db, access_token, fake_plaid_url, monkeypatch):
+    idle = SyncScheduler(workers=0, refresh_interval=0)
+    monkeypatch.setattr(plaid_routes, "scheduler", idle)
+    make_user(db, 1, access_token)
+    set_rate_limit(fake_plaid_url, 1)  # /accounts/get is served, /investments/holdings/get is not
+
+    with pytest.raises(ApiException) as error:
+        plaid_routes.fetch_and_store_investments(db, access_token, 1)
+    assert is_rate_limited(error.value)
+
+    state = db.query(models.Plaid_Sync_State).filter_by(user_id=1, product="investments").one()
+    assert state.failure_count == 1
+    assert state.last_error == "RATE_LIMIT_EXCEEDED"
+    assert state.next_attempt_at > datetime.utcnow()
+    assert db.query(models.Plaid_Investment_Holding).count() == 0
+
+    # Stale, but still backing off: nothing is queued
+    response = asyncio.run(plaid_routes.get_investments(db=db, user={"id": 1}))
+    assert response["refreshing"] is False
+    assert response["sync_error"] == "RATE_LIMIT_EXCEEDED"
+    assert not idle.is_pending("investments", 1)
+
+    # Once the backoff has passed the next read queues a refresh
+    state.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    response = asyncio.run(plaid_routes.get_investments(db=db, user={"id": 1}))
+    assert response["refreshing"] is True
+    assert idle.is_pending("investments", 1)
+
+
+def test_bank_jobs_investments_step_leaves_the_investments_backoff_alone(db, access_token, fake_plaid_url, monkeypatch):
+    def products_not_supported(response):
+        error = ApiException(status=400, reason="Bad Request")
+        error.body = json.dumps({"error_type": "ITEM_ERROR", "error_code": "PRODUCTS_NOT_SUPPORTED"})
+        raise error
+
+    monkeypatch.setattr(plaid_routes, "raise_for_plaid_response", products_not_supported)
+    make_user(db, 1, access_token)
+
+    plaid_routes.fetch_and_store_accounts(db, 1)  # a bank item without investments
+    db.expire_all()
+    assert db.query(models.Plaid_Transactions).count() > 0
+    assert db.query(models.Plaid_Sync_State).filter_by(user_id=1, product="investments").count() == 0
+
+    with pytest.raises(ApiException):
+        plaid_routes.sync_investments(db, 1)  # the investments job's own failures still back off
+    state = db.query(models.Plaid_Sync_State).filter_by(user_id=1, product="investments").one()
+    assert (state.failure_count, state.last_error) == (1, "PRODUCTS_NOT_SUPPORTED")
+
+
+def test_enqueue_keeps_one_job_per_user():
+    idle = SyncScheduler(workers=0, refresh_interval=0)
+    assert idle.enqueue("bank", 1, delay=60)
+    assert not idle.enqueue("bank", 1, delay=120)  # later than the queued run
+    assert idle.enqueue("bank", 1)  # earlier: supersedes it
+    assert idle.enqueue("bank", 2)
+    assert idle.status()["queued"] == 2
+
+    # Enqueued while running: runs once more afterwards
+    idle.running.add(("investments", 1))
+    assert not idle.enqueue("investments", 1)
+    assert not idle.enqueue("investments", 1)
+    assert idle.rerun == {("investments", 1)}
+
+
+class SharedLock:
+    """Stands in for the database lock: the first scheduler to ask holds it until it releases."""
+    holder = None
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def acquire(self) -> bool:
+        if SharedLock.holder is None:
+            SharedLock.holder = self.name
+        return SharedLock.holder == self.name
+
+    def release(self):
+        if SharedLock.holder == self.name:
+            SharedLock.holder = None
+
+
+def test_only_the_refresh_lock_holder_schedules_refresh_cycles(monkeypatch):
+    cycles = []
+    monkeypatch.setattr(SyncScheduler, "schedule_refresh_cycle", lambda self: cycles.append(self.refresh_lock.name))
+    first = SyncScheduler(workers=0, refresh_interval=0.05, refresh_lock=SharedLock("first"))
+    second = SyncScheduler(workers=0, refresh_interval=0.05, refresh_lock=SharedLock("second"))
+
+    first.start()
+    wait_for(lambda: cycles)
+    second.start()
+    time.sleep(0.3)
+    assert set(cycles) == {"first"}
+
+    first.stop(timeout=5)  # releases the lock; the other process takes over
+    assert SharedLock.holder is None
+    wait_for(lambda: "second" in cycles)
+    second.stop(timeout=5)
+
+
+def test_refresh_lock_is_always_held_on_sqlite(db):
+    lock = RefreshLock(db.get_bind())
+    assert lock.acquire() and lock.acquire()
+    lock.release()
+
+
+def test_app_lifespan_runs_sync_workers():
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app):
+        assert sync_scheduler.scheduler.threads
+        assert all(thread.is_alive() for thread in sync_scheduler.scheduler.threads)
+    assert not sync_scheduler.scheduler.threads
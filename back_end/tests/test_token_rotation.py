@@ -0,0 +1,112 @@
+import pytest
+from cryptography.fernet import Fernet, MultiFernet
+from sqlalchemy import event, update
+import plaid_client
+import token_rotation
+from models import Users
+from plaid_client import decrypt_token, decrypt_user_token, encrypt_token, token_cache
+from token_rotation import reencrypt_tokens
+from conftest import make_user
+
+OLD_KEY = plaid_client.ENCRYPTION_KEY
+
+
+@pytest.fixture(autouse=True)
+def empty_token_cache():
+    token_cache.clear()
+    yield
+    token_cache.clear()
+
+
+@pytest.fixture
+def new_key(monkeypatch):
+    """Prepend a new key to ENCRYPTION_KEYS, as an operator does before running the rotation."""
+    key = Fernet.generate_key().decode()
+    monkeypatch.setattr(plaid_client, "primary_cipher", Fernet(key.encode()))
+    monkeypatch.setattr(plaid_client, "cipher_suite", MultiFernet([Fernet(k.encode()) for k in (key, OLD_KEY)]))
+    return key
+
+
+def stored_tokens(db) -> dict:
+    db.expire_all()
+    return {u.id: (u.plaid_access_token, u.plaid_brokerage_access_token) for u in db.query(Users).order_by(Users.id)}
+
+
+# ==================== Rotation ====================
+def test_rotation_reencrypts_old_tokens_and_skips_current_ones(db, new_key):
+    for user_id in range(1, 6):
+        make_user(db, user_id, access_token=f"bank-{user_id}")  # encrypted with the new key
+    make_user(db, 6)  # no token
+    old = Fernet(OLD_KEY.encode())
+    for user_id in (1, 2, 4):
+        db.get(Users, user_id).plaid_access_token = old.encrypt(f"bank-{user_id}".encode()).decode()
+    db.get(Users, 2).plaid_brokerage_access_token = old.encrypt(b"brokerage-2").decode()
+    db.commit()
+    before = stored_tokens(db)
+
+    commits = []
+    event.listen(db, "after_commit", lambda session: commits.append(1))
+    assert reencrypt_tokens(db, chunk_size=2) == {"rotated": 4, "skipped": 2}
+    assert len(commits) == 3  # users 1-2, 3-4 and 5
+
+    after = stored_tokens(db)
+    assert after[3] == before[3] and after[5] == before[5]  # already current: not rewritten
+    for user_id in range(1, 6):
+        assert plaid_client.is_current_encryption(after[user_id][0])
+        assert decrypt_token(after[user_id][0]) == f"bank-{user_id}"
+    assert decrypt_token(after[2][1]) == "brokerage-2"
+    assert after[6] == (None, None)
+    assert reencrypt_tokens(db) == {"rotated": 0, "skipped": 6}
+
+
+def test_rotation_leaves_tokens_relinked_mid_run_alone(db, new_key, monkeypatch):
+    old = Fernet(OLD_KEY.encode())
+    for user_id in (1, 2):
+        make_user(db, user_id)
+        db.get(Users, user_id).plaid_access_token = old.encrypt(f"bank-{user_id}".encode()).decode()
+    db.commit()
+    relinked = encrypt_token("relinked-1")
+    rotate = token_rotation.rotate_token
+
+    def rotate_while_user_1_relinks(token):
+        # The user relinks between the chunk being read and the rotated token being written
+        db.execute(update(Users).where(Users.id == 1).values(plaid_access_token=relinked))
+        return rotate(token)
+
+    monkeypatch.setattr(token_rotation, "rotate_token", rotate_while_user_1_relinks)
+    assert reencrypt_tokens(db) == {"rotated": 1, "skipped": 0}
+
+    after = stored_tokens(db)
+    assert after[1][0] == relinked
+    assert decrypt_token(after[2][0]) == "bank-2"
+
+
+# ==================== Token cache ====================
+def test_token_cache_decrypts_once_per_ciphertext(monkeypatch):
+    calls = []
+    monkeypatch.setattr(plaid_client, "decrypt_token", lambda token: calls.append(token) or decrypt_token(token))
+    first = encrypt_token("bank-a")
+
+    assert decrypt_user_token(1, first) == "bank-a"
+    assert decrypt_user_token(1, first) == "bank-a"
+    assert calls == [first]
+
+    relinked = encrypt_token("bank-b")  # a new item: the stored ciphertext changes
+    assert decrypt_user_token(1, relinked) == "bank-b"
+    rotated = plaid_client.rotate_token(relinked)  # same token, new ciphertext
+    assert decrypt_user_token(1, rotated) == "bank-b"
+    assert calls == [first, relinked, rotated]
+    assert decrypt_user_token(1, rotated, kind="brokerage") == "bank-b"  # cached per kind
+    assert len(calls) == 4
+
+
+def test_unlinking_forgets_decrypted_tokens(db, plaid_api):
+    make_user(db, access_token="bank-1")
+    user = db.get(Users, 1)
+    decrypt_user_token(1, user.plaid_access_token)
+    decrypt_user_token(1, user.plaid_access_token, kind="brokerage")
+    decrypt_user_token(2, user.plaid_access_token)
+
+    assert plaid_api.delete("/unlink").status_code == 200
+    assert token_cache.get((1, "bank")) is None and token_cache.get((1, "brokerage")) is None
+    assert token_cache.get((2, "bank")) is not None
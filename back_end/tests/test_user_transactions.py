@@ -0,0 +1,106 @@
+from datetime import date, timedelta
+import pytest
+from sqlalchemy import insert
+from models import Plaid_Bank_Account, Plaid_Transactions, Transaction_Category_Link, User_Categories
+from user_transactions import list_transactions, LIST_SCAN_WINDOW_DAYS
+from conftest import make_user
+
+NEWEST = date(2024, 6, 30)
+
+
+@pytest.fixture
+def history(db):
+    """Two accounts with two transactions a day for two years; every 50th is a 1000.0 Acme payment in category 2."""
+    make_user(db)
+    db.add_all([User_Categories(id=c, user_id=1, name=f"Category {c}", color="#000000") for c in (1, 2)])
+    db.add_all([Plaid_Bank_Account(user_id=1, account_id=acc, name=acc, type="depository") for acc in ("chk", "sav")])
+    db.flush()
+    rows, links = [], []
+    for i in range(2 * 730):
+        tx_id = f"tx{i}"
+        rare = i % 50 == 0
+        rows.append({"transaction_id": tx_id, "account_id": ("chk", "sav")[i % 2],
+                     "amount": 1000.0 if rare else float(i % 100), "merchant_name": "Acme" if rare else "Corner Shop",
+                     "date": NEWEST - timedelta(days=i // 2)})
+        links.append({"transaction_id": tx_id, "category_id": 2 if rare else 1})
+    db.execute(insert(Plaid_Transactions), rows)
+    db.execute(insert(Transaction_Category_Link), links)
+    db.commit()
+    return rows
+
+
+def walk(db, **filters) -> list:
+    """Every page of a listing, following next_cursor to the end."""
+    pages, cursor = [], None
+    while True:
+        page = list_transactions(db, 1, cursor=cursor, **filters)
+        pages.append(page["transactions"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("filters", [{"category_id": 2}, {"merchant": "acme"}, {"min_amount": 999, "max_amount": 1001}])
+def test_filtered_pages_scan_one_window_each_and_find_every_match(db, history, filters):
+    pages = walk(db, limit=10, end=NEWEST, **filters)
+
+    assert [tx["transaction_id"] for page in pages for tx in page] == [row["transaction_id"] for row in history[::50]]
+    for page in pages:
+        if page:
+            assert (page[0]["date"] - page[-1]["date"]).days < LIST_SCAN_WINDOW_DAYS
+    assert any(len(page) < 10 for page in pages[:-1])  # short pages carry a cursor too
+    assert len(pages) <= 730 // LIST_SCAN_WINDOW_DAYS + 2
+
+
+def test_filtered_listing_stops_at_start(db, history):
+    start = NEWEST - timedelta(days=100)
+    pages = walk(db, limit=100, category_id=2, start=start, end=NEWEST)
+    found = [tx for page in pages for tx in page]
+    assert len(pages) == 2
+    assert found and all(tx["date"] >= start for tx in found)
+    assert len(found) == len([r for r in history[::50] if r["date"] >= start])
+
+
+def test_filtered_listing_sends_no_cursor_when_only_rows_before_start_remain(db, history):
+    start = NEWEST - timedelta(days=LIST_SCAN_WINDOW_DAYS + 30)
+    window_start = NEWEST - timedelta(days=LIST_SCAN_WINDOW_DAYS - 1)
+    db.query(Plaid_Transactions).filter(Plaid_Transactions.date >= start,
+                                        Plaid_Transactions.date < window_start).delete()
+    db.commit()
+
+    page = list_transactions(db, 1, limit=100, category_id=2, start=start, end=NEWEST)
+
+    assert page["transactions"] and page["next_cursor"] is None
+
+
+def stored_order(db, account_id: str | None = None) -> list:
+    """Every dated transaction id, newest first by (date, id)."""
+    query = db.query(Plaid_Transactions).filter(Plaid_Transactions.date.isnot(None))
+    if account_id is not None:
+        query = query.filter(Plaid_Transactions.account_id == account_id)
+    return [t.transaction_id for t in query.order_by(Plaid_Transactions.date.desc(), Plaid_Transactions.id.desc())]
+
+
+@pytest.mark.parametrize("limit", [3, 50])
+def test_unfiltered_pages_return_every_transaction_once_in_order(db, history, limit):
+    # Ties beyond the two accounts' daily pair: five more on the newest day, split across accounts
+    db.execute(insert(Plaid_Transactions), [
+        {"transaction_id": f"tie{i}", "account_id": ("chk", "sav")[i % 2], "amount": 1.0, "date": NEWEST}
+        for i in range(5)
+    ])
+    db.commit()
+
+    pages = walk(db, limit=limit, end=NEWEST)
+    assert [tx["transaction_id"] for page in pages for tx in page] == stored_order(db)
+    assert all(len(page) == limit for page in pages[:-1])
+
+    pages = walk(db, limit=limit, account_id="sav")
+    assert [tx["transaction_id"] for page in pages for tx in page] == stored_order(db, "sav")
+
+
+def test_cursor_resumes_between_tied_dates(db, history):
+    first = list_transactions(db, 1, limit=3)
+    assert [tx["date"] for tx in first["transactions"]] == [NEWEST, NEWEST, NEWEST - timedelta(days=1)]
+
+    second = list_transactions(db, 1, limit=3, cursor=first["next_cursor"])
+    assert [tx["transaction_id"] for tx in first["transactions"] + second["transactions"]] == stored_order(db)[:6]
@@ -0,0 +1,72 @@
+import argparse
+from sqlalchemy import select, update, bindparam
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import Users
+from plaid_client import is_current_encryption, rotate_token
+
+# Re-encrypt stored Plaid tokens with the newest key in ENCRYPTION_KEYS.
+# Users are walked in primary-key chunks with a commit per chunk, so only one chunk of rows
+# is locked at a time. Rows already on the newest key are skipped, so the job can be re-run.
+
+TOKEN_COLUMNS = ("plaid_access_token", "plaid_brokerage_access_token")
+ROTATION_CHUNK_SIZE = 500
+
+
+def reencrypt_tokens(db: Session, chunk_size: int = ROTATION_CHUNK_SIZE) -> dict:
+    """Rotate every stored token to the newest key. Returns counts of rotated and skipped tokens."""
+    counts = {"rotated": 0, "skipped": 0}
+    last_id = 0
+    while True:
+        # 1) Next chunk of users with any token
+        rows = db.execute(
+            select(Users.id, *(getattr(Users, c) for c in TOKEN_COLUMNS))
+            .where(Users.id > last_id)
+            .where(Users.plaid_access_token.isnot(None) | Users.plaid_brokerage_access_token.isnot(None))
+            .order_by(Users.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return counts
+        last_id = rows[-1].id
+
+        # 2) Re-encrypt the tokens that are not on the newest key
+        for column in TOKEN_COLUMNS:
+            params = []
+            for row in rows:
+                token = getattr(row, column)
+                if token is None:
+                    continue
+                if is_current_encryption(token):
+                    counts["skipped"] += 1
+                    continue
+                params.append({"_id": row.id, "_old": token, "_new": rotate_token(token)})
+            if not params:
+                continue
+            # Matching on the old ciphertext leaves tokens relinked mid-run untouched
+            column_attr = getattr(Users, column)
+            result = db.execute(
+                update(Users.__table__)
+                .where(Users.id == bindparam("_id"), column_attr == bindparam("_old"))
+                .values({column: bindparam("_new")}),
+                params,
+            )
+            counts["rotated"] += result.rowcount
+
+        # 3) Commit per chunk to keep transactions short
+        db.commit()
+
+
+# After prepending a new key to ENCRYPTION_KEYS:
+#   python token_rotation.py [--chunk-size N]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-encrypt Plaid access tokens with the newest key")
+    parser.add_argument("--chunk-size", type=int, default=ROTATION_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        counts = reencrypt_tokens(db, args.chunk_size)
+        print(f"Rotated {counts['rotated']} tokens, {counts['skipped']} already current")
+    finally:
+        db.close()
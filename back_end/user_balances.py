@@ -8,7 +8,8 @@ from plaid.api import plaid_api
 from plaid.model.accounts_balance_get_request import AccountsBalanceGetRequest
 # from plaid.model.accounts_balance_get_response import AccountsBalanceGetResponse 
 # # Uncomment if needed, this gave me an error when trying to run, removed for now
-from plaid_routes import decrypt_token, PLAID_CLIENT_ID, PLAID_SECRET, client
+from plaid_routes import PLAID_CLIENT_ID, PLAID_SECRET, client
+from plaid_client import run_plaid, decrypt_user_token
 
 # from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
@@ -34,16 +35,13 @@ async def get_user_balances(
     Fetch the user's Plaid credit/debit balances and cash balance.
     """
     try:
-        print("User received:", user)  # debug: Print the user object
         db_user = db.query(Users).filter(Users.id == user["id"]).first()
-        print("Database user:", db_user)  # debug: Print the database user
 
         if not db_user or not db_user.plaid_access_token:
             print("Plaid account not linked or user not found")  # debug
             raise HTTPException(status_code=400, detail="Plaid account not linked")
 
-        decrypted_access_token = decrypt_token(db_user.plaid_access_token)
-        print("Decrypted access token:", decrypted_access_token)  # debug
+        decrypted_access_token = decrypt_user_token(user["id"], db_user.plaid_access_token)
 
         # Include client_id and secret in the request
         request = AccountsBalanceGetRequest(
@@ -51,8 +49,7 @@ async def get_user_balances(
             client_id=PLAID_CLIENT_ID,
             secret=PLAID_SECRET
         )
-        response = client.accounts_balance_get(request).to_dict()  # Convert to dict
-        print("Plaid response:", response)  # debug
+        response = (await run_plaid(client.accounts_balance_get, request)).to_dict()  # Convert to dict
 
         # ensure plaid_balances is JSON serializable
         plaid_balances = [
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import Annotated
 from database import SessionLocal
 from models import User_Categories, Users
 from pydantic import BaseModel
+from response_cache import response_cache
 
 router = APIRouter(
     prefix='/user_categories',
@@ -64,6 +66,7 @@ def create_user_category(user_id: int, data: UserCategoryCreate, db: Session):
     db.add(new_category)
     db.commit()
     db.refresh(new_category)
+    response_cache.invalidate_user(user_id)
 
     return new_category
 
@@ -80,12 +83,17 @@ def update_user_category(category_id: int, data: UserCategoryUpdate, db: Session
     if existing and existing.id != category_id:
         raise HTTPException(status_code=400, detail="Category name already exists for the user")
 
+    limit_changed = category.weekly_limit != data.weekly_limit
     category.name = data.name
     category.color = data.color
     category.weekly_limit = data.weekly_limit
 
     db.commit()
+    if limit_changed:
+        from budgets import evaluate_category  # budgets imports bulk_writer, which imports this module
+        evaluate_category(db, category_id)
     db.refresh(category)
+    response_cache.invalidate_user(category.user_id)
 
     return {
         "message": "Category updated successfully",
@@ -100,14 +108,61 @@ def delete_user_category(category_id: int, db: Session):
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
 
+    user_id = category.user_id
     db.delete(category)
     db.commit()
+    response_cache.invalidate_user(user_id)
     return {"message": "Category deleted successfully"}
 
+# ==================== Bulk Resolution ====================
+DEFAULT_CATEGORY_COLOR = "#000000"
+
+def category_ids_query(user_id: int, names=None):
+    """(id, name) of the user's categories, optionally only the given names."""
+    query = select(User_Categories.id, User_Categories.name).where(User_Categories.user_id == user_id)
+    if names is not None:
+        query = query.where(User_Categories.name.in_(names))
+    return query
+
+class CategoryResolver:
+    """
+    Resolves category names to ids for one user during an ingestion run.
+    The user's categories are loaded once; missing names are created with a single
+    multi-row insert and no commit, so the caller's transaction stays intact.
+    """
+
+    def __init__(self, db: Session, user_id: int):
+        self.db = db
+        self.user_id = user_id
+        self.ids = None  # name.casefold() -> id; names are unique per user case-insensitively on MySQL
+
+    def _load(self, names=None):
+        for row in self.db.execute(category_ids_query(self.user_id, names)):
+            self.ids[row.name.casefold()] = row.id
+
+    def resolve(self, names) -> dict:
+        """Return {name: category_id} for `names`, creating the missing categories."""
+        if self.ids is None:
+            self.ids = {}
+            self._load()
+
+        missing = {name for name in names if name.casefold() not in self.ids}
+        if missing:
+            from bulk_writer import upsert_rows  # bulk_writer imports this module
+            rows = [
+                {"user_id": self.user_id, "name": name, "color": DEFAULT_CATEGORY_COLOR, "weekly_limit": None}
+                for name in {name.casefold(): name for name in missing}.values()
+            ]
+            # Do-nothing on conflict: a concurrent import may have created the same category
+            upsert_rows(self.db, User_Categories, rows, ["user_id", "name"], [])
+            self._load(missing)
+
+        return {name: self.ids[name.casefold()] for name in names}
+
 # ==================== Routes ====================
 @router.get("/{user_id}", status_code=status.HTTP_200_OK)
 async def get(user_id: int, db: db_dependency):
-    return get_user_categories(user_id, db)
+    return response_cache.get_or_compute(user_id, "user_categories", None, lambda: get_user_categories(user_id, db))
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create(user_id: int, data: UserCategoryCreate, db: db_dependency):
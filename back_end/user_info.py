@@ -3,7 +3,8 @@ from sqlalchemy.orm import Session
 from typing import Annotated
 from database import SessionLocal
 from models import Users
-from auth import get_current_user, hashPassword
+from auth import get_current_user, invalidate_user
+from password_hashing import hash_password
 from pydantic import BaseModel
 
 router = APIRouter(
@@ -47,7 +48,7 @@ def get_user_info(user: dict, db: Session):
         "phone_number": user_record.phone_number,
     }
 
-def update_user_info(user: dict, db: Session, user_update: UpdateUserInfo):
+async def update_user_info(user: dict, db: Session, user_update: UpdateUserInfo):
     user_record = db.query(Users).filter(Users.username == user["username"]).first()
 
     if not user_record:
@@ -68,10 +69,11 @@ def update_user_info(user: dict, db: Session, user_update: UpdateUserInfo):
     user_record.last_name = user_update.last_name
     user_record.email = user_update.email
     user_record.phone_number = user_update.phone_number
-    user_record.hashed_password = hashPassword(user_update.password)
+    user_record.hashed_password = await hash_password(user_update.password)
     
     db.commit()
     db.refresh(user_record)
+    invalidate_user(user_record.id)
 
     return {
         "message": "User info updated successfully",
@@ -90,4 +92,4 @@ async def get(user: user_dependency, db: db_dependency):
 
 @router.post("/", status_code=status.HTTP_200_OK)
 async def update(user: user_dependency, db: db_dependency, user_update: UpdateUserInfo):
-    return update_user_info(user, db, user_update)
+    return await update_user_info(user, db, user_update)
@@ -1,13 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import heapq
+from itertools import islice
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select, func, and_, or_
 from sqlalchemy.orm import Session
 from typing import Annotated
+from pydantic import BaseModel
 from database import SessionLocal
-from models import Users, Plaid_Transactions, Plaid_Bank_Account
+from models import Users, Plaid_Transactions, Plaid_Bank_Account, Transaction_Category_Link, User_Categories
+from bulk_writer import upsert_rows
+from rollups import RollupDelta, apply_rollup_deltas
+from budgets import evaluate_touched_buckets
 from auth import get_current_user
 from plaid.api import plaid_api
 from plaid.model.transactions_get_request import TransactionsGetRequest
-from datetime import datetime, timedelta
-from plaid_routes import decrypt_token, PLAID_CLIENT_ID, PLAID_SECRET, client
+from datetime import date, datetime, timedelta
+from plaid_routes import PLAID_CLIENT_ID, PLAID_SECRET, client
+from plaid_client import run_plaid, decrypt_user_token
+from response_cache import response_cache
 
 router = APIRouter(
     prefix="/user_transactions",
@@ -30,16 +39,13 @@ async def get_user_transactions(
     Fetch the user's transactions from Plaid and the database.
     """
     try:
-        print("User received:", user)  # Debug: Print the user object
         db_user = db.query(Users).filter(Users.id == user["id"]).first()
-        print("Database user:", db_user)  # Debug: Print the database user
 
         if not db_user or not db_user.plaid_access_token:
             print("Plaid account not linked or user not found")  # Debug
             raise HTTPException(status_code=400, detail="Plaid account not linked")
 
-        decrypted_access_token = decrypt_token(db_user.plaid_access_token)
-        print("Decrypted access token:", decrypted_access_token)  # Debug
+        decrypted_access_token = decrypt_user_token(user["id"], db_user.plaid_access_token)
 
         # Fetch transactions from Plaid
         end_date = datetime.now().date()
@@ -52,8 +58,7 @@ async def get_user_transactions(
             client_id=PLAID_CLIENT_ID,
             secret=PLAID_SECRET
         )
-        response = client.transactions_get(request).to_dict()
-        print("Plaid transactions response:", response)  # Debug
+        response = (await run_plaid(client.transactions_get, request)).to_dict()
 
         transactions = [
             {
@@ -94,4 +99,195 @@ async def get_user_transactions(
 
     except Exception as e:
         print("Error in /user_transactions/ endpoint:", str(e))  # Debug
-        raise HTTPException(status_code=500, detail="Internal Server Error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+# ==================== Listing ====================
+LIST_DEFAULT_LIMIT = 50
+LIST_MAX_LIMIT = 500
+LIST_SCAN_WINDOW_DAYS = 90  # history scanned per page when filters the index can't serve are set
+
+def parse_cursor(cursor: str) -> tuple:
+    """"2024-05-01_1234" -> (date(2024, 5, 1), 1234)."""
+    try:
+        day, tx_id = cursor.split("_")
+        return date.fromisoformat(day), int(tx_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def transaction_page_query(account_id: str, limit: int, after: tuple | None = None,
+                           start: date | None = None, end: date | None = None, category_id: int | None = None,
+                           merchant: str | None = None, min_amount: float | None = None, max_amount: float | None = None):
+    """
+    One account's next `limit` stored transactions, newest first by (date, id), after the (date, id) keyset `after`.
+    Runs as a range scan on ix_plaid_transactions_account_date. Undated transactions can't be paged by date and are left out.
+    """
+    conditions = [Plaid_Transactions.account_id == account_id, Plaid_Transactions.date.isnot(None)]
+    if after is not None:
+        after_date, after_id = after
+        conditions.append(Plaid_Transactions.date <= after_date)  # explicit bound for the range scan
+        conditions.append(or_(
+            Plaid_Transactions.date < after_date,
+            and_(Plaid_Transactions.date == after_date, Plaid_Transactions.id < after_id),
+        ))
+    if start is not None:
+        conditions.append(Plaid_Transactions.date >= start)
+    if end is not None:
+        conditions.append(Plaid_Transactions.date <= end)
+    if category_id is not None:
+        conditions.append(Transaction_Category_Link.category_id == category_id)
+    if merchant:
+        conditions.append(Plaid_Transactions.merchant_name.icontains(merchant, autoescape=True))
+    if min_amount is not None:
+        conditions.append(Plaid_Transactions.amount >= min_amount)
+    if max_amount is not None:
+        conditions.append(Plaid_Transactions.amount <= max_amount)
+
+    return (
+        select(
+            Plaid_Transactions.id,
+            Plaid_Transactions.transaction_id,
+            Plaid_Transactions.account_id,
+            Plaid_Transactions.amount,
+            Plaid_Transactions.currency,
+            Plaid_Transactions.category,
+            Plaid_Transactions.merchant_name,
+            Plaid_Transactions.date,
+            Transaction_Category_Link.category_id,
+        )
+        .outerjoin(Transaction_Category_Link, Transaction_Category_Link.transaction_id == Plaid_Transactions.transaction_id)
+        .where(*conditions)
+        .order_by(Plaid_Transactions.date.desc(), Plaid_Transactions.id.desc())
+        .limit(limit)
+    )
+
+def list_transactions(db: Session, user_id: int, limit: int = LIST_DEFAULT_LIMIT, cursor: str | None = None,
+                      start: date | None = None, end: date | None = None, account_id: str | None = None,
+                      category_id: int | None = None, merchant: str | None = None,
+                      min_amount: float | None = None, max_amount: float | None = None) -> dict:
+    """
+    One page of the user's stored transactions, newest first by (date, id), continuing after `cursor`.
+    Each account is read with its own range scan, reading at most limit + 1 rows, and the scans are merged.
+
+    Category, merchant and amount filters are checked row by row, so a rare match could otherwise
+    scan an account's whole history. With any of them set, a page only scans LIST_SCAN_WINDOW_DAYS
+    of dates; if that window holds fewer than `limit` matches the page comes back short, possibly
+    empty, with a next_cursor that continues before the window. Follow next_cursor until it is None.
+    """
+    # 1) The user's accounts, optionally narrowed to one
+    account_query = select(Plaid_Bank_Account.account_id).where(Plaid_Bank_Account.user_id == user_id)
+    if account_id is not None:
+        account_query = account_query.where(Plaid_Bank_Account.account_id == account_id)
+    account_ids = db.execute(account_query).scalars().all()
+
+    # 2) Row-by-row filters scan one date window per page
+    after = parse_cursor(cursor) if cursor else None
+    scan_start = start
+    if category_id is not None or merchant or min_amount is not None or max_amount is not None:
+        window_start = (after[0] if after else end or date.today()) - timedelta(days=LIST_SCAN_WINDOW_DAYS - 1)
+        if start is None or window_start > start:
+            scan_start = window_start
+
+    # 3) One bounded range scan per account, merged newest first
+    per_account = [
+        db.execute(transaction_page_query(acc, limit + 1, after, scan_start, end, category_id,
+                                          merchant, min_amount, max_amount)).all()
+        for acc in account_ids
+    ]
+    rows = list(islice(heapq.merge(*per_account, key=lambda r: (r.date, r.id), reverse=True), limit + 1))
+
+    page = rows[:limit]
+    next_cursor = f"{page[-1].date.isoformat()}_{page[-1].id}" if len(rows) > limit else None
+    if next_cursor is None and scan_start != start and account_ids:
+        # Oldest row still inside the requested range; rows before `start` never need another page
+        oldest_query = select(func.min(Plaid_Transactions.date)).where(Plaid_Transactions.account_id.in_(account_ids))
+        if start is not None:
+            oldest_query = oldest_query.where(Plaid_Transactions.date >= start)
+        oldest = db.execute(oldest_query).scalar()
+        if oldest is not None and oldest < scan_start:
+            next_cursor = f"{scan_start.isoformat()}_0"  # window exhausted: continue before it
+    return {
+        "transactions": [
+            {
+                "transaction_id": r.transaction_id,
+                "account_id": r.account_id,
+                "amount": r.amount,
+                "currency": r.currency,
+                "category": r.category,
+                "category_id": r.category_id,
+                "merchant_name": r.merchant_name,
+                "date": r.date,
+            }
+            for r in page
+        ],
+        "next_cursor": next_cursor,
+    }
+
+@router.get("/list", status_code=status.HTTP_200_OK)
+async def get_transaction_page(
+    user: Annotated[dict, Depends(get_current_user)],
+    db: Annotated[Session, Depends(get_db)],
+    limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    start: date | None = None,
+    end: date | None = None,
+    account_id: str | None = None,
+    category_id: int | None = None,
+    merchant: str | None = Query(None, description="Case-insensitive substring of the merchant name"),
+    min_amount: float | None = None,
+    max_amount: float | None = None,
+):
+    """
+    Stored transactions only (no Plaid call), newest first, in keyset-paginated pages.
+    With category, merchant or amount filters a page may hold fewer than `limit` rows; keep following next_cursor.
+    """
+    return list_transactions(db, user["id"], limit, cursor, start, end, account_id, category_id,
+                             merchant, min_amount, max_amount)
+
+
+class RecategorizeRequest(BaseModel):
+    category_id: int
+
+def recategorize_transaction(db: Session, user_id: int, transaction_id: str, category_id: int):
+    """Move a transaction to another of the user's categories and shift its spend rollup buckets."""
+    tx = db.execute(
+        select(
+            Plaid_Transactions.account_id,
+            Plaid_Transactions.date,
+            Plaid_Transactions.amount,
+            Transaction_Category_Link.category_id,
+        )
+        .join(Plaid_Bank_Account, Plaid_Bank_Account.account_id == Plaid_Transactions.account_id)
+        .outerjoin(Transaction_Category_Link, Transaction_Category_Link.transaction_id == Plaid_Transactions.transaction_id)
+        .where(Plaid_Transactions.transaction_id == transaction_id, Plaid_Bank_Account.user_id == user_id)
+    ).first()
+    if not tx:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+
+    category = db.query(User_Categories.id).filter(
+        User_Categories.id == category_id, User_Categories.user_id == user_id
+    ).first()
+    if not category:
+        raise HTTPException(status_code=404, detail="Category not found")
+
+    if tx.category_id != category_id:
+        upsert_rows(db, Transaction_Category_Link, [{"transaction_id": transaction_id, "category_id": category_id}],
+                    ["transaction_id"], ["category_id"])
+        delta = RollupDelta()
+        delta.add_transaction(user_id, tx.category_id, tx.account_id, tx.date, tx.amount, sign=-1)
+        delta.add_transaction(user_id, category_id, tx.account_id, tx.date, tx.amount)
+        apply_rollup_deltas(db, delta)
+        db.commit()
+        response_cache.invalidate_user(user_id)
+        evaluate_touched_buckets(db, delta.touched())
+
+    return {"message": "Transaction recategorized successfully", "transaction_id": transaction_id, "category_id": category_id}
+
+@router.put("/{transaction_id}/category", status_code=status.HTTP_200_OK)
+async def recategorize(
+    transaction_id: str,
+    data: RecategorizeRequest,
+    user: Annotated[dict, Depends(get_current_user)],
+    db: Annotated[Session, Depends(get_db)]
+):
+    return recategorize_transaction(db, user["id"], transaction_id, data.category_id)